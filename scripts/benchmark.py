@@ -0,0 +1,357 @@
+"""Benchmark the hot paths of kaggle-notebook-deploy against a fake `kaggle` executable.
+
+Usage:
+    python scripts/benchmark.py [--output results.json] [--compare baseline.json]
+
+Benchmarks:
+    validate     check_directories over --dirs generated kernel directories (cold and cached)
+    push         push --all over --push-dirs directories; overhead is wall time minus the fake kaggle latency
+    poll         wait_for_kernel status polling (--polls polls, zero poll interval)
+    diagnostics  streaming parse of a --log-mb synthetic kernel log (push --wait diagnostics and --follow)
+
+The fake `kaggle` is a POSIX shell script that sleeps --latency seconds per
+call, answers `kernels push`, reports RUNNING for the first N `kernels status`
+calls and then COMPLETE, and serves the synthetic log for `kernels output`.
+
+Results are printed (or written to --output) as JSON. With --compare, each
+benchmark's median is compared with the same benchmark in a previous result
+file and the exit code is 1 if any got slower than --max-regression times.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# Add src to path so we can import the package
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from click.testing import CliRunner
+
+from kaggle_notebook_deploy import __version__
+from kaggle_notebook_deploy._backend import CliBackend
+from kaggle_notebook_deploy._utils import print_kernel_diagnostics, print_new_log_entries
+from kaggle_notebook_deploy.cli import main
+from kaggle_notebook_deploy.commands._common import wait_for_kernel
+from kaggle_notebook_deploy.commands.validate import check_directories
+
+FAKE_KAGGLE = r"""#!/bin/sh
+sleep "${FAKE_KAGGLE_LATENCY:-0}"
+case "$1 $2" in
+"kernels push")
+    echo "Kernel version 1 successfully pushed.  Please check progress at https://www.kaggle.com/code/user/x"
+    ;;
+"kernels status")
+    counter="$FAKE_KAGGLE_STATE/$(echo "$3" | tr / _)"
+    n=$(cat "$counter" 2>/dev/null || echo 0)
+    echo $((n + 1)) > "$counter"
+    if [ "$n" -lt "${FAKE_KAGGLE_RUNNING_POLLS:-0}" ]; then status=RUNNING; else status=COMPLETE; fi
+    echo "$3 has status \"KernelWorkerStatus.$status\""
+    ;;
+"kernels output")
+    kernel="$3"
+    shift 3
+    out=.
+    while [ $# -gt 0 ]; do
+        if [ "$1" = "-p" ]; then out="$2"; shift; fi
+        shift
+    done
+    if [ -n "$FAKE_KAGGLE_LOG" ]; then cp "$FAKE_KAGGLE_LOG" "$out/${kernel##*/}.log"; fi
+    ;;
+*)
+    echo "fake kaggle: unsupported command: $*" >&2
+    exit 2
+    ;;
+esac
+"""
+
+NOTEBOOK = {
+    "cells": [
+        {"cell_type": "markdown", "metadata": {}, "source": ["# Baseline\n"]},
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [],
+         "source": ["import os\n", "DATA_DIR = '/kaggle/input/comp'\n"]},
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [],
+         "source": ["files = sorted(os.listdir(DATA_DIR))\n", "print(len(files))\n"]},
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [],
+         "source": ["with open('/kaggle/working/submission.csv', 'w') as f:\n", "    f.write('id,target\\n')\n"]},
+    ],
+    "metadata": {"kernelspec": {"display_name": "Python 3", "language": "python", "name": "python3"}},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def make_kernel_dirs(root: Path, n: int) -> list[Path]:
+    notebook = json.dumps(NOTEBOOK, indent=1)
+    dirs = []
+    for i in range(n):
+        d = root / f"comp-{i:04d}"
+        d.mkdir(parents=True)
+        metadata = {
+            "id": f"user/comp-{i:04d}-baseline",
+            "title": f"Comp {i:04d} Baseline",
+            "code_file": "baseline.ipynb",
+            "language": "python",
+            "kernel_type": "notebook",
+            "is_private": "true",
+            "enable_gpu": "false",
+            "enable_tpu": "false",
+            "enable_internet": "false",
+            "competition_sources": ["comp"],
+        }
+        (d / "kernel-metadata.json").write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+        (d / "baseline.ipynb").write_text(notebook, encoding="utf-8")
+        dirs.append(d)
+    return dirs
+
+
+def make_kernel_log(path: Path, size_mb: float) -> int:
+    """Write a kernel log JSON array of about size_mb MB (3 stdout entries per stderr entry); return its size."""
+    target = int(size_mb * 1024 * 1024)
+    line = "x" * 120
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        i = 0
+        while written < target:
+            stream = "stderr" if i % 4 == 3 else "stdout"
+            entry = json.dumps({"stream_name": stream, "time": i * 0.01, "data": f"{i} {line}\n"})
+            f.write(("," if i else "") + entry)
+            written += len(entry) + 1
+            i += 1
+        f.write("]")
+    return path.stat().st_size
+
+
+@contextlib.contextmanager
+def environ(**values):
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update({k: str(v) for k, v in values.items()})
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def measure(fn: Callable[[], Optional[dict]], repeat: int, setup: Optional[Callable[[], None]] = None) -> dict:
+    """Run fn repeat times and return wall time statistics (plus the extra fields of the last run)."""
+    times = []
+    extra = {}
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        extra = fn() or {}
+        times.append(time.perf_counter() - t0)
+    return {
+        "seconds": {
+            "min": round(min(times), 6),
+            "median": round(statistics.median(times), 6),
+            "max": round(max(times), 6),
+        },
+        **extra,
+    }
+
+
+def bench_validate(work: Path, args) -> list[dict]:
+    dirs = [str(d) for d in make_kernel_dirs(work / "validate", args.dirs)]
+    jobs = os.cpu_count() or 1
+    state = work / "validate-state"
+    results = []
+
+    def check():
+        failed = sum(1 for r in check_directories(dirs, jobs) if r["errors"] or r["fatal"])
+        assert failed == 0, f"{failed} generated directories failed validation"
+
+    def clear_state():
+        shutil.rmtree(state, ignore_errors=True)
+
+    with environ(KAGGLE_DEPLOY_STATE_DIR=state):
+        stats = measure(check, args.repeat, setup=clear_state)
+        results.append({"name": "validate_cold", "params": {"dirs": args.dirs, "jobs": jobs}, **stats})
+        stats = measure(check, args.repeat)
+        results.append({"name": "validate_cached", "params": {"dirs": args.dirs, "jobs": jobs}, **stats})
+    return results
+
+
+def bench_push(work: Path, args) -> list[dict]:
+    root = work / "push"
+    make_kernel_dirs(root, args.push_dirs)
+    runner = CliRunner()
+    results = []
+
+    for jobs in sorted({1, args.jobs}):
+        def push():
+            result = runner.invoke(main, ["push", str(root), "--all", "--jobs", str(jobs), "--skip-validate", "--force"])
+            assert result.exit_code == 0, result.output
+
+        stats = measure(push, args.repeat)
+        # 1 push = 1 kaggle 呼び出し. 並列 push では jobs 本ずつ重なる
+        waves = -(-args.push_dirs // jobs)
+        stats["overhead_seconds"] = round(stats["seconds"]["median"] - waves * args.latency, 6)
+        stats["overhead_per_push_seconds"] = round(stats["overhead_seconds"] / args.push_dirs, 6)
+        results.append({"name": f"push_all_j{jobs}", "params": {"dirs": args.push_dirs, "jobs": jobs, "latency": args.latency}, **stats})
+    return results
+
+
+def bench_poll(work: Path, args) -> list[dict]:
+    backend = CliBackend(str(work / "bin" / "kaggle"))
+    counters = work / "poll-counters"
+
+    def reset():
+        shutil.rmtree(counters, ignore_errors=True)
+        counters.mkdir()
+
+    def poll():
+        outcome = wait_for_kernel(backend, "user/poll-bench", lambda *a, **k: None,
+                                  timeout=3600, poll_interval=0, max_poll_interval=0)
+        assert outcome == "complete", outcome
+
+    with environ(FAKE_KAGGLE_STATE=counters, FAKE_KAGGLE_RUNNING_POLLS=args.polls - 1):
+        stats = measure(poll, args.repeat, setup=reset)
+    stats["per_poll_seconds"] = round(stats["seconds"]["median"] / args.polls, 6)
+    stats["overhead_per_poll_seconds"] = round(stats["per_poll_seconds"] - args.latency, 6)
+    return [{"name": "poll_cli", "params": {"polls": args.polls, "latency": args.latency}, **stats}]
+
+
+def bench_diagnostics(work: Path, args) -> list[dict]:
+    log_path = work / "kernel.log"
+    log(f"  generating {args.log_mb:g} MB kernel log...")
+    size = make_kernel_log(log_path, args.log_mb)
+    results = []
+
+    def diagnostics():
+        with open(log_path, encoding="utf-8") as f, open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                tail = print_kernel_diagnostics(f)
+        assert tail, "no stderr tail parsed"
+
+    def follow():
+        with open(log_path, encoding="utf-8") as f:
+            assert print_new_log_entries(f, 0, lambda *a, **k: None) > 0
+
+    for name, fn in (("diagnostics_parse", diagnostics), ("follow_parse", follow)):
+        stats = measure(fn, args.repeat)
+        stats["mb_per_second"] = round(size / 1024 / 1024 / stats["seconds"]["median"], 2)
+        results.append({"name": name, "params": {"log_bytes": size}, **stats})
+
+    backend = CliBackend(str(work / "bin" / "kaggle"))
+
+    def fetch_and_parse():
+        with backend.open_log("user/diag-bench") as f, open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                print_kernel_diagnostics(f)
+
+    with environ(FAKE_KAGGLE_LOG=log_path):
+        stats = measure(fetch_and_parse, args.repeat)
+    results.append({"name": "diagnostics_cli", "params": {"log_bytes": size, "latency": args.latency}, **stats})
+    return results
+
+
+BENCHMARKS = {
+    "validate": bench_validate,
+    "push": bench_push,
+    "poll": bench_poll,
+    "diagnostics": bench_diagnostics,
+}
+
+
+def compare(results: list[dict], baseline_path: Path, max_regression: float) -> list[str]:
+    """Return a message for every benchmark whose median got slower than max_regression x the baseline."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {b["name"]: b for b in json.load(f)["benchmarks"]}
+    regressions = []
+    for r in results:
+        before = baseline.get(r["name"])
+        if before is None or before["params"] != r["params"]:
+            continue
+        old, new = before["seconds"]["median"], r["seconds"]["median"]
+        r["baseline_median"] = old
+        if old > 0 and new > old * max_regression:
+            regressions.append(f"{r['name']}: {new:.3f}s vs {old:.3f}s ({new / old:.2f}x)")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="run only this benchmark (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake kaggle sleeps per call")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--dirs", type=int, default=1000, help="kernel directories for validate")
+    parser.add_argument("--push-dirs", type=int, default=20, help="kernel directories for push --all")
+    parser.add_argument("--jobs", type=int, default=4, help="push --jobs for the parallel push run")
+    parser.add_argument("--polls", type=int, default=20, help="status polls until the fake kernel completes")
+    parser.add_argument("--log-mb", type=float, default=100, help="size of the synthetic kernel log in MB")
+    parser.add_argument("--output", type=Path, help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", type=Path, help="previous results file to compare medians against")
+    parser.add_argument("--max-regression", type=float, default=1.2,
+                        help="with --compare, fail when a median is more than this multiple of the baseline")
+    return parser.parse_args(argv)
+
+
+def run(argv=None) -> int:
+    args = parse_args(argv)
+    selected = args.only or list(BENCHMARKS)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="kaggle-deploy-bench-") as tmp:
+        work = Path(tmp)
+        bin_dir = work / "bin"
+        bin_dir.mkdir()
+        kaggle = bin_dir / "kaggle"
+        kaggle.write_text(FAKE_KAGGLE, encoding="utf-8")
+        kaggle.chmod(0o755)
+        env = {
+            "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+            "KAGGLE_DEPLOY_BACKEND": "cli",
+            # 測りたいのは手元の処理のオーバーヘッドなので、Kaggle 呼び出しのレート制限は外す
+            "KAGGLE_DEPLOY_RATE_LIMIT": "off",
+            "KAGGLE_DEPLOY_STATE_DIR": work / "state",
+            "FAKE_KAGGLE_LATENCY": args.latency,
+            "FAKE_KAGGLE_STATE": work,
+        }
+        with environ(**env):
+            for name in selected:
+                log(f"running {name}...")
+                results.extend(BENCHMARKS[name](work, args))
+
+    regressions = compare(results, args.compare, args.max_regression) if args.compare else []
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "latency": args.latency,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "benchmarks": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        log(f"wrote {args.output}")
+    else:
+        print(text)
+    for message in regressions:
+        log(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -16,7 +16,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 import click
-from kaggle_notebook_deploy.cli import cli
+from kaggle_notebook_deploy.cli import main
 
 
 BEGIN_MARKER = "<!-- commands:start -->"
@@ -31,7 +31,10 @@ def option_row(param: click.Option) -> str:
 
 def generate_commands_section(cmd_group: click.Group) -> str:
     lines = []
-    for name, cmd in sorted(cmd_group.commands.items()):
+    # サブコマンドは遅延読み込みなので、commands ではなく list_commands / get_command を使う
+    ctx = click.Context(cmd_group)
+    for name in cmd_group.list_commands(ctx):
+        cmd = cmd_group.get_command(ctx, name)
         lines.append(f"### `kaggle-notebook-deploy {name}`")
         lines.append("")
         if cmd.help:
@@ -73,5 +76,5 @@ def update_readme(readme_path: Path, new_section: str) -> bool:
 
 if __name__ == "__main__":
     readme = Path(__file__).parent.parent / "README.md"
-    section = generate_commands_section(cli)
+    section = generate_commands_section(main)
     update_readme(readme, section)
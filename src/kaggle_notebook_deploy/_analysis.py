@@ -0,0 +1,207 @@
+"""Static analysis of notebook code cells for Kaggle submission problems.
+
+Each cell is parsed with ``ast`` (IPython ``!``/``%`` lines are checked as
+shell commands) and yields findings for:
+
+- internet access: ``pip install`` from an index / ``wget`` / ``git clone``
+  and calls into HTTP clients or download helpers (fails when
+  ``enable_internet`` is false). Offline installs (``--no-index``,
+  ``--find-links``, local wheels) are not flagged, and an HTTP client import
+  without a call is reported separately, as a weaker signal
+- hard-coded absolute paths outside ``/kaggle`` and ``/tmp``
+- hard-coded ``/kaggle/input/...`` paths, reported per notebook when no cell
+  uses ``DATA_DIR``
+
+Results depend only on the cell source, so they are cached by its sha256 in
+.kaggle-deploy/cell-analysis.json and unchanged cells are never re-parsed.
+"""
+
+import ast
+import functools
+import hashlib
+import re
+from typing import Optional
+
+from kaggle_notebook_deploy._state import load_json, save_json, state_dir
+
+# 解析ルールを変えたら上げる（古いキャッシュを捨てる）
+ANALYZER_VERSION = 2
+CELL_CACHE_FILE = "cell-analysis.json"
+# キャッシュに残すセル数の上限
+MAX_CACHED_CELLS = 50000
+
+INTERNET_MODULES = {"requests", "httpx", "urllib3", "aiohttp", "wget", "urllib.request"}
+INTERNET_CALLS = {"urlopen", "urlretrieve", "hf_hub_download", "snapshot_download", "download_url_to_file"}
+SHELL_CALLS = {"system", "popen", "run", "call", "check_call", "check_output", "Popen"}
+
+_SHELL_INTERNET = re.compile(
+    r"\b(?:pip3?|uv pip|conda|mamba|apt(?:-get)?)\s+install\b|\bwget\b|\bcurl\b|\bgit\s+clone\b"
+)
+# install の引数がこれだけならインデックスにアクセスしない（/kaggle/input に置いた wheel など）
+_LOCAL_PACKAGE = re.compile(r"^(?:/|\.{1,2}/|~/|file:)|\.(?:whl|tar\.gz|zip)$")
+_OFFLINE_OPTIONS = ("--no-index", "--find-links", "-f", "--offline")
+_FOREIGN_PATH = re.compile(r"^(?:/(?!kaggle(?:/|$)|tmp(?:/|$))[\w.-]+/|~/|[A-Za-z]:[\\/])")
+_INPUT_PATH = re.compile(r"^(?:/kaggle/input|\.\./input)/[^/*{]")
+
+
+def _shell_internet(command: str) -> Optional[str]:
+    """Return the first network-using command in a shell line, or None.
+
+    pip installs with --no-index / --find-links or only local packages are offline.
+    """
+    for match in _SHELL_INTERNET.finditer(command):
+        if not match.group(0).endswith("install"):
+            return match.group(0)
+        # install の引数はコマンドの区切り（; && || |）まで
+        args = re.split(r"[;&|]", command[match.end():], maxsplit=1)[0].split()
+        if any(a.split("=", 1)[0] in _OFFLINE_OPTIONS for a in args):
+            continue
+        packages = [a for a in args if not a.startswith("-")]
+        if packages and all(_LOCAL_PACKAGE.search(a.strip("'\"")) for a in packages):
+            continue
+        return match.group(0)
+    return None
+
+
+def _calls_client(name: str, last: str, clients: set) -> bool:
+    """Whether a call goes through an HTTP client (requests.get, httpx.post, get after `from requests import get`)."""
+    if last[:1].isupper():
+        return False
+    return any(name == c or name.startswith(c + ".") for c in clients)
+
+
+def _dotted_name(node: ast.AST) -> str:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _shell_text(node: ast.Call) -> Optional[str]:
+    """Return the command text passed to os.system / subprocess.* if it is a literal."""
+    if not node.args:
+        return None
+    arg = node.args[0]
+    if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+        return arg.value
+    if isinstance(arg, (ast.List, ast.Tuple)):
+        words = [e.value for e in arg.elts if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+        return " ".join(words)
+    return None
+
+
+def analyze_cell(source: str) -> dict:
+    """Analyze one code cell.
+
+    Returns {"internet": [(line, what)], "internet_imports": [(line, what)],
+    "paths": [(line, path)], "input_paths": [(line, path)], "data_dir": bool}.
+    """
+    result = {"internet": [], "internet_imports": [], "paths": [], "input_paths": [], "data_dir": False}
+    lines = source.splitlines()
+
+    # %%bash などのセルマジックはセル全体がシェルコマンド。%%time などは本体が Python
+    if lines and lines[0].startswith("%%"):
+        if lines[0].split()[0] in ("%%bash", "%%sh", "%%script", "%%system"):
+            for lineno, line in enumerate(lines[1:], start=2):
+                if what := _shell_internet(line):
+                    result["internet"].append((lineno, what))
+            return result
+        lines[0] = ""
+
+    python_lines = []
+    for lineno, line in enumerate(lines, start=1):
+        stripped = line.lstrip()
+        if stripped.startswith(("!", "%")):
+            if what := _shell_internet(stripped):
+                result["internet"].append((lineno, what))
+            python_lines.append("")
+        else:
+            python_lines.append(line)
+
+    try:
+        tree = ast.parse("\n".join(python_lines))
+    except SyntaxError:
+        return result
+
+    # 呼び出すと通信する名前（モジュールは前方一致）. import は別のセルにあることが多いので、モジュール名そのものも含める
+    clients = set(INTERNET_MODULES)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in INTERNET_MODULES or alias.name.split(".")[0] in INTERNET_MODULES:
+                    result["internet_imports"].append((node.lineno, f"import {alias.name}"))
+                    clients.add(alias.asname or alias.name)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            if node.module in INTERNET_MODULES or node.module.split(".")[0] in INTERNET_MODULES:
+                result["internet_imports"].append((node.lineno, f"from {node.module} import ..."))
+                # Session や HTTPError などのクラスは作るだけでは通信しない
+                clients.update(alias.asname or alias.name for alias in node.names if not alias.name[:1].isupper())
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            last = name.rsplit(".", 1)[-1]
+            if last in INTERNET_CALLS or name == "torch.hub.load" or _calls_client(name, last, clients):
+                result["internet"].append((node.lineno, f"{name}()"))
+            elif last in SHELL_CALLS and name.split(".")[0] in ("os", "subprocess"):
+                text = _shell_text(node)
+                if text and (what := _shell_internet(text)):
+                    result["internet"].append((node.lineno, what))
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            value = node.value
+            if "\n" in value or " " in value:
+                continue
+            if _FOREIGN_PATH.match(value):
+                result["paths"].append((node.lineno, value))
+            elif _INPUT_PATH.match(value):
+                result["input_paths"].append((node.lineno, value))
+        elif isinstance(node, ast.Name) and node.id == "DATA_DIR":
+            result["data_dir"] = True
+
+    # ast.walk は幅優先なので行番号順に並べ直す
+    for key in ("internet", "internet_imports", "paths", "input_paths"):
+        result[key].sort()
+    return result
+
+
+# プロセスごとに1回だけ読む. 引数は状態ディレクトリが切り替わったときに読み直すためのキー
+@functools.lru_cache(maxsize=None)
+def _load_cache(directory: str) -> dict:
+    data = load_json(CELL_CACHE_FILE)
+    if data.get("version") != ANALYZER_VERSION:
+        return {}
+    return data.get("cells", {})
+
+
+class CellAnalyzer:
+    """Analyze cells through the on-disk cache, collecting new entries in `updates`."""
+
+    def __init__(self):
+        self.cache = _load_cache(str(state_dir()))
+        self.updates = {}
+
+    def analyze(self, source: str) -> dict:
+        key = hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+        cached = self.cache.get(key) or self.updates.get(key)
+        if cached is None:
+            cached = analyze_cell(source)
+            self.updates[key] = cached
+        return cached
+
+
+def save_cell_cache(updates: dict):
+    """Merge newly analyzed cells into .kaggle-deploy/cell-analysis.json."""
+    if not updates:
+        return
+    data = load_json(CELL_CACHE_FILE)
+    cells = data.get("cells", {}) if data.get("version") == ANALYZER_VERSION else {}
+    # 上限を超えたら、今回解析したセルを残して既存のエントリを捨てる
+    keep = max(0, MAX_CACHED_CELLS - len(updates))
+    old = [(k, v) for k, v in cells.items() if k not in updates]
+    cells = dict(old[len(old) - keep:] if len(old) > keep else old)
+    cells.update(updates)
+    save_json(CELL_CACHE_FILE, {"version": ANALYZER_VERSION, "cells": cells})
+    _load_cache.cache_clear()
@@ -0,0 +1,352 @@
+"""In-process Kaggle API client.
+
+Talks to the same RPC-style endpoints as the official ``kaggle`` CLI
+(``POST {endpoint}/v1/{service}/{method}`` with a JSON body), but keeps one
+authenticated ``requests.Session`` alive so repeated calls reuse the TLS
+connection instead of paying interpreter start-up and ``import kaggle`` on
+every status poll.
+"""
+
+import io
+import json
+import os
+from pathlib import Path
+from typing import Optional, TextIO
+from urllib.parse import urljoin
+
+import requests
+
+from kaggle_notebook_deploy import __version__, _ratelimit
+from kaggle_notebook_deploy._utils import open_log_tail
+
+# テスト用スタブサーバーやエミュレーターを指す場合に上書きする
+API_ENDPOINT_ENV = "KAGGLE_API_ENDPOINT"
+DEFAULT_API_ENDPOINT = "https://api.kaggle.com"
+
+KERNELS_SERVICE = "kernels.KernelsApiService"
+DATASETS_SERVICE = "datasets.DatasetApiService"
+BLOBS_SERVICE = "blobs.BlobApiService"
+
+# 再開可能アップロードで「まだ途中」を表すステータス
+RESUME_INCOMPLETE = 308
+
+REQUEST_TIMEOUT = 60
+
+# レート制限・再試行の設定単位（_ratelimit のエンドポイント名）. それ以外はサービス名の先頭（datasets, blobs）
+_ENDPOINTS = {"SaveKernel": "push", "GetKernelSessionStatus": "status", "ListKernelSessionOutput": "output"}
+
+
+class KaggleApiError(Exception):
+    """Raised when the Kaggle API returns an error response."""
+
+    def __init__(self, message: str, status_code: int = 0):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def load_credentials() -> Optional[dict]:
+    """Return Kaggle credentials as {"username", "key"} or {"token"}, or None.
+
+    Lookup order matches the kaggle CLI: KAGGLE_API_TOKEN, KAGGLE_USERNAME/KAGGLE_KEY,
+    then kaggle.json in KAGGLE_CONFIG_DIR or ~/.kaggle.
+    """
+    if token := os.environ.get("KAGGLE_API_TOKEN"):
+        return {"token": token}
+
+    username = os.environ.get("KAGGLE_USERNAME")
+    key = os.environ.get("KAGGLE_KEY")
+    if username and key:
+        return {"username": username, "key": key}
+
+    config_dir = os.environ.get("KAGGLE_CONFIG_DIR") or Path.home() / ".kaggle"
+    kaggle_json = Path(config_dir) / "kaggle.json"
+    try:
+        data = json.loads(kaggle_json.read_text())
+        return {"username": data["username"], "key": data["key"]}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def split_kernel_id(kernel_id: str) -> tuple[str, str]:
+    """Split 'owner/slug' into its parts."""
+    owner, _, slug = kernel_id.partition("/")
+    return owner, slug
+
+
+class KaggleApiClient:
+    """Thin client over the Kaggle RPC API with a reused HTTP session."""
+
+    def __init__(self, credentials: dict, endpoint: Optional[str] = None):
+        self.endpoint = (endpoint or os.environ.get(API_ENDPOINT_ENV) or DEFAULT_API_ENDPOINT).rstrip("/")
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": f"kaggle-notebook-deploy/{__version__}",
+            "Content-Type": "application/json",
+        })
+        if "token" in credentials:
+            self.session.headers["Authorization"] = f"Bearer {credentials['token']}"
+        else:
+            self.session.auth = (credentials["username"], credentials["key"])
+        # アップロード先・ダウンロード元は署名付きのストレージ URL なので、認証ヘッダを付けない別セッションを使う
+        self.storage_session = requests.Session()
+
+    def close(self):
+        self.session.close()
+        self.storage_session.close()
+
+    def call(self, service: str, method: str, body: dict) -> dict:
+        """POST an RPC request and return the decoded JSON response.
+
+        The request goes through the shared rate limiter and is retried on 429 / 5xx (see _ratelimit).
+        """
+        url = f"{self.endpoint}/v1/{service}/{method}"
+        resp = _ratelimit.call(
+            _ENDPOINTS.get(method, service.split(".")[0]),
+            lambda: self._send(lambda: self.session.post(url, json=body, timeout=REQUEST_TIMEOUT)),
+            _transient,
+        )
+        if isinstance(resp, requests.RequestException):
+            raise KaggleApiError(f"{method}: {resp}") from resp
+
+        try:
+            data = resp.json() if resp.content else {}
+        except ValueError:
+            data = {}
+        if resp.status_code >= 400 or _error_code(data) >= 400:
+            message = data.get("message") if isinstance(data, dict) else None
+            raise KaggleApiError(
+                f"{method}: HTTP {resp.status_code} {message or resp.reason}",
+                status_code=resp.status_code,
+            )
+        return data
+
+    def kernel_status(self, kernel_id: str) -> dict:
+        """Return {"status": "QUEUED|RUNNING|COMPLETE|ERROR|...", "failureMessage": ...}."""
+        owner, slug = split_kernel_id(kernel_id)
+        return self.call(KERNELS_SERVICE, "GetKernelSessionStatus", {"userName": owner, "kernelSlug": slug})
+
+    def kernel_output(self, kernel_id: str, page_token: Optional[str] = None) -> dict:
+        """Return one page of kernel output: {"files": [{"url", "fileName"}], "log", "nextPageToken"}."""
+        owner, slug = split_kernel_id(kernel_id)
+        body = {"userName": owner, "kernelSlug": slug}
+        if page_token:
+            body["pageToken"] = page_token
+        return self.call(KERNELS_SERVICE, "ListKernelSessionOutput", body)
+
+    def open_kernel_log(self, kernel_id: str, offset: Optional[int] = None) -> Optional[TextIO]:
+        """Return the kernel log as a text stream without downloading other output files.
+
+        The <slug>.log output file is streamed over HTTP when the API lists it;
+        otherwise the log embedded in the ListKernelSessionOutput response is used.
+        With an offset the stream starts at that byte offset of the log, fetched
+        with an HTTP Range request (the embedded log always comes whole and is
+        sliced locally).
+        """
+        slug = split_kernel_id(kernel_id)[1]
+        inline_log = None
+        page_token = None
+        while True:
+            output = self.kernel_output(kernel_id, page_token)
+            for item in output.get("files") or []:
+                if item.get("fileName") == f"{slug}.log" and item.get("url"):
+                    return self._open_stream(item["url"], offset)
+            inline_log = inline_log or output.get("log")
+            page_token = output.get("nextPageToken")
+            if inline_log or not page_token:
+                break
+        if not inline_log:
+            return None
+        if offset is None:
+            return io.StringIO(inline_log)
+        return open_log_tail(io.BytesIO(inline_log.encode("utf-8")[offset:]), offset)
+
+    def list_output_files(self, kernel_id: str) -> list[dict]:
+        """Return every output file of the latest kernel session as [{"fileName", "url"}], following pages."""
+        files = []
+        page_token = None
+        while True:
+            output = self.kernel_output(kernel_id, page_token)
+            files.extend(item for item in output.get("files") or [] if item.get("fileName") and item.get("url"))
+            page_token = output.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def open_download(self, url: str, headers: Optional[dict] = None) -> requests.Response:
+        """Start a streaming GET of an output file URL; the caller must close the response."""
+        # 出力ファイルの URL は署名付きのストレージ URL なので、認証ヘッダは送らない
+        full_url = urljoin(self.endpoint + "/", url)
+        resp = _ratelimit.call(
+            "download",
+            lambda: self._send(lambda: self.storage_session.get(
+                full_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)),
+            _transient,
+        )
+        if isinstance(resp, requests.RequestException):
+            raise KaggleApiError(f"download: {resp}") from resp
+        if resp.status_code >= 400:
+            resp.close()
+            raise KaggleApiError(f"download: HTTP {resp.status_code} {resp.reason}", status_code=resp.status_code)
+        return resp
+
+    @staticmethod
+    def _send(request):
+        """Run request(); a connection error is returned instead of raised so that it can be retried."""
+        try:
+            return request()
+        except requests.RequestException as e:
+            return e
+
+    def _open_stream(self, url: str, offset: Optional[int] = None) -> TextIO:
+        if not offset:
+            resp = self.open_download(url)
+            resp.raw.decode_content = True
+            return open_log_tail(resp.raw, offset)
+        # バイト位置は圧縮前の内容で数えるので、圧縮させない
+        try:
+            resp = self.open_download(url, {"Range": f"bytes={offset}-", "Accept-Encoding": "identity"})
+        except KaggleApiError as e:
+            if e.status_code == 416:
+                # offset 以降にまだ何も書かれていない
+                return open_log_tail(io.BytesIO(b""), offset)
+            raise
+        if resp.status_code != 206:
+            # Range に対応していないサーバーは全体を返すので、読み飛ばす
+            remaining = offset
+            while remaining > 0:
+                chunk = resp.raw.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        return open_log_tail(resp.raw, offset)
+
+    def save_kernel(self, request: dict) -> dict:
+        """Create a new kernel version (the API behind `kaggle kernels push`)."""
+        return self.call(KERNELS_SERVICE, "SaveKernel", request)
+
+    def get_dataset(self, dataset_id: str) -> dict:
+        """Return the metadata of an existing dataset ('owner/slug')."""
+        owner, slug = split_kernel_id(dataset_id)
+        return self.call(DATASETS_SERVICE, "GetDataset", {"ownerSlug": owner, "datasetSlug": slug})
+
+    def create_dataset(self, request: dict) -> dict:
+        """Create a new dataset (the API behind `kaggle datasets create`)."""
+        return self.call(DATASETS_SERVICE, "CreateDataset", request)
+
+    def create_dataset_version(self, dataset_id: str, body: dict) -> dict:
+        """Create a new dataset version (the API behind `kaggle datasets version`)."""
+        owner, slug = split_kernel_id(dataset_id)
+        return self.call(DATASETS_SERVICE, "CreateDatasetVersion", {"ownerSlug": owner, "datasetSlug": slug, "body": body})
+
+    def start_blob_upload(self, name: str, size: int, mtime: float) -> dict:
+        """Start a resumable upload of one dataset file and return {"token", "createUrl"}."""
+        return self.call(BLOBS_SERVICE, "StartBlobUpload", {
+            "type": "DATASET",
+            "name": name,
+            "contentLength": size,
+            "lastModifiedEpochSeconds": int(mtime),
+        })
+
+    def upload_offset(self, url: str, total: int) -> Optional[int]:
+        """Ask a resumable upload how many bytes it has stored; None once the upload is complete."""
+        return self._put_upload(url, b"", f"bytes */{total}")
+
+    def upload_chunk(self, url: str, data: bytes, start: int, total: int) -> Optional[int]:
+        """Send bytes [start, start+len(data)) and return the next offset to send, or None when complete."""
+        if not data:
+            return self.upload_offset(url, total)
+        return self._put_upload(url, data, f"bytes {start}-{start + len(data) - 1}/{total}")
+
+    def _put_upload(self, url: str, data: bytes, content_range: str) -> Optional[int]:
+        try:
+            resp = self.storage_session.put(
+                urljoin(self.endpoint + "/", url),
+                data=data,
+                headers={"Content-Range": content_range, "Content-Type": "application/octet-stream"},
+                timeout=REQUEST_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            raise KaggleApiError(f"upload: {e}") from e
+        if resp.status_code in (200, 201):
+            return None
+        if resp.status_code != RESUME_INCOMPLETE:
+            raise KaggleApiError(f"upload: HTTP {resp.status_code} {resp.reason}", status_code=resp.status_code)
+        # Range: bytes=0-N はサーバーが保存済みの範囲. ヘッダがなければまだ何も届いていない
+        received = resp.headers.get("Range", "")
+        return int(received.rpartition("-")[2]) + 1 if received else 0
+
+
+def _error_code(data) -> int:
+    """The "code" field of an RPC error body as an int (0 if missing or not numeric)."""
+    if not isinstance(data, dict):
+        return 0
+    try:
+        return int(data.get("code") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _transient(resp) -> Optional[_ratelimit.Transient]:
+    if isinstance(resp, requests.RequestException):
+        return _ratelimit.Transient(0)
+    if resp.status_code == 429 or resp.status_code >= 500:
+        # 再試行する場合、ストリーミング中のレスポンスはここで閉じて接続をプールに返す
+        resp.close()
+        return _ratelimit.Transient(resp.status_code, _ratelimit.parse_retry_after(resp.headers.get("Retry-After")))
+    return None
+
+
+def _as_bool(metadata: dict, key: str, default: bool) -> bool:
+    val = metadata.get(key, default)
+    if isinstance(val, str):
+        if val.lower() not in ("true", "false"):
+            raise ValueError(f"{key} '{val}' は無効です")
+        return val.lower() == "true"
+    return bool(val)
+
+
+def build_save_kernel_request(dir_path: Path) -> dict:
+    """Build a SaveKernel request from kernel-metadata.json the same way `kaggle kernels push` does."""
+    with open(dir_path / "kernel-metadata.json", encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    language = metadata.get("language", "")
+    kernel_type = metadata.get("kernel_type", "")
+    if kernel_type == "notebook" and language == "rmarkdown":
+        language = "r"
+
+    text = (dir_path / metadata["code_file"]).read_text(encoding="utf-8")
+    if kernel_type == "notebook":
+        notebook = json.loads(text)
+        for cell in notebook.get("cells", []):
+            if "outputs" in cell and cell.get("cell_type") == "code":
+                cell["outputs"] = []
+            # nbformat は source を文字列のリストでも許すが、サーバーは文字列のみ受け付ける
+            if isinstance(cell.get("source"), list):
+                cell["source"] = "".join(cell["source"])
+        text = json.dumps(notebook)
+
+    request = {
+        "slug": metadata["id"],
+        "newTitle": metadata.get("title"),
+        "text": text,
+        "language": language,
+        "kernelType": kernel_type,
+        "isPrivate": _as_bool(metadata, "is_private", True),
+        "enableGpu": _as_bool(metadata, "enable_gpu", False),
+        "enableTpu": _as_bool(metadata, "enable_tpu", False),
+        "enableInternet": _as_bool(metadata, "enable_internet", True),
+        "datasetDataSources": metadata.get("dataset_sources", []),
+        "competitionDataSources": metadata.get("competition_sources", []),
+        "kernelDataSources": metadata.get("kernel_sources", []),
+        "modelDataSources": metadata.get("model_sources", []),
+        "categoryIds": metadata.get("keywords", []),
+    }
+    for key, field in (
+        ("id_no", "id"),
+        ("docker_image_pinning_type", "dockerImagePinningType"),
+        ("docker_image", "dockerImage"),
+        ("machine_shape", "machineShape"),
+    ):
+        if metadata.get(key) is not None:
+            request[field] = metadata[key]
+    return request
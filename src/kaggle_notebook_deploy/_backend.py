@@ -0,0 +1,143 @@
+"""Kaggle backends: in-process API client, or the `kaggle` CLI as a subprocess.
+
+The CLI backend is used when there are no credentials or KAGGLE_DEPLOY_BACKEND
+is "cli". With the API backend, status and log reads fall back to the CLI
+when an API call fails; push never does, since the failed call may already
+have created a version.
+
+Both backends expose the same three operations used by push:
+
+- ``push(dir_path)`` -> (returncode, stdout, stderr)
+- ``status(kernel_id)`` -> status string ("" if unknown)
+- ``open_log(kernel_id, offset=None)`` -> context manager yielding the kernel
+  log as a text stream, or None if there is none. With a byte offset (follow
+  mode) the stream starts there; see print_new_log_entries
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from kaggle_notebook_deploy._utils import get_kernel_status, open_kernel_log, run_kaggle
+
+# "auto"（認証情報があればAPI、なければCLI）/ "api" / "cli"
+BACKEND_ENV = "KAGGLE_DEPLOY_BACKEND"
+
+
+class CliBackend:
+    """Runs the `kaggle` executable for every call."""
+
+    name = "cli"
+
+    def __init__(self, kaggle_cmd: str):
+        self.kaggle_cmd = kaggle_cmd
+
+    def describe_push(self, dir_path: Path) -> str:
+        return " ".join([self.kaggle_cmd, "kernels", "push", "-p", str(dir_path)])
+
+    def push(self, dir_path: Path) -> tuple[int, str, str]:
+        proc = run_kaggle("push", [self.kaggle_cmd, "kernels", "push", "-p", str(dir_path)])
+        return proc.returncode, proc.stdout, proc.stderr
+
+    def status(self, kernel_id: str) -> str:
+        return get_kernel_status(self.kaggle_cmd, kernel_id)
+
+    def open_log(self, kernel_id: str, offset: Optional[int] = None):
+        return open_kernel_log(self.kaggle_cmd, kernel_id, offset)
+
+
+class ApiBackend:
+    """Calls the Kaggle API in-process through one warm KaggleApiClient.
+
+    Read-only calls (status, log) fall back to the CLI backend on API errors
+    when a `kaggle` executable is available. push never falls back, so a
+    failed request cannot turn into a duplicate kernel version.
+    """
+
+    name = "api"
+
+    def __init__(self, client, fallback: Optional[CliBackend] = None):
+        self.client = client
+        self.fallback = fallback
+
+    def describe_push(self, dir_path: Path) -> str:
+        return f"kaggle kernels push -p {dir_path} (in-process API: {self.client.endpoint})"
+
+    def push(self, dir_path: Path) -> tuple[int, str, str]:
+        from kaggle_notebook_deploy._api import KaggleApiError, build_save_kernel_request
+
+        try:
+            resp = self.client.save_kernel(build_save_kernel_request(dir_path))
+        except (KaggleApiError, OSError, ValueError, KeyError) as e:
+            return 1, "", f"Kernel push error: {e}"
+
+        if resp.get("error"):
+            return 1, "", f"Kernel push error: {resp['error']}"
+
+        lines = []
+        for key, label in (
+            ("invalidTags", "tags"),
+            ("invalidDatasetSources", "dataset sources"),
+            ("invalidCompetitionSources", "competition sources"),
+            ("invalidKernelSources", "kernel sources"),
+            ("invalidModelSources", "model sources"),
+        ):
+            if resp.get(key):
+                lines.append(f"The following are not valid {label} and could not be added to the kernel: {resp[key]}")
+        if resp.get("versionNumber"):
+            lines.append(
+                f"Kernel version {resp['versionNumber']} successfully pushed.  "
+                f"Please check progress at {resp.get('url', '')}"
+            )
+        return 0, "\n".join(lines), ""
+
+    def status(self, kernel_id: str) -> str:
+        from kaggle_notebook_deploy._api import KaggleApiError
+
+        try:
+            return self.client.kernel_status(kernel_id).get("status", "")
+        except KaggleApiError:
+            if self.fallback:
+                return self.fallback.status(kernel_id)
+            return ""
+
+    @contextmanager
+    def open_log(self, kernel_id: str, offset: Optional[int] = None) -> Iterator[Optional[TextIO]]:
+        from kaggle_notebook_deploy._api import KaggleApiError
+
+        try:
+            stream = self.client.open_kernel_log(kernel_id, offset)
+        except KaggleApiError:
+            if not self.fallback:
+                yield None
+                return
+            with self.fallback.open_log(kernel_id, offset) as stream:
+                yield stream
+            return
+
+        try:
+            yield stream
+        finally:
+            if stream is not None:
+                stream.close()
+
+
+def get_backend(kaggle_cmd: Optional[str]):
+    """Pick a backend according to KAGGLE_DEPLOY_BACKEND.
+
+    Returns None when neither the API (no credentials) nor the CLI (no `kaggle`
+    executable) is usable.
+    """
+    mode = os.environ.get(BACKEND_ENV, "auto").lower()
+    cli = CliBackend(kaggle_cmd) if kaggle_cmd else None
+
+    if mode != "cli":
+        from kaggle_notebook_deploy._api import KaggleApiClient, load_credentials
+
+        credentials = load_credentials()
+        if credentials:
+            return ApiBackend(KaggleApiClient(credentials), fallback=cli)
+        if mode == "api":
+            return None
+    return cli
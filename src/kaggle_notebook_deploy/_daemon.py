@@ -0,0 +1,185 @@
+"""Local daemon (`serve`) and the client side that hands CLI invocations to it.
+
+The daemon listens on a Unix socket with every command module imported, the
+``kaggle`` executable located and the Kaggle credentials read. For each
+request it forks a worker, which takes over the client's stdin/stdout/stderr
+(passed as file descriptors over the socket), switches to the client's
+working directory and environment, runs the command and reports its exit
+code. A command then costs one fork and a socket round-trip instead of
+importing every command module and resolving the backend. Nothing else is
+shared: each worker opens its own HTTP connections and keeps no state once
+its request is done.
+
+Forwarding is opt-in: the CLI only contacts the daemon when
+KAGGLE_DEPLOY_DAEMON=1 is set, since the request carries the caller's whole
+environment to the long-lived daemon process.
+
+If the client goes away (Ctrl-C, closed terminal) the worker sees EOF on the
+socket and sends SIGINT to its process group, so the command and any
+subprocess it started stop as they would on a terminal Ctrl-C; whatever is
+still running after INTERRUPT_GRACE seconds is killed.
+
+The CLI imports this module only when forwarding is enabled; it uses the
+standard library and imports click lazily.
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+
+from kaggle_notebook_deploy import __version__
+
+SOCKET_ENV = "KAGGLE_DEPLOY_SOCKET"
+# 1 のときだけ、起動中のデーモンにコマンドを渡す
+DAEMON_ENV = "KAGGLE_DEPLOY_DAEMON"
+
+# デーモンへ渡さずにこのプロセスで実行するサブコマンド
+LOCAL_COMMANDS = {"serve"}
+
+# クライアントが切断してから SIGINT で止まらないワーカーを SIGKILL するまでの秒数
+INTERRUPT_GRACE = 5.0
+
+
+def socket_path() -> Path:
+    """Return the daemon socket path ($KAGGLE_DEPLOY_SOCKET or a per-user default)."""
+    if path := os.environ.get(SOCKET_ENV):
+        return Path(path)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return Path(runtime_dir) / f"kaggle-notebook-deploy-{os.getuid()}.sock"
+
+
+def _supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds") and hasattr(os, "fork")
+
+
+def _read_line(sock: socket.socket) -> bytes:
+    buf = b""
+    while not buf.endswith(b"\n"):
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def forward(argv: list[str], path: Optional[Path] = None) -> Optional[int]:
+    """Run argv in the daemon and return its exit code, or None if no daemon can take it.
+
+    The daemon is only used if its socket is owned by the current user, so a
+    socket planted by someone else in a shared directory is never trusted
+    with our credentials or terminal.
+    """
+    if not _supported() or os.environ.get(DAEMON_ENV) != "1" or (argv and argv[0] in LOCAL_COMMANDS):
+        return None
+    path = path or socket_path()
+    try:
+        if path.stat().st_uid != os.getuid():
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(str(path))
+    except OSError:
+        return None
+
+    with sock:
+        request = {"version": __version__, "argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        try:
+            socket.send_fds(sock, [b"\0"], [0, 1, 2])
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            reply = json.loads(_read_line(sock) or b"{}")
+        except (OSError, ValueError):
+            reply = {}
+        except KeyboardInterrupt:
+            # ソケットを閉じるとワーカーが EOF を受け取り、実行中のコマンドを止める
+            return 130
+
+    if reply.get("refused"):
+        # バージョン違いなど。まだ何も実行されていないのでローカルで実行する
+        return None
+    if "exit" not in reply:
+        print("Error: kaggle-notebook-deploy serve との通信が途中で切断されました。", file=sys.stderr)
+        return 1
+    return reply["exit"]
+
+
+def _exit_code(e: SystemExit) -> int:
+    if e.code is None or isinstance(e.code, int):
+        return e.code or 0
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def _watch_client(sock: socket.socket, done: threading.Event, log):
+    """Interrupt the worker's process group when the client closes the connection before the command is done."""
+    try:
+        while sock.recv(4096):
+            pass
+    except OSError:
+        pass
+    if done.is_set():
+        return
+    log("client disconnected, interrupting")
+    os.killpg(0, signal.SIGINT)
+    if not done.wait(INTERRUPT_GRACE):
+        log("still running, killing")
+        os.killpg(0, signal.SIGKILL)
+
+
+def handle_connection(sock: socket.socket, log) -> int:
+    """Serve one request in a forked worker; return the command's exit code.
+
+    log(message) writes to the daemon's own stderr, which the worker keeps a
+    copy of before taking over the client's descriptors. The worker must be
+    the leader of its own process group: it is interrupted as a group when
+    the client disconnects.
+    """
+    _, fds, _, _ = socket.recv_fds(sock, 1, 3)
+    request = json.loads(_read_line(sock))
+
+    if request.get("version") != __version__ or len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        sock.sendall(json.dumps({"refused": f"version {__version__}"}).encode() + b"\n")
+        log(f"refused: client version {request.get('version')}")
+        return 1
+
+    from kaggle_notebook_deploy.cli import main
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # ワーカー内の main() がもう一度デーモンに渡さないようにする
+    os.environ.pop(DAEMON_ENV, None)
+
+    done = threading.Event()
+    threading.Thread(target=_watch_client, args=(sock, done, log), daemon=True).start()
+    try:
+        main.main(args=request["argv"], prog_name="kaggle-notebook-deploy")
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e)
+    except KeyboardInterrupt:
+        code = 130
+    finally:
+        done.set()
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except OSError:
+            pass
+
+    try:
+        sock.sendall(json.dumps({"exit": code}).encode() + b"\n")
+    except OSError:
+        pass
+    log(f"{' '.join(request['argv']) or '(no args)'} -> exit {code}")
+    return code
@@ -0,0 +1,312 @@
+"""Local stand-in for the Kaggle kernels API (kaggle-notebook-deploy emulator).
+
+Implements the endpoints used by the API backend:
+
+- ``POST /v1/kernels.KernelsApiService/SaveKernel`` creates a new kernel version
+- ``POST /v1/kernels.KernelsApiService/GetKernelSessionStatus`` reports QUEUED,
+  then RUNNING, then COMPLETE or ERROR, driven by the time since the push
+- ``POST /v1/kernels.KernelsApiService/ListKernelSessionOutput`` returns the
+  log written so far while running, and the output file URLs once finished
+- ``GET /outputs/<owner>/<slug>/<version>/<file>`` streams an output file; the
+  ``<slug>.log`` file is generated on the fly at the configured size and
+  honors ``Range: bytes=<start>-``
+
+Faults can be injected: per-request latency, random 429 (with Retry-After)
+and 5xx responses, and a per-client request rate limit answered with 429.
+``GET /emulator/stats`` returns request and fault counters as JSON.
+"""
+
+import fnmatch
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+from kaggle_notebook_deploy._api import KERNELS_SERVICE
+
+_CHUNK_SIZE = 64 * 1024
+# RUNNING 中のログに出す進捗行の数（完了後のログも同じ行から始まる）
+_PROGRESS_STEPS = 20
+_SERVER_ERRORS = (500, 502, 503)
+_SUBMISSION = b"id,target\n0,0.5\n1,0.5\n"
+
+
+@dataclass
+class EmulatorConfig:
+    """Behaviour of the emulated kernels (durations in seconds, rates in 0..1)."""
+
+    queue_seconds: float = 5.0
+    run_seconds: float = 30.0
+    error_rate: float = 0.0
+    fail_kernels: list = field(default_factory=list)
+    log_bytes: int = 64 * 1024
+    latency: float = 0.0
+    throttle_rate: float = 0.0
+    server_error_rate: float = 0.0
+    retry_after: float = 1.0
+    rate_limit: Optional[float] = None
+    seed: Optional[int] = None
+
+
+@dataclass
+class _Kernel:
+    version: int
+    pushed_at: float
+    failed: bool
+
+
+def _entry(stream: str, t: float, data: str) -> str:
+    return json.dumps({"stream_name": stream, "time": round(t, 3), "data": data})
+
+
+def _progress_entries(kernel_id: str, version: int, steps: int) -> list[str]:
+    return [
+        _entry("stdout", i, f"[{kernel_id} v{version}] step {i + 1}/{_PROGRESS_STEPS}\n")
+        for i in range(steps)
+    ]
+
+
+def _error_entries() -> list[str]:
+    return [
+        _entry("stderr", _PROGRESS_STEPS, "Traceback (most recent call last):\n"),
+        _entry("stderr", _PROGRESS_STEPS, '  File "<cell>", line 1, in <module>\n'),
+        _entry("stderr", _PROGRESS_STEPS, "RuntimeError: injected failure (kaggle-notebook-deploy emulator)\n"),
+    ]
+
+
+class EmulatorServer(ThreadingHTTPServer):
+    """HTTP server holding the emulated kernels; safe to run in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, config: EmulatorConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.kernels: dict[str, _Kernel] = {}
+        self.stats: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        # クライアント（ホスト）ごとのトークンバケット: host -> (残りトークン, 最終更新時刻)
+        self.buckets: dict[str, tuple[float, float]] = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def fault(self, client: str) -> Optional[tuple[int, Optional[float]]]:
+        """Decide whether to fail this request; returns (status code, Retry-After) or None."""
+        cfg = self.config
+        with self.lock:
+            if cfg.rate_limit:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(client, (cfg.rate_limit, now))
+                tokens = min(cfg.rate_limit, tokens + (now - last) * cfg.rate_limit)
+                if tokens < 1:
+                    self.buckets[client] = (tokens, now)
+                    return 429, (1 - tokens) / cfg.rate_limit
+                self.buckets[client] = (tokens - 1, now)
+            roll = self.random.random()
+            if roll < cfg.throttle_rate:
+                return 429, cfg.retry_after
+            if roll < cfg.throttle_rate + cfg.server_error_rate:
+                return self.random.choice(_SERVER_ERRORS), None
+        return None
+
+    def push(self, request: dict) -> tuple[int, dict]:
+        kernel_id = request.get("slug") or ""
+        owner, _, slug = kernel_id.partition("/")
+        if not owner or not slug:
+            return 400, {"code": 400, "message": f"invalid kernel slug: {kernel_id!r}"}
+        if not request.get("text"):
+            return 200, {"error": "Kernel text is empty"}
+        with self.lock:
+            previous = self.kernels.get(kernel_id)
+            failed = self.random.random() < self.config.error_rate or any(
+                fnmatch.fnmatchcase(kernel_id, pattern) for pattern in self.config.fail_kernels
+            )
+            kernel = _Kernel(version=previous.version + 1 if previous else 1, pushed_at=time.monotonic(), failed=failed)
+            self.kernels[kernel_id] = kernel
+        return 200, {
+            "ref": f"/code/{kernel_id}",
+            "url": f"{self.url}/code/{kernel_id}",
+            "versionNumber": kernel.version,
+        }
+
+    def lookup(self, body: dict) -> tuple[str, Optional[_Kernel]]:
+        kernel_id = f"{body.get('userName', '')}/{body.get('kernelSlug', '')}"
+        with self.lock:
+            return kernel_id, self.kernels.get(kernel_id)
+
+    def progress(self, kernel: _Kernel) -> tuple[str, float]:
+        """Return the kernel's status and how far (0..1) it has run."""
+        elapsed = time.monotonic() - kernel.pushed_at
+        if elapsed < self.config.queue_seconds:
+            return "QUEUED", 0.0
+        if elapsed < self.config.queue_seconds + self.config.run_seconds:
+            return "RUNNING", (elapsed - self.config.queue_seconds) / self.config.run_seconds
+        return ("ERROR" if kernel.failed else "COMPLETE"), 1.0
+
+    def iter_log(self, kernel_id: str, kernel: _Kernel) -> Iterator[bytes]:
+        """Generate the full kernel log: progress lines, filler stdout up to log_bytes, then the error if any."""
+        head = _progress_entries(kernel_id, kernel.version, _PROGRESS_STEPS)
+        tail = _error_entries() if kernel.failed else []
+        buf = "[" + ",".join(head)
+        written = 0
+        i = 0
+        while written + len(buf) < self.config.log_bytes:
+            buf += "," + _entry("stdout", _PROGRESS_STEPS + i / 1000, f"[{i}] " + "." * 100 + "\n")
+            i += 1
+            if len(buf) >= _CHUNK_SIZE:
+                data = buf.encode()
+                written += len(data)
+                yield data
+                buf = ""
+        yield (buf + "".join("," + e for e in tail) + "]").encode()
+
+
+def _range_start(header: Optional[str]) -> int:
+    """Start offset of a "bytes=<start>-" Range header (0 for anything else)."""
+    if not header or not header.startswith("bytes=") or not header.endswith("-"):
+        return 0
+    try:
+        return max(0, int(header[len("bytes="):-1]))
+    except ValueError:
+        return 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: EmulatorServer
+
+    def _send_json(self, code: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject(self, name: str) -> bool:
+        """Apply latency and injected faults; returns True if a fault response was sent."""
+        self.server.count(f"requests.{name}")
+        if self.server.config.latency:
+            time.sleep(self.server.config.latency)
+        fault = self.server.fault(self.client_address[0])
+        if fault is None:
+            return False
+        code, retry_after = fault
+        self.server.count(f"faults.{code}")
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after is not None else {}
+        self._send_json(code, {"code": code, "message": "injected by kaggle-notebook-deploy emulator"}, headers)
+        return True
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError as e:
+            # 不正な JSON・UTF-8 以外・不正な Content-Length
+            self._send_json(400, {"code": 400, "message": f"Invalid request body: {e}"})
+            return
+        if not isinstance(body, dict):
+            self._send_json(400, {"code": 400, "message": "Request body must be a JSON object"})
+            return
+        service, _, method = self.path.removeprefix("/v1/").partition("/")
+        if self._inject(method):
+            return
+        if "Authorization" not in self.headers:
+            self._send_json(401, {"code": 401, "message": "Unauthenticated"})
+            return
+        if service != KERNELS_SERVICE:
+            self._send_json(404, {"code": 404, "message": f"{self.path} is not emulated"})
+            return
+
+        if method == "SaveKernel":
+            self._send_json(*self.server.push(body))
+            return
+        kernel_id, kernel = self.server.lookup(body)
+        if kernel is None:
+            self._send_json(404, {"code": 404, "message": f"Kernel {kernel_id} not found"})
+        elif method == "GetKernelSessionStatus":
+            status, _ = self.server.progress(kernel)
+            failure = "RuntimeError: injected failure" if status == "ERROR" else ""
+            self._send_json(200, {"status": status, "failureMessage": failure})
+        elif method == "ListKernelSessionOutput":
+            self._send_json(200, self._output(kernel_id, kernel))
+        else:
+            self._send_json(404, {"code": 404, "message": f"{method} is not emulated"})
+
+    def _output(self, kernel_id: str, kernel: _Kernel) -> dict:
+        status, progress = self.server.progress(kernel)
+        if status in ("QUEUED", "RUNNING"):
+            entries = _progress_entries(kernel_id, kernel.version, int(progress * _PROGRESS_STEPS))
+            return {"files": [], "log": "[" + ",".join(entries) + "]" if entries else ""}
+        base = f"/outputs/{kernel_id}/{kernel.version}"
+        slug = kernel_id.split("/")[-1]
+        files = [{"fileName": f"{slug}.log", "url": f"{base}/{slug}.log"}]
+        if status == "COMPLETE":
+            files.append({"fileName": "submission.csv", "url": f"{base}/submission.csv"})
+        return {"files": files, "log": ""}
+
+    def do_GET(self):
+        if self.path == "/emulator/stats":
+            with self.server.lock:
+                self._send_json(200, {"kernels": len(self.server.kernels), **self.server.stats})
+            return
+        if self._inject("download"):
+            return
+        parts = self.path.removeprefix("/outputs/").split("/")
+        kernel = None
+        if self.path.startswith("/outputs/") and len(parts) == 4:
+            kernel_id = f"{parts[0]}/{parts[1]}"
+            with self.server.lock:
+                kernel = self.server.kernels.get(kernel_id)
+        if kernel is None or str(kernel.version) != parts[2] or self.server.progress(kernel)[0] in ("QUEUED", "RUNNING"):
+            self._send_json(404, {"code": 404, "message": "Not found"})
+            return
+
+        etag = f'"{kernel_id}-{kernel.version}-{parts[3]}"'
+        if parts[3] == "submission.csv" and not kernel.failed:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(_SUBMISSION)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(_SUBMISSION)
+        elif parts[3] == f"{parts[1]}.log":
+            start = _range_start(self.headers.get("Range"))
+            total = sum(len(chunk) for chunk in self.server.iter_log(kernel_id, kernel)) if start else 0
+            if start and start >= total:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{total}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            # 大きなログはメモリに載せずに生成しながら chunked で返す
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("ETag", etag)
+            if start:
+                self.send_header("Content-Range", f"bytes {start}-{total - 1}/{total}")
+            self.end_headers()
+            skip = start
+            for chunk in self.server.iter_log(kernel_id, kernel):
+                chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                if chunk:
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json(404, {"code": 404, "message": "Not found"})
+
+    def log_message(self, *args):
+        pass
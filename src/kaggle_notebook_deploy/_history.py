@@ -0,0 +1,170 @@
+"""Local run history of push / --wait in .kaggle-deploy/history.sqlite3.
+
+One row per push attempt: kernel id, directory, git sha, content hash, final
+status, queue and run time (from --wait), and the stderr tail of failed runs.
+Every call opens its own short-lived connection, so worker threads of a
+parallel push can record concurrently.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from kaggle_notebook_deploy._state import state_dir
+
+HISTORY_FILE = "history.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kernel_id TEXT NOT NULL,
+    directory TEXT,
+    git_sha TEXT,
+    content_hash TEXT,
+    pushed_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    queue_seconds REAL,
+    run_seconds REAL,
+    error_tail TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_kernel ON runs (kernel_id, pushed_at);
+"""
+
+
+@contextmanager
+def _transaction(create: bool = True) -> Iterator[Optional[sqlite3.Connection]]:
+    """Open the history database, commit on success and always close it. Yields None if it does not exist."""
+    path = state_dir() / HISTORY_FILE
+    if not create and not path.exists():
+        yield None
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def git_sha(directory: Path) -> Optional[str]:
+    """Return the HEAD commit of the git repository containing directory, or None.
+
+    .git/HEAD is read directly (following a branch ref or packed-refs) instead of running git.
+    """
+    for candidate in (directory.resolve(), *directory.resolve().parents):
+        git_dir = candidate / ".git"
+        if git_dir.is_file():
+            # worktree / submodule: ".git" は "gitdir: <path>" を書いたファイル
+            text = git_dir.read_text(encoding="utf-8", errors="replace").strip()
+            git_dir = (candidate / text.removeprefix("gitdir:").strip()).resolve()
+        if git_dir.is_dir():
+            break
+    else:
+        return None
+
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if not head.startswith("ref:"):
+        return head or None
+    ref = head.removeprefix("ref:").strip()
+    # linked worktree の refs は commondir が指す本体側にある
+    common = git_dir
+    if (git_dir / "commondir").is_file():
+        common = (git_dir / (git_dir / "commondir").read_text(encoding="utf-8").strip()).resolve()
+    for base in (git_dir, common):
+        try:
+            return (base / ref).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            pass
+    try:
+        with open(common / "packed-refs", encoding="utf-8") as f:
+            for line in f:
+                sha, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha
+    except OSError:
+        pass
+    return None
+
+
+def record_push(kernel_id: str, directory: Path, content_hash: Optional[str], status: str,
+                error_tail: Optional[str] = None) -> Optional[int]:
+    """Insert a push attempt and return its run id (None if the history cannot be written)."""
+    try:
+        with _transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO runs (kernel_id, directory, git_sha, content_hash, pushed_at, status, error_tail)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kernel_id, directory.as_posix(), git_sha(directory), content_hash, time.time(), status, error_tail),
+            )
+            return cur.lastrowid
+    except (sqlite3.Error, OSError):
+        return None
+
+
+def update_run(run_id: Optional[int], **fields) -> None:
+    """Set status / queue_seconds / run_seconds / error_tail of a recorded run."""
+    if run_id is None or not fields:
+        return
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    try:
+        with _transaction() as conn:
+            conn.execute(f"UPDATE runs SET {columns} WHERE id = ?", (*fields.values(), run_id))
+    except (sqlite3.Error, OSError):
+        pass
+
+
+def load_runs(kernel_id: Optional[str] = None) -> list[dict]:
+    """Return recorded runs, oldest first, optionally for one kernel."""
+    with _transaction(create=False) as conn:
+        if conn is None:
+            return []
+        if kernel_id:
+            rows = conn.execute("SELECT * FROM runs WHERE kernel_id = ? ORDER BY pushed_at, id", (kernel_id,))
+        else:
+            rows = conn.execute("SELECT * FROM runs ORDER BY pushed_at, id")
+        return [dict(row) for row in rows]
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0..100) of values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def summarize(runs: list[dict], window: int = 10, threshold: float = 1.5) -> dict:
+    """Summarize one kernel's runs.
+
+    The latest completed run is a regression when its run time exceeds
+    threshold x the median of the `window` completed runs before it.
+    """
+    completed = [r["run_seconds"] for r in runs if r["status"] == "complete" and r["run_seconds"] is not None]
+    queued = [r["queue_seconds"] for r in runs if r["queue_seconds"] is not None]
+    finished = [r for r in runs if r["status"] in ("complete", "error", "timeout")]
+    baseline = percentile(completed[-window - 1:-1], 50) if len(completed) > 1 else None
+    latest = completed[-1] if completed else None
+    return {
+        "runs": len(runs),
+        "failures": sum(1 for r in finished if r["status"] != "complete"),
+        "finished": len(finished),
+        "p50": percentile(completed, 50),
+        "p95": percentile(completed, 95),
+        "queue_p50": percentile(queued, 50),
+        "latest": latest,
+        "baseline": baseline,
+        "regression": bool(baseline and latest is not None and latest > baseline * threshold),
+        "last_status": runs[-1]["status"] if runs else None,
+    }
@@ -0,0 +1,159 @@
+"""Incremental JSON parsing for large documents (kernel logs, notebooks).
+
+Only one array element is held in memory at a time, so a multi-gigabyte
+kernel log or notebook can be scanned with constant memory.
+
+iter_json_array_from resumes a growing array (a kernel log that is still
+being written) at a byte offset returned by an earlier call, so following a
+log only reads the part written since the last poll. Its offsets are exact
+for streams decoded as UTF-8 with errors="surrogateescape".
+"""
+
+import json
+from typing import Any, Iterator, TextIO
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """Buffered character reader that supports decoding one JSON value at a time."""
+
+    def __init__(self, fp: TextIO, chunk_size: int, offset: int = 0):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        # buf[:mark] までのバイト数（UTF-8）. tell() のたびに差分だけエンコードする
+        self.mark = 0
+        self.offset = offset
+
+    def tell(self) -> int:
+        """Byte offset of the current position in the document (UTF-8)."""
+        self.offset += len(self.buf[self.mark:self.pos].encode("utf-8", "surrogateescape"))
+        self.mark = self.pos
+        return self.offset
+
+    def _fill(self, size: int = 0) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 消費済みの先頭部分を捨ててバッファを一定サイズに保つ
+        self.tell()
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = self.mark = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            found = self.peek() or "EOF"
+            raise ValueError(f"expected {char!r} but found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        return self.value_span()[0]
+
+    def value_span(self) -> tuple[Any, int]:
+        """Decode the next complete JSON value and return it with its length in characters."""
+        self.peek()
+        # 巨大な値で再パースが二乗オーダーにならないよう、追加読み込み量を倍々に増やす
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill(size):
+                    size *= 2
+                    continue
+                raise
+            # 数値などバッファ末尾で切れている可能性のある値は続きを読んでから確定する
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            start, self.pos = self.pos, end
+            return obj, end - start
+
+
+def iter_json_array(fp: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one by one."""
+    reader = _Reader(fp, chunk_size)
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("]")
+        return
+
+
+def iter_json_array_from(fp: TextIO, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[Any, int]]:
+    """Yield (element, end) for a top-level JSON array, starting at a byte offset.
+
+    fp must start at `offset` in the document: 0, or an `end` yielded by an
+    earlier call, which is the byte offset just past that element. Iteration
+    stops quietly where the document ends, even without the closing "]".
+    An element cut off by the end of the stream raises ValueError.
+    """
+    reader = _Reader(fp, chunk_size, offset)
+    if offset == 0:
+        reader.expect("[")
+        if reader.peek() == "]":
+            return
+    elif reader.peek() == ",":
+        reader.pos += 1
+    else:
+        return
+    while True:
+        yield reader.value(), reader.tell()
+        if reader.peek() != ",":
+            return
+        reader.pos += 1
+
+
+def iter_member_array(fp: TextIO, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[Any, int]]:
+    """Yield (element, size) for the array stored under `key` in a top-level JSON object.
+
+    size is the element's length in characters as written in the document.
+    Other members of the object are decoded and discarded one at a time.
+    """
+    reader = _Reader(fp, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield reader.value_span()
+                    if reader.peek() != ",":
+                        break
+                    reader.pos += 1
+            reader.expect("]")
+        else:
+            reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("}")
+        return
@@ -0,0 +1,61 @@
+"""Streaming inspection of .ipynb files."""
+
+import heapq
+import json
+from pathlib import Path
+from typing import Callable, Optional
+
+from kaggle_notebook_deploy._jsonstream import iter_member_array
+
+
+def scan_notebook(path: Path, top: int = 3, visit: Optional[Callable[[int, dict], None]] = None,
+                  max_item_size: Optional[int] = None) -> dict:
+    """Scan a notebook one cell at a time and return its size profile.
+
+    visit(index, cell), if given, is called for every cell as it is decoded.
+
+    Returns {"size", "cells", "largest_cells", "largest_outputs",
+    "oversized_cells", "oversized_outputs"} where largest_cells is
+    [(size, cell_index)] and largest_outputs is [(size, cell_index,
+    output_index)], each holding at most `top` entries in descending order.
+    The oversized lists hold every cell / output larger than max_item_size
+    (empty when it is None), in notebook order. Sizes are in bytes for the
+    file and characters for cells and outputs. Raises ValueError if the
+    notebook is not valid JSON.
+    """
+    largest_cells = []
+    largest_outputs = []
+    oversized_cells = []
+    oversized_outputs = []
+    count = 0
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for index, (cell, size) in enumerate(iter_member_array(f, "cells")):
+            count += 1
+            _push_top(largest_cells, top, (size, index))
+            if max_item_size is not None and size > max_item_size:
+                oversized_cells.append((size, index))
+            if visit:
+                visit(index, cell)
+            for out_index, output in enumerate(cell.get("outputs") or []):
+                out_size = len(json.dumps(output, ensure_ascii=False))
+                _push_top(largest_outputs, top, (out_size, index, out_index))
+                if max_item_size is not None and out_size > max_item_size:
+                    oversized_outputs.append((out_size, index, out_index))
+
+    return {
+        "size": path.stat().st_size,
+        "cells": count,
+        "largest_cells": sorted(largest_cells, reverse=True),
+        "largest_outputs": sorted(largest_outputs, reverse=True),
+        "oversized_cells": oversized_cells,
+        "oversized_outputs": oversized_outputs,
+    }
+
+
+def _push_top(heap: list, top: int, item: tuple):
+    """Keep the `top` largest items in a min-heap."""
+    if len(heap) < top:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
@@ -0,0 +1,220 @@
+"""Local pre-flight execution of a kernel's code_file.
+
+The code cells are run one at a time in a fresh Python process (inside an
+IPython shell when IPython is installed, so magics work; otherwise with plain
+``exec``). ``/kaggle/input`` and ``/kaggle/working`` in the cell sources are
+rewritten to local directories, so the ``DATA_DIR`` glob in the notebook
+template finds ``<input>/<competition-slug>`` the same way it does on Kaggle.
+
+After every cell the child process appends one JSON line to a report file:
+{"cell", "seconds", "peak", "rss", "error"}. Execution stops at the first
+cell that raises.
+
+``peak`` comes from ``tracemalloc``, which stays on for the whole run, so
+``seconds`` includes its overhead: cells that allocate many small Python
+objects can run several times slower than they would on Kaggle. The times
+are for spotting the slow cells, not for estimating the kernel's run time.
+
+The child process is started as ``python -m kaggle_notebook_deploy._preflight
+CELLS_JSON REPORT_JSONL WORKING_DIR``.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from kaggle_notebook_deploy._stage import link_or_copy
+
+# 行数を絞ってサンプリングするファイル
+SAMPLED_SUFFIXES = (".csv", ".tsv")
+
+_INPUT_PREFIX = re.compile(r"/kaggle/input(?![\w-])|(?<![\w./])\.\./input(?![\w-])")
+_WORKING_PREFIX = re.compile(r"/kaggle/working(?![\w-])")
+# %%time などは本体が Python. それ以外のセルマジック（%%bash など）のセルは IPython なしでは実行できない
+_PYTHON_CELL_MAGICS = ("%%time", "%%timeit", "%%capture")
+
+
+def sample_input(src: Path, dest: Path, rows: int) -> None:
+    """Mirror src into dest, keeping only the header and first `rows` rows of CSV/TSV files.
+
+    Other files are hard-linked (copied if linking is not possible), so large
+    binary inputs cost nothing.
+    """
+    for current, dirnames, filenames in os.walk(src):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        out_dir = dest / Path(current).relative_to(src)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in filenames:
+            path = Path(current) / name
+            if path.suffix.lower() not in SAMPLED_SUFFIXES:
+                link_or_copy(path, out_dir / name)
+                continue
+            with open(path, "rb") as fin, open(out_dir / name, "wb") as fout:
+                for i, line in enumerate(fin):
+                    if i > rows:
+                        break
+                    fout.write(line)
+
+
+def rewrite_paths(source: str, input_dir: Path, working_dir: Path) -> str:
+    """Point /kaggle/input (and ../input) and /kaggle/working at local directories."""
+    source = _INPUT_PREFIX.sub(lambda m: input_dir.as_posix(), source)
+    return _WORKING_PREFIX.sub(lambda m: working_dir.as_posix(), source)
+
+
+def load_code_cells(code_path: Path) -> list[tuple[int, str]]:
+    """Return [(cell_index, source)] for every non-empty code cell; a script is one cell."""
+    text = code_path.read_text(encoding="utf-8")
+    if code_path.suffix != ".ipynb":
+        return [(0, text)]
+    cells = []
+    for index, cell in enumerate(json.loads(text).get("cells", [])):
+        source = cell.get("source", "")
+        if isinstance(source, list):
+            source = "".join(source)
+        if cell.get("cell_type") == "code" and source.strip():
+            cells.append((index, source))
+    return cells
+
+
+def run_notebook(cells: list[tuple[int, str]], working_dir: Path, echo, timeout: float) -> dict:
+    """Execute cells in a child process and return {"status", "records"}.
+
+    status is "ok", "error" (a cell raised) or "timeout". The child's stdout
+    and stderr are passed to echo line by line as they are produced.
+    """
+    with tempfile.TemporaryDirectory(prefix="kaggle-preflight-") as tmpdir:
+        cells_path = Path(tmpdir) / "cells.json"
+        report_path = Path(tmpdir) / "report.jsonl"
+        cells_path.write_text(json.dumps(cells), encoding="utf-8")
+        report_path.touch()
+
+        env = {**os.environ, "MPLBACKEND": "Agg", "PYTHONUNBUFFERED": "1"}
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "kaggle_notebook_deploy._preflight", str(cells_path), str(report_path),
+             str(working_dir)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            env=env,
+        )
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in proc.stdout:
+                echo(line.rstrip("\n"))
+            proc.wait()
+        finally:
+            timer.cancel()
+
+        with open(report_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    if timed_out.is_set():
+        status = "timeout"
+    elif proc.returncode != 0 or any(r["error"] for r in records):
+        status = "error"
+    else:
+        status = "ok"
+    return {"status": status, "records": records}
+
+
+def _max_rss() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB 単位、macOS はバイト単位
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _strip_magics(source: str) -> Optional[str]:
+    """Make a cell runnable without IPython: comment out !/% lines. Returns None for shell cell magics."""
+    lines = source.splitlines()
+    if lines and lines[0].startswith("%%"):
+        if lines[0].split()[0] not in _PYTHON_CELL_MAGICS:
+            return None
+        lines[0] = ""
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        if stripped.startswith(("!", "%")):
+            lines[i] = line[: len(line) - len(stripped)] + "pass  # " + stripped
+    return "\n".join(lines)
+
+
+def _ipython_shell():
+    try:
+        from IPython.core.interactiveshell import InteractiveShell
+    except ImportError:
+        return None
+    return InteractiveShell.instance()
+
+
+def _run_cell(shell, namespace: dict, index: int, source: str) -> Optional[str]:
+    """Run one cell and return an error description, or None on success."""
+    if shell is not None:
+        result = shell.run_cell(source, store_history=False)
+        error = result.error_before_exec or result.error_in_exec
+        return f"{type(error).__name__}: {error}" if error else None
+
+    code = _strip_magics(source)
+    if code is None:
+        print(f"(cell {index}: {source.split()[0]} は IPython なしでは実行できないためスキップします)")
+        return None
+    try:
+        exec(compile(code, f"<cell {index}>", "exec"), namespace)
+    except BaseException as e:
+        traceback.print_exc()
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _main(cells_path: str, report_path: str, working_dir: str) -> int:
+    import tracemalloc
+
+    with open(cells_path, encoding="utf-8") as f:
+        cells = json.load(f)
+    os.chdir(working_dir)
+    sys.path.insert(0, working_dir)
+    shell = _ipython_shell()
+    namespace = {"__name__": "__main__"}
+
+    tracemalloc.start()
+    with open(report_path, "a", encoding="utf-8") as report:
+        for index, source in cells:
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            error = _run_cell(shell, namespace, index, source)
+            record = {
+                "cell": index,
+                "seconds": time.perf_counter() - start,
+                "peak": tracemalloc.get_traced_memory()[1],
+                "rss": _max_rss(),
+                "error": error,
+            }
+            sys.stdout.flush()
+            report.write(json.dumps(record) + "\n")
+            report.flush()
+            if error:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(*sys.argv[1:4]))
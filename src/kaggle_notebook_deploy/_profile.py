@@ -0,0 +1,131 @@
+"""Per-cell profiling of pushed notebooks (push --profile).
+
+A setup cell is inserted at the top of the staged notebook. It registers
+IPython ``pre_run_cell`` / ``post_run_cell`` callbacks that print one line per
+executed cell to stdout:
+
+    KAGGLE_DEPLOY_PROFILE {"cell": 3, "seconds": 12.5, "rss": ..., "max_rss": ..., "peak_growth": ..., "error": false}
+
+so the records end up in the kernel log. ``cell`` is the index of the cell in
+the source notebook. Memory values are bytes: the resident set size after the
+cell, the process's peak RSS so far, and how much the cell raised that peak.
+"""
+
+import json
+from typing import Iterator, Optional, TextIO
+
+from kaggle_notebook_deploy._jsonstream import iter_json_array
+
+PROFILE_MARKER = "KAGGLE_DEPLOY_PROFILE "
+
+_SETUP_CELL = '''# kaggle-notebook-deploy push --profile: セルごとの実行時間とメモリをログに出力する
+def _kaggle_deploy_profile(cells):
+    import json, os, resource, sys, time
+
+    try:
+        shell = get_ipython()
+    except NameError:
+        return
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    state = {"next": 0}
+
+    def max_rss():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def pre(*args):
+        state["start"] = time.perf_counter()
+        state["max_rss"] = max_rss()
+
+    def post(result=None, *args):
+        if "start" not in state:
+            return
+        seconds = time.perf_counter() - state.pop("start")
+        if state["next"] < len(cells):
+            peak = max_rss()
+            record = {
+                "cell": cells[state["next"]],
+                "seconds": round(seconds, 4),
+                "rss": rss(),
+                "max_rss": peak,
+                "peak_growth": peak - state["max_rss"],
+                "error": bool(result is not None and not getattr(result, "success", True)),
+            }
+            sys.stdout.write(%(marker)r + json.dumps(record) + "\\n")
+            sys.stdout.flush()
+        state["next"] += 1
+
+    shell.events.register("pre_run_cell", pre)
+    shell.events.register("post_run_cell", post)
+
+
+_kaggle_deploy_profile(%(cells)r)
+del _kaggle_deploy_profile
+'''
+
+
+def instrument_notebook(notebook: dict) -> int:
+    """Insert the profiling setup cell at the top of a notebook in place; return the number of profiled cells."""
+    cells = notebook.setdefault("cells", [])
+    # 空のセルは実行されない（IPython も pre_run_cell を呼ばない）ので番号に含めない
+    code_cells = [
+        i for i, cell in enumerate(cells)
+        if cell.get("cell_type") == "code" and "".join(cell.get("source", "")).strip()
+    ]
+    cells.insert(0, {
+        "cell_type": "code",
+        "execution_count": None,
+        "metadata": {},
+        "outputs": [],
+        "source": _SETUP_CELL % {"marker": PROFILE_MARKER, "cells": code_cells},
+    })
+    return len(code_cells)
+
+
+def is_profile_line(data: str) -> bool:
+    return data.startswith(PROFILE_MARKER)
+
+
+def iter_profile_records(log_stream: Optional[TextIO]) -> Iterator[dict]:
+    """Yield the profiling records found in the stdout entries of a kernel log."""
+    if log_stream is None:
+        return
+    try:
+        for entry in iter_json_array(log_stream):
+            if entry.get("stream_name") != "stdout":
+                continue
+            for line in entry.get("data", "").splitlines():
+                if is_profile_line(line):
+                    try:
+                        yield json.loads(line[len(PROFILE_MARKER):])
+                    except ValueError:
+                        continue
+    except ValueError:
+        return
+
+
+def print_profile_report(records: list[dict], echo, top: int = 5) -> None:
+    """Print the slowest cells and the cells that raised peak memory the most."""
+    from kaggle_notebook_deploy._utils import format_bytes
+
+    if not records:
+        echo("(no profiling records in the kernel log)")
+        return
+
+    total = sum(r["seconds"] for r in records)
+    echo(f"--- profile: {len(records)} cells, {total:.1f}s total ---")
+    echo(f"Top {min(top, len(records))} cells by time:")
+    for r in sorted(records, key=lambda r: r["seconds"], reverse=True)[:top]:
+        share = r["seconds"] / total * 100 if total else 0
+        mark = "  x error" if r.get("error") else ""
+        echo(f"  [{r['cell']}] {r['seconds']:.2f}s ({share:.0f}%){mark}")
+    echo(f"Top {min(top, len(records))} cells by peak memory growth:")
+    for r in sorted(records, key=lambda r: (r["peak_growth"], r["max_rss"]), reverse=True)[:top]:
+        rss = format_bytes(r["rss"]) if r.get("rss") is not None else "-"
+        echo(f"  [{r['cell']}] +{format_bytes(r['peak_growth'])} (peak {format_bytes(r['max_rss'])}, rss {rss})")
@@ -0,0 +1,194 @@
+"""Shared rate limiting and retries for every Kaggle call.
+
+Each call names an endpoint:
+
+- ``push`` (SaveKernel / `kaggle kernels push`)
+- ``status`` (GetKernelSessionStatus / `kaggle kernels status`)
+- ``output`` (ListKernelSessionOutput / `kaggle kernels output`)
+- ``download`` (output file downloads)
+- ``datasets``, ``blobs`` (dataset command RPCs)
+
+Before each request the caller takes a token from the endpoint's token
+bucket. Endpoints without a rate of their own share the ``*`` bucket, so all
+worker threads of a parallel push are throttled together. Transient failures
+(429, 5xx, connection errors) are retried with jittered exponential backoff;
+a Retry-After from the server is honored and pauses the whole bucket, not just
+the thread that got it. push is only retried on 429: after a 5xx or a dropped
+connection the new version may already exist.
+
+Rates (requests per second) and retry counts can be set per endpoint:
+
+    KAGGLE_DEPLOY_RATE_LIMIT="status=2,push=0.5,*=5"   ("off" or 0 = unlimited)
+    KAGGLE_DEPLOY_RETRIES="push=1,*=6"                  (0 = no retries)
+
+A bare number applies to ``*``.
+"""
+
+import itertools
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+from kaggle_notebook_deploy._trace import count, observe
+from kaggle_notebook_deploy._utils import backoff_delays
+
+RATE_LIMIT_ENV = "KAGGLE_DEPLOY_RATE_LIMIT"
+RETRIES_ENV = "KAGGLE_DEPLOY_RETRIES"
+
+# エンドポイント -> 毎秒リクエスト数（None は無制限）. 出力ファイルはストレージから落とすので API の制限に含めない
+DEFAULT_RATES = {"*": 5.0, "download": None}
+DEFAULT_RETRIES = {"*": 4}
+RETRY_STATUSES = {"*": frozenset({0, 429, 500, 502, 503, 504}), "push": frozenset({429})}
+
+# 最初の再試行までの待ち時間と上限（秒）
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+# Retry-After がこれより長い場合は待たずに失敗させる
+MAX_RETRY_AFTER = 300.0
+
+T = TypeVar("T")
+
+
+@dataclass
+class Transient:
+    """A retryable failure: HTTP status (0 for a connection error) and the server's Retry-After, if any."""
+
+    status: int
+    retry_after: Optional[float] = None
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to max(rate, 1)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; return the seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (a Retry-After from the server)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def parse_spec(text: Optional[str]) -> dict:
+    """Parse "status=2,push=0.5,5" into {"status": 2.0, "push": 0.5, "*": 5.0}; "off" parses as 0."""
+    spec = {}
+    for item in (text or "").split(","):
+        name, sep, value = item.strip().rpartition("=")
+        name = name.strip() if sep else "*"
+        value = value.strip().lower()
+        if not value:
+            continue
+        try:
+            spec[name or "*"] = 0.0 if value in ("off", "none") else float(value)
+        except ValueError:
+            continue
+    return spec
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_TRANSIENT_OUTPUT = re.compile(r"\b(429|50[0234])\b(?: (?:Client|Server))? Error|(Too Many Requests)", re.IGNORECASE)
+_RETRY_AFTER_OUTPUT = re.compile(r"Retry-After['\"]?:\s*['\"]?(\d+)", re.IGNORECASE)
+
+
+def transient_from_output(text: str) -> Optional[Transient]:
+    """Recognize a 429 / 5xx reported by the kaggle CLI in its output."""
+    m = _TRANSIENT_OUTPUT.search(text)
+    if not m:
+        return None
+    retry_after = _RETRY_AFTER_OUTPUT.search(text)
+    return Transient(int(m.group(1) or 429), float(retry_after.group(1)) if retry_after else None)
+
+
+class _Limits:
+    def __init__(self, rates: dict, retries: dict):
+        self.retries = retries
+        self.buckets = {name: TokenBucket(rate) if rate else None for name, rate in rates.items()}
+
+    def bucket(self, endpoint: str) -> Optional[TokenBucket]:
+        return self.buckets[endpoint] if endpoint in self.buckets else self.buckets.get("*")
+
+
+_limits: Optional[_Limits] = None
+_limits_key: Optional[tuple] = None
+_limits_lock = threading.Lock()
+
+
+def _current() -> _Limits:
+    """Return the process-wide limits, rebuilt when the environment variables change."""
+    global _limits, _limits_key
+    key = (os.environ.get(RATE_LIMIT_ENV), os.environ.get(RETRIES_ENV))
+    with _limits_lock:
+        if _limits is None or key != _limits_key:
+            retries = {**DEFAULT_RETRIES, **{k: int(v) for k, v in parse_spec(key[1]).items()}}
+            _limits = _Limits({**DEFAULT_RATES, **parse_spec(key[0])}, retries)
+            _limits_key = key
+        return _limits
+
+
+def call(endpoint: str, attempt: Callable[[], T], check: Callable[[T], Optional[Transient]]) -> T:
+    """Run attempt() under the endpoint's rate limit, retrying while check() reports a transient failure.
+
+    Returns the last attempt's result, which is still a failure when the retries ran out.
+    """
+    limits = _current()
+    bucket = limits.bucket(endpoint)
+    retries = limits.retries.get(endpoint, limits.retries["*"])
+    statuses = RETRY_STATUSES.get(endpoint, RETRY_STATUSES["*"])
+    delays = backoff_delays(RETRY_DELAY, MAX_RETRY_DELAY, factor=2, jitter=0.5)
+
+    for n in itertools.count(1):
+        if bucket is not None:
+            waited = bucket.acquire()
+            if waited:
+                observe("rate_limit_wait_seconds", waited, endpoint=endpoint)
+        result = attempt()
+        transient = check(result)
+        if transient is None or transient.status not in statuses or n > retries:
+            return result
+        delay = next(delays)
+        if transient.retry_after is not None:
+            if transient.retry_after > MAX_RETRY_AFTER:
+                return result
+            delay = max(delay, transient.retry_after)
+            if bucket is not None:
+                bucket.pause(transient.retry_after)
+        count("retries_total", endpoint=endpoint, status=transient.status)
+        time.sleep(delay)
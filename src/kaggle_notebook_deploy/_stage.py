@@ -0,0 +1,84 @@
+"""Push-time staging: write a slimmed copy of a kernel directory to push instead of the working tree."""
+
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from kaggle_notebook_deploy._profile import instrument_notebook
+from kaggle_notebook_deploy._state import state_dir
+
+# Notebook 全体のメタデータのうち、Kaggle の実行に不要なもの
+NOTEBOOK_METADATA_NOISE = ("widgets", "toc", "varInspector", "vscode", "colab", "papermill", "celltoolbar")
+# セルのメタデータのうち、Kaggle の実行に不要なもの
+CELL_METADATA_NOISE = (
+    "execution", "ExecuteTime", "collapsed", "scrolled", "jupyter", "papermill", "vscode", "colab", "trusted",
+)
+
+
+def slim_notebook(notebook: dict) -> dict:
+    """Strip outputs, execution counts and editor metadata from a notebook in place."""
+    metadata = notebook.get("metadata")
+    if isinstance(metadata, dict):
+        for key in NOTEBOOK_METADATA_NOISE:
+            metadata.pop(key, None)
+
+    for cell in notebook.get("cells", []):
+        if cell.get("cell_type") == "code":
+            cell["outputs"] = []
+            cell["execution_count"] = None
+        cell_metadata = cell.get("metadata")
+        if isinstance(cell_metadata, dict):
+            for key in CELL_METADATA_NOISE:
+                cell_metadata.pop(key, None)
+    return notebook
+
+
+def link_or_copy(src: Path, dst: Path):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # 別ファイルシステムやハードリンク非対応の環境ではコピーする
+        shutil.copy2(src, dst)
+
+
+@contextmanager
+def staged_kernel_dir(dir_path: Path, code_file: str, slim: bool = True,
+                      profile: bool = False) -> Iterator[tuple[Path, int, int]]:
+    """Yield (staged_dir, original_size, staged_size) for a staged copy of dir_path.
+
+    The .ipynb code_file is rewritten without outputs (slim) and/or with the
+    per-cell profiling setup cell inserted (profile); every other top-level
+    file is hard-linked (copied if linking is not possible). The staging
+    directory lives under .kaggle-deploy/staging/ so hard links stay on the
+    same filesystem, and is removed on exit. The source tree is never modified.
+    """
+    staging_root = state_dir() / "staging"
+    staging_root.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=staging_root, prefix=f"{dir_path.resolve().name}-") as tmpdir:
+        staged = Path(tmpdir)
+        code_path = dir_path / code_file
+        original_size = code_path.stat().st_size
+
+        for entry in dir_path.iterdir():
+            if entry.is_file() and entry.name != code_file:
+                link_or_copy(entry, staged / entry.name)
+
+        if code_path.suffix == ".ipynb":
+            with open(code_path, encoding="utf-8") as f:
+                notebook = json.load(f)
+            (staged / code_file).parent.mkdir(parents=True, exist_ok=True)
+            if slim:
+                slim_notebook(notebook)
+            if profile:
+                instrument_notebook(notebook)
+            with open(staged / code_file, "w", encoding="utf-8") as f:
+                json.dump(notebook, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            (staged / code_file).parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(code_path, staged / code_file)
+
+        yield staged, original_size, (staged / code_file).stat().st_size
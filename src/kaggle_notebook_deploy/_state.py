@@ -0,0 +1,81 @@
+"""Local state stored under .kaggle-deploy/ (push manifest, caches)."""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+# 環境変数で上書き可能（CIでキャッシュディレクトリを指定する場合など）
+STATE_DIR_ENV = "KAGGLE_DEPLOY_STATE_DIR"
+DEFAULT_STATE_DIR = ".kaggle-deploy"
+
+PUSH_STATE_FILE = "state.json"
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def state_dir() -> Path:
+    """Return the directory holding local state (not created until written)."""
+    return Path(os.environ.get(STATE_DIR_ENV) or DEFAULT_STATE_DIR)
+
+
+def load_json(name: str) -> dict:
+    """Load a JSON state file. Missing or corrupt files yield an empty dict."""
+    path = state_dir() / name
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_json(name: str, data: dict) -> None:
+    """Atomically write a JSON state file."""
+    directory = state_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp, directory / name)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def file_sha256(path: Path, h=None) -> str:
+    """Stream a file into a sha256 hash (or an existing hash object) and return the hex digest."""
+    h = h or hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_hash(dir_path: Path, code_file: str) -> str:
+    """Hash kernel-metadata.json plus the code_file, i.e. everything `kaggle kernels push` uploads."""
+    h = hashlib.sha256()
+    for name in ("kernel-metadata.json", code_file):
+        h.update(name.encode() + b"\0")
+        file_sha256(dir_path / name, h)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_fingerprint(path: Path, previous: Optional[list] = None) -> Optional[list]:
+    """Return [mtime_ns, size, sha256] for a file, or None if it does not exist.
+
+    If previous has the same mtime and size, it is returned as is without
+    reading the file.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if previous and previous[0] == st.st_mtime_ns and previous[1] == st.st_size:
+        return previous
+    return [st.st_mtime_ns, st.st_size, file_sha256(path)]
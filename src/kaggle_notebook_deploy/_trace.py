@@ -0,0 +1,199 @@
+"""Phase-level tracing and metrics for the CLI (--trace / --metrics-file).
+
+``span(name, **attrs)`` times one phase (validation, kaggle resolution,
+upload, each status poll, diagnostics download, ...). When tracing is
+configured, every finished span is appended to the trace file as one JSON
+line:
+
+    {"name": "poll", "span_id": 7, "parent_id": 3, "start": <unix time>,
+     "duration": 0.21, "thread": "...", "pid": 123, "kernel": "user/x", ...}
+
+Span durations also feed the ``kaggle_deploy_phase_duration_seconds``
+histogram. ``count()`` / ``observe()`` record further counters and
+histograms. With a metrics file configured, all metrics are written at exit
+in the Prometheus text format read by node-exporter's textfile collector.
+
+Everything is a no-op until ``configure()`` enables it, so untraced runs pay
+only a flag check per span.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+TRACE_ENV = "KAGGLE_DEPLOY_TRACE"
+METRICS_FILE_ENV = "KAGGLE_DEPLOY_METRICS_FILE"
+METRIC_PREFIX = "kaggle_deploy_"
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, float("inf"))
+
+_METRIC_HELP = {
+    "phase_duration_seconds": ("histogram", "Duration of CLI phases (validate, upload, poll, diagnostics, ...)"),
+    "pushes_total": ("counter", "Kernel push attempts by outcome"),
+    "polls_total": ("counter", "Kernel status polls"),
+    "failures_total": ("counter", "Failures by phase"),
+    "kernel_wait_seconds": ("histogram", "Time from push until the kernel finished (push --wait)"),
+    "retries_total": ("counter", "Kaggle requests retried after a 429 / 5xx / connection error, by endpoint"),
+    "rate_limit_wait_seconds": ("histogram", "Time spent waiting for the shared Kaggle rate limiter, by endpoint"),
+    "last_run_timestamp_seconds": ("gauge", "Unix time the last CLI command finished"),
+}
+
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+_trace_file = None
+_metrics_path: Optional[Path] = None
+_enabled = False
+# (名前, ラベルのタプル) -> 値. ヒストグラムは [バケットごとの件数..., 合計, 件数]
+_counters: dict = {}
+_gauges: dict = {}
+_histograms: dict = {}
+
+
+def configure(trace_path: Optional[str] = None, metrics_path: Optional[str] = None) -> None:
+    """Enable tracing to trace_path (JSON lines, appended) and/or metrics output to metrics_path."""
+    global _trace_file, _metrics_path, _enabled
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+    if trace_path:
+        Path(trace_path).parent.mkdir(parents=True, exist_ok=True)
+        _trace_file = open(trace_path, "a", encoding="utf-8")
+    if metrics_path:
+        _metrics_path = Path(metrics_path)
+    _enabled = bool(_trace_file or _metrics_path)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[dict]:
+    """Time a phase. Yields a dict; keys set on it are added to the trace record.
+
+    An exception escaping the span is recorded as "error" and counted in failures_total.
+    """
+    if not _enabled:
+        yield attrs
+        return
+
+    stack = _local.__dict__.setdefault("stack", [])
+    span_id = next(_ids)
+    parent_id = stack[-1] if stack else None
+    stack.append(span_id)
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        stack.pop()
+        observe("phase_duration_seconds", duration, phase=name)
+        if attrs.get("error"):
+            count("failures_total", phase=name)
+        if _trace_file is not None:
+            record = {
+                "name": name, "span_id": span_id, "parent_id": parent_id, "start": round(start, 6),
+                "duration": round(duration, 6), "thread": threading.current_thread().name, "pid": os.getpid(),
+                **attrs,
+            }
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with _lock:
+                _trace_file.write(line + "\n")
+                _trace_file.flush()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_metrics() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    families: dict[str, list[str]] = {}
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            families.setdefault(name, []).append(f"{METRIC_PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), value in sorted(_gauges.items()):
+            families.setdefault(name, []).append(f"{METRIC_PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), hist in sorted(_histograms.items()):
+            lines = families.setdefault(name, [])
+            for bound, n in zip(BUCKETS, hist):
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(labels, (('le', _format_bound(bound)),))} {n}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_labels(labels)} {hist[-2]}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_labels(labels)} {hist[-1]}")
+
+    out = []
+    for name, lines in families.items():
+        kind, help_text = _METRIC_HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+        out.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def finish(command: Optional[str] = None) -> None:
+    """Write the metrics file (atomically, so a scraper never sees a partial file) and close the trace file."""
+    global _trace_file, _metrics_path, _enabled
+    if _metrics_path is not None:
+        import tempfile
+
+        with _lock:
+            _gauges[_key("last_run_timestamp_seconds", {"command": command or ""})] = round(time.time(), 3)
+        _metrics_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=_metrics_path.parent, prefix=f".{_metrics_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(render_metrics())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, _metrics_path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+    if _trace_file is not None:
+        _trace_file.close()
+        _trace_file = None
+    _metrics_path = None
+    _enabled = False
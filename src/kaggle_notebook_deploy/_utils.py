@@ -1,10 +1,27 @@
 """Shared utilities for kaggle-notebook-deploy."""
 
-import json
+import os
+import random
 import re
+import shutil
 import subprocess
+import io
 import tempfile
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from kaggle_notebook_deploy._jsonstream import iter_json_array, iter_json_array_from
+from kaggle_notebook_deploy._profile import is_profile_line
+from kaggle_notebook_deploy._state import load_json, save_json
+
+# find_kernel_dirs で探索しないディレクトリ
+SKIP_DIR_NAMES = {"node_modules", "venv", "__pycache__"}
+
+# 解決済みの kaggle 実行ファイルのパス（PATH が同じ間は再探索しない）
+KAGGLE_PATH_CACHE_FILE = "kaggle-path.json"
+_kaggle_path_cache: dict[str, Optional[str]] = {}
 
 
 def normalize_path(path_str: str) -> str:
@@ -18,39 +35,206 @@ def normalize_path(path_str: str) -> str:
     return path_str
 
 
+def format_bytes(size: float) -> str:
+    """Format a byte count for humans (e.g. 12.3 MB)."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def backoff_delays(initial: float, maximum: float, factor: float = 1.5, jitter: float = 0.2) -> Iterator[float]:
+    """Yield exponentially growing delays capped at maximum, each randomized by ±jitter.
+
+    Jitter keeps many concurrent pollers from hitting the API in lockstep.
+    """
+    delay = initial
+    while True:
+        yield min(delay, maximum) * random.uniform(1 - jitter, 1 + jitter)
+        delay *= factor
+
+
+def find_kaggle() -> Optional[str]:
+    """Locate the kaggle executable, caching the result per PATH value.
+
+    The path is cached in memory and in .kaggle-deploy/kaggle-path.json, so
+    later invocations skip the search as long as PATH is unchanged and the
+    cached executable still exists.
+    """
+    path_env = os.environ.get("PATH", "")
+    if path_env in _kaggle_path_cache:
+        return _kaggle_path_cache[path_env]
+
+    cached = load_json(KAGGLE_PATH_CACHE_FILE)
+    found = cached.get("kaggle") if cached.get("PATH") == path_env else None
+    if not (found and os.path.isfile(found)):
+        found = _search_kaggle()
+        if found:
+            try:
+                save_json(KAGGLE_PATH_CACHE_FILE, {"PATH": path_env, "kaggle": found})
+            except OSError:
+                pass
+    _kaggle_path_cache[path_env] = found
+    return found
+
+
+def _search_kaggle() -> Optional[str]:
+    """Search PATH and the Python scripts directories for the kaggle executable."""
+    for name in ("kaggle", "kaggle.exe"):
+        if found := shutil.which(name):
+            return found
+
+    import sysconfig
+
+    for scheme in ("nt_user", "posix_user", None):
+        try:
+            scripts = Path(sysconfig.get_path("scripts", scheme) or "")
+        except KeyError:
+            continue
+        for name in ("kaggle.exe", "kaggle"):
+            candidate = scripts / name
+            if candidate.exists():
+                return str(candidate)
+    return None
+
+
+def find_kernel_dirs(root: Path) -> list[Path]:
+    """Return every directory under root that contains kernel-metadata.json.
+
+    Hidden directories (.git, .ipynb_checkpoints, ...) and virtualenvs are skipped.
+    """
+    found = []
+    for current, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if not d.startswith(".") and d not in SKIP_DIR_NAMES
+        )
+        if "kernel-metadata.json" in filenames:
+            found.append(Path(current))
+    return found
+
+
+def run_kaggle(endpoint: str, cmd: list[str]) -> subprocess.CompletedProcess:
+    """Run a kaggle CLI command under the shared rate limit, retrying when it reports a 429 / 5xx."""
+    from kaggle_notebook_deploy import _ratelimit
+
+    return _ratelimit.call(
+        endpoint,
+        lambda: subprocess.run(cmd, capture_output=True, text=True),
+        lambda proc: _ratelimit.transient_from_output(proc.stdout + proc.stderr),
+    )
+
+
 def get_kernel_status(kaggle_cmd: str, kernel_id: str) -> str:
     """Run kaggle kernels status and return the status string."""
-    result = subprocess.run(
-        [kaggle_cmd, "kernels", "status", kernel_id],
-        capture_output=True,
-        text=True,
-    )
+    result = run_kaggle("status", [kaggle_cmd, "kernels", "status", kernel_id])
     raw = result.stdout + result.stderr
     m = re.search(r'has status "([^"]+)"', raw)
     return m.group(1) if m else ""
 
 
-def show_kernel_diagnostics(kaggle_cmd: str, kernel_id: str) -> None:
-    """Download kernel output and print stdout + last 30 stderr lines."""
+def download_kernel_output(kaggle_cmd: str, kernel_id: str, out_dir: Path,
+                           file_pattern: Optional[str] = None) -> subprocess.CompletedProcess:
+    """Run `kaggle kernels output` into out_dir, limited to files matching the file_pattern regex."""
+    cmd = [kaggle_cmd, "kernels", "output", kernel_id, "-p", str(out_dir)]
+    if file_pattern is not None:
+        result = run_kaggle("output", cmd + ["--file-pattern", file_pattern])
+        if "unrecognized arguments" not in result.stderr:
+            return result
+    # --file-pattern のない古い kaggle CLI では全出力をダウンロードするしかない
+    return run_kaggle("output", cmd)
+
+
+def open_log_tail(raw, offset: Optional[int]) -> TextIO:
+    """Wrap a binary log stream as text.
+
+    offset None decodes for display (errors="replace"). An integer means raw
+    starts at that byte offset and is decoded losslessly so that
+    iter_json_array_from can keep counting bytes.
+    """
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace" if offset is None else "surrogateescape")
+
+
+@contextmanager
+def open_kernel_log(kaggle_cmd: str, kernel_id: str, offset: Optional[int] = None) -> Iterator[Optional[TextIO]]:
+    """Download only <slug>.log with the kaggle CLI and yield it as an open text stream.
+
+    With an offset the stream starts at that byte offset. The CLI can only
+    download the whole file, so only parsing, not downloading, is saved.
+
+    Yields None when the kernel has no log. Other output files (models, CSVs)
+    are never downloaded.
+    """
     slug = kernel_id.split("/")[-1]
     with tempfile.TemporaryDirectory() as tmpdir:
-        subprocess.run(
-            [kaggle_cmd, "kernels", "output", kernel_id, "-p", tmpdir],
-            capture_output=True,
-        )
+        download_kernel_output(kaggle_cmd, kernel_id, Path(tmpdir), f"^{re.escape(slug)}\\.log$")
         log_file = Path(tmpdir) / f"{slug}.log"
         if not log_file.exists():
-            print("(no kernel log found)")
+            yield None
             return
+        with open(log_file, "rb") as raw:
+            raw.seek(offset or 0)
+            with open_log_tail(raw, offset) as f:
+                yield f
+
+
+def print_kernel_diagnostics(log_stream: Optional[TextIO], tail: int = 30) -> str:
+    """Print stdout + last `tail` stderr lines from a kernel log stream and return that stderr tail.
+
+    The log is parsed incrementally: stdout is printed as it is read and only
+    the stderr tail is kept, so memory stays constant regardless of log size.
+    push --profile records are left out.
+    """
+    if log_stream is None:
+        print("(no kernel log found)")
+        return ""
 
-        entries = json.loads(log_file.read_text())
+    stderr_tail = deque(maxlen=tail)
+    printed_stdout = False
+    try:
+        for entry in iter_json_array(log_stream):
+            stream = entry.get("stream_name")
+            data = entry.get("data", "")
+            if stream == "stdout" and not is_profile_line(data):
+                if not printed_stdout:
+                    print("--- kernel stdout ---")
+                    printed_stdout = True
+                print(data, end="")
+            elif stream == "stderr":
+                stderr_tail.append(data)
+    except ValueError as e:
+        print(f"\n(kernel log could not be parsed: {e})")
 
-        stdout_lines = [e["data"] for e in entries if e.get("stream_name") == "stdout"]
-        if stdout_lines:
-            print("--- kernel stdout ---")
-            print("".join(stdout_lines), end="")
+    if stderr_tail:
+        print(f"\n--- last {tail} stderr lines ---")
+        print("".join(stderr_tail), end="")
+    return "".join(stderr_tail)
 
-        stderr_lines = [e["data"] for e in entries if e.get("stream_name") == "stderr"]
-        if stderr_lines:
-            print("\n--- last 30 stderr lines ---")
-            print("".join(stderr_lines[-30:]), end="")
+
+def print_new_log_entries(log_stream: Optional[TextIO], offset: int, echo) -> int:
+    """Print the log entries of a stream starting at byte `offset` and return the offset after the last one.
+
+    Used by follow mode: each poll opens the log at the returned offset, so
+    only what was written since the last poll is parsed (stderr entries go to
+    err=True). A log that is still being written may end mid-entry; the
+    incomplete tail is left for the next poll.
+    """
+    if log_stream is None:
+        return offset
+    try:
+        for entry, offset in iter_json_array_from(log_stream, offset):
+            stream = entry.get("stream_name")
+            data = entry.get("data", "")
+            if stream in ("stdout", "stderr") and not is_profile_line(data):
+                # surrogateescape で読んだ不正なバイトは表示用に置き換える
+                data = data.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+                echo(data.rstrip("\n"), err=stream == "stderr")
+    except ValueError:
+        pass
+    return offset
+
+
+def show_kernel_diagnostics(kaggle_cmd: str, kernel_id: str) -> None:
+    """Download the kernel log and print stdout + last 30 stderr lines."""
+    with open_kernel_log(kaggle_cmd, kernel_id) as log_stream:
+        print_kernel_diagnostics(log_stream)
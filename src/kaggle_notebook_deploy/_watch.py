@@ -0,0 +1,170 @@
+"""Filesystem change notification for the watch command.
+
+On Linux the kernel's inotify API is used directly through ctypes, so no
+extra dependency is needed and the process sleeps in select() until
+something changes. Elsewhere the optional ``watchdog`` package provides the
+same events (FSEvents on macOS, ReadDirectoryChangesW on Windows).
+
+Watchers report *directories* in which a relevant file changed; mapping them
+to kernel directories is up to the caller.
+"""
+
+import os
+import queue
+import select
+import struct
+import sys
+from pathlib import Path
+from typing import Optional
+
+from kaggle_notebook_deploy._utils import SKIP_DIR_NAMES
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct("iIII")
+
+
+class WatchError(Exception):
+    """Raised when file watching is not available on this platform."""
+
+
+def is_ignored(name: str) -> bool:
+    """Editor swap/backup files and hidden entries never trigger a re-check."""
+    return (
+        name.startswith((".", "#"))
+        or name.endswith(("~", ".swp", ".swx", ".tmp"))
+        or name in SKIP_DIR_NAMES
+    )
+
+
+def _walk_dirs(root: Path):
+    yield root
+    for current, dirnames, _ in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not is_ignored(d))
+        for d in dirnames:
+            yield Path(current) / d
+
+
+class InotifyWatcher:
+    """Watch directory trees with inotify; new subdirectories are added as they appear."""
+
+    def __init__(self, roots: list[Path]):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise WatchError(f"inotify_init1: {os.strerror(ctypes.get_errno())}")
+        self.dirs = {}
+        for root in roots:
+            for d in _walk_dirs(root):
+                self._add(d)
+
+    def _add(self, directory: Path):
+        import ctypes
+
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise WatchError(f"inotify_add_watch {directory}: {os.strerror(errno)}"
+                             + ("（fs.inotify.max_user_watches を増やしてください）" if errno == 28 else ""))
+        self.dirs[wd] = directory
+
+    def changes(self, timeout: Optional[float] = None) -> set[Path]:
+        """Block up to timeout seconds (forever if None) and return the directories that changed.
+
+        An empty set means the timeout expired. On queue overflow every watched
+        directory is reported.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+                offset += _EVENT.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.dirs.values())
+                    continue
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                directory = self.dirs.get(wd)
+                if directory is None or is_ignored(name):
+                    continue
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        for d in _walk_dirs(directory / name):
+                            self._add(d)
+                        changed.add(directory / name)
+                    continue
+                changed.add(directory)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WatchdogWatcher:
+    """Same interface as InotifyWatcher, backed by the optional watchdog package."""
+
+    def __init__(self, roots: list[Path]):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError as e:
+            raise WatchError("watch には watchdog が必要です: pip install watchdog") from e
+
+        self._queue = queue.Queue()
+        events = self._queue
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+                    if path and not event.is_directory and not is_ignored(os.path.basename(path)):
+                        events.put(Path(path).parent)
+
+        self._observer = Observer()
+        for root in roots:
+            self._observer.schedule(Handler(), str(root), recursive=True)
+        self._observer.start()
+
+    def changes(self, timeout: Optional[float] = None) -> set[Path]:
+        try:
+            changed = {self._queue.get(timeout=timeout)}
+        except queue.Empty:
+            return set()
+        while not self._queue.empty():
+            changed.add(self._queue.get_nowait())
+        return changed
+
+    def close(self):
+        self._observer.stop()
+        self._observer.join()
+
+
+def open_watcher(roots: list[Path]):
+    """Return the best available watcher for this platform."""
+    if sys.platform.startswith("linux"):
+        return InotifyWatcher(roots)
+    return WatchdogWatcher(roots)
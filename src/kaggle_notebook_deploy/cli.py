@@ -1,26 +1,76 @@
 """CLI entry point for kaggle-notebook-deploy."""
 
+import importlib
+import os
+import sys
+
 import click
 
-from kaggle_notebook_deploy import __version__
-from kaggle_notebook_deploy.commands.init import init
-from kaggle_notebook_deploy.commands.init_repo import init_repo
-from kaggle_notebook_deploy.commands.validate import validate
-from kaggle_notebook_deploy.commands.push import push
+from kaggle_notebook_deploy import __version__, _trace
+
+
+class LazyGroup(click.Group):
+    """サブコマンドのモジュールを、そのコマンドが必要になった時点で import する Group.
+
+    validate を pre-commit フックから呼ぶ場合などに、使わない push / logs の
+    依存（HTTP クライアントやプロセスプール）の読み込みコストを払わずに済む。
+    """
+
+    def __init__(self, *args, lazy_subcommands: dict[str, str], **kwargs):
+        super().__init__(*args, **kwargs)
+        # コマンド名 -> "モジュール:属性"
+        self.lazy_subcommands = lazy_subcommands
 
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.lazy_subcommands})
 
-@click.group()
+    def main(self, args=None, **extra):
+        # KAGGLE_DEPLOY_DAEMON=1 のときだけ、起動中の serve デーモンにコマンドを渡す
+        if os.environ.get("KAGGLE_DEPLOY_DAEMON") == "1":
+            from kaggle_notebook_deploy._daemon import forward
+
+            code = forward(sys.argv[1:] if args is None else list(args))
+            if code is not None:
+                sys.exit(code)
+        return super().main(args, **extra)
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            module_name, attr = self.lazy_subcommands[cmd_name].split(":")
+            self.add_command(getattr(importlib.import_module(module_name), attr), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "init": "kaggle_notebook_deploy.commands.init:init",
+        "init-repo": "kaggle_notebook_deploy.commands.init_repo:init_repo",
+        "validate": "kaggle_notebook_deploy.commands.validate:validate",
+        "push": "kaggle_notebook_deploy.commands.push:push",
+        "logs": "kaggle_notebook_deploy.commands.logs:logs",
+        "serve": "kaggle_notebook_deploy.commands.serve:serve",
+        "watch": "kaggle_notebook_deploy.commands.watch:watch",
+        "dataset": "kaggle_notebook_deploy.commands.dataset:dataset",
+        "pull-output": "kaggle_notebook_deploy.commands.pull_output:pull_output",
+        "run-local": "kaggle_notebook_deploy.commands.run_local:run_local",
+        "history": "kaggle_notebook_deploy.commands.history:history",
+        "emulator": "kaggle_notebook_deploy.commands.emulator:emulator",
+    },
+)
 @click.version_option(version=__version__)
-def main():
+@click.option("--trace", "trace_path", envvar=_trace.TRACE_ENV, default=None, metavar="FILE",
+              help="各フェーズ（検証・kaggle 解決・アップロード・ポーリング・診断取得）の所要時間を JSON Lines で追記する")
+@click.option("--metrics-file", envvar=_trace.METRICS_FILE_ENV, default=None, metavar="FILE",
+              help="終了時にカウンタとヒストグラムを Prometheus テキスト形式で書き出す（node-exporter の textfile 用）")
+@click.pass_context
+def main(ctx, trace_path, metrics_file):
     """git pushするだけでKaggle NotebookをデプロイするCLIツール
 
     Kaggle NotebookのコードをGitHubで管理し、GitHub Actions経由で
     自動デプロイするワークフローをセットアップします。
     """
-    pass
-
-
-main.add_command(init)
-main.add_command(init_repo)
-main.add_command(validate)
-main.add_command(push)
+    if trace_path or metrics_file:
+        _trace.configure(trace_path, metrics_file)
+        ctx.call_on_close(lambda: _trace.finish(ctx.invoked_subcommand))
+        ctx.with_resource(_trace.span("command", command=ctx.invoked_subcommand))
@@ -0,0 +1,139 @@
+"""Helpers shared by the push / logs commands."""
+
+import itertools
+import os
+import time
+from typing import Optional
+
+import click
+
+from kaggle_notebook_deploy._backend import BACKEND_ENV, get_backend
+from kaggle_notebook_deploy._trace import count, observe, span
+from kaggle_notebook_deploy._utils import backoff_delays, find_kaggle, print_new_log_entries
+
+
+class Duration(click.ParamType):
+    """秒数、または 30s / 20m / 9h のような単位付きの時間."""
+
+    name = "duration"
+    _units = {"s": 1, "m": 60, "h": 3600}
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, (int, float)):
+            return float(value)
+        text = str(value).strip().lower()
+        scale = self._units.get(text[-1:], None)
+        try:
+            seconds = float(text[:-1] if scale else text) * (scale or 1)
+        except ValueError:
+            self.fail(f"'{value}' は時間として解釈できません（例: 90, 30s, 20m, 9h）", param, ctx)
+        if seconds <= 0:
+            self.fail(f"'{value}' は正の値である必要があります", param, ctx)
+        return seconds
+
+
+def format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s" if secs else f"{minutes}m"
+    return f"{secs}s"
+
+
+# serve デーモンが起動時に用意したバックエンド. 環境（PATH と KAGGLE_* 変数）が同じリクエストで使い回す
+_preloaded_backends: dict = {}
+
+
+def _backend_key() -> tuple:
+    return os.environ.get("PATH", ""), tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith("KAGGLE_")))
+
+
+def preload_backend():
+    """Resolve the backend once and reuse it for later calls made under the same environment."""
+    backend = get_backend(find_kaggle())
+    if backend is not None:
+        _preloaded_backends[_backend_key()] = backend
+    return backend
+
+
+def resolve_backend():
+    """Kaggle認証情報があればAPIバックエンド、なければ kaggle CLI を使う."""
+    backend = _preloaded_backends.get(_backend_key())
+    if backend is None:
+        with span("find_kaggle") as s:
+            kaggle_cmd = find_kaggle()
+            s["found"] = kaggle_cmd is not None
+        with span("resolve_backend") as s:
+            backend = get_backend(kaggle_cmd)
+            s["backend"] = backend.name if backend else None
+    if backend is None:
+        if os.environ.get(BACKEND_ENV, "").lower() == "api":
+            click.echo("Error: Kaggle APIの認証情報が見つかりません。", err=True)
+            click.echo("  ~/.kaggle/kaggle.json または KAGGLE_USERNAME / KAGGLE_KEY を設定してください。", err=True)
+        else:
+            click.echo("Error: kaggle コマンドが見つかりません。", err=True)
+            click.echo("  pip install kaggle でインストールしてください。", err=True)
+        raise SystemExit(1)
+    return backend
+
+
+def wait_for_kernel(backend, kernel_id: str, echo, *, timeout: float, poll_interval: float,
+                    max_poll_interval: float, follow: bool = False, timings: Optional[dict] = None) -> str:
+    """カーネル完了までステータスをポーリングし、"complete" / "error" / "timeout" を返す.
+
+    ポーリング間隔は poll_interval から max_poll_interval まで指数的に伸ばし（ジッター付き）、
+    timeout 秒の締め切りを超えたら打ち切る。follow の場合はポーリングごとに
+    カーネルログを取得し、まだ表示していないエントリだけを表示する。
+
+    timings を渡すと、待機開始から初めて RUNNING を観測するまでを queue_seconds、
+    そこから完了までを run_seconds として書き込む（精度はポーリング間隔程度）。
+    RUNNING を一度も観測しなかった場合、queue_seconds は None で run_seconds は待機時間全体になる。
+    """
+    echo(f"Waiting for kernel to complete: {kernel_id}")
+    start = time.monotonic()
+    deadline = start + timeout
+    delays = backoff_delays(poll_interval, max_poll_interval)
+    log_offset = 0
+    running_since = None
+
+    def record_timings():
+        if timings is not None:
+            now = time.monotonic()
+            timings["queue_seconds"] = running_since - start if running_since else None
+            timings["run_seconds"] = now - (running_since or start)
+
+    for i in itertools.count(1):
+        with span("poll", kernel=kernel_id, attempt=i) as s:
+            status = s["status"] = backend.status(kernel_id)
+        count("polls_total")
+        if follow:
+            with span("follow_log", kernel=kernel_id), backend.open_log(kernel_id, log_offset) as log_stream:
+                log_offset = print_new_log_entries(log_stream, log_offset, echo)
+        elapsed = time.monotonic() - start
+        echo(f"  [{i}] {elapsed:.0f}s {status or '(unknown)'}")
+        upper = status.upper()
+        if "RUNNING" in upper and running_since is None:
+            running_since = time.monotonic()
+        if "COMPLETE" in upper:
+            record_timings()
+            observe("kernel_wait_seconds", time.monotonic() - start, outcome="complete")
+            echo("Kernel completed successfully.")
+            return "complete"
+        if "ERROR" in upper or "CANCEL" in upper:
+            record_timings()
+            observe("kernel_wait_seconds", time.monotonic() - start, outcome="error")
+            count("failures_total", phase="kernel")
+            echo(f"Kernel failed: {status}")
+            return "error"
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(next(delays), remaining))
+
+    record_timings()
+    count("failures_total", phase="wait_timeout")
+    echo(f"Timeout: kernel did not complete in {format_duration(timeout)}.", err=True)
+    return "timeout"
@@ -0,0 +1,280 @@
+"""kaggle-deploy dataset: ローカルディレクトリをKaggle Datasetとしてバージョン管理する."""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import click
+
+from kaggle_notebook_deploy._state import file_fingerprint, load_json, save_json
+from kaggle_notebook_deploy._utils import backoff_delays, format_bytes, normalize_path
+
+DATASET_STATE_FILE = "datasets.json"
+DATASET_METADATA_FILE = "dataset-metadata.json"
+MB = 1024 * 1024
+# アップロード済みのトークンを再利用する期間. 期限切れのトークンで失敗しないよう短めに取る
+UPLOAD_TTL = 6 * 3600
+# 1チャンクの送信に失敗したときのリトライ回数と最初の待ち時間（秒）
+MAX_CHUNK_RETRIES = 5
+RETRY_DELAY = 1.0
+
+_state_lock = threading.Lock()
+
+
+def _upload_key(name: str, sha256: str) -> str:
+    return f"{name}:{sha256}"
+
+
+def _load_state() -> dict:
+    """datasets.json を読む. 期限切れのアップロードは読み込み時に捨てる."""
+    state = load_json(DATASET_STATE_FILE)
+    state.setdefault("datasets", {})
+    now = time.time()
+    state["uploads"] = {
+        k: v for k, v in state.get("uploads", {}).items() if now - v.get("started_at", 0) < UPLOAD_TTL
+    }
+    return state
+
+
+def _update_state(update):
+    """state を読み直して update(state) を適用し、保存する（ワーカースレッドから呼ばれる）."""
+    with _state_lock:
+        state = _load_state()
+        update(state)
+        save_json(DATASET_STATE_FILE, state)
+
+
+def _dataset_files(dir_path: Path, previous: dict) -> dict:
+    """直下のファイルを {name: [mtime_ns, size, sha256]} で返す. mtime とサイズが同じなら再ハッシュしない."""
+    files = {}
+    for path in sorted(dir_path.iterdir()):
+        if path.name.startswith(".") or path.name == DATASET_METADATA_FILE:
+            continue
+        if path.is_dir():
+            click.echo(f"  Skip: {path.name}/ (サブディレクトリはアップロードしません。zip にまとめてください)")
+            continue
+        if fingerprint := file_fingerprint(path, previous.get(path.name)):
+            files[path.name] = fingerprint
+    return files
+
+
+def _send_file(client, path: Path, entry: dict, chunk_size: int, resume: bool):
+    """ファイルを chunk_size ごとに再開可能アップロードで送る.
+
+    resume の場合と送信に失敗した場合は、サーバーが保存済みのバイト数を問い合わせて
+    その位置から送り直す（送信済みのチャンクは再送しない）。
+    """
+    from kaggle_notebook_deploy._api import KaggleApiError
+
+    url, total = entry["url"], entry["size"]
+    delays = backoff_delays(RETRY_DELAY, 30)
+    failures = 0
+    offset = 0
+    query = resume
+    with open(path, "rb") as f:
+        while True:
+            try:
+                if query:
+                    offset = client.upload_offset(url, total)
+                    query = False
+                if offset is None:
+                    return
+                f.seek(offset)
+                offset = client.upload_chunk(url, f.read(chunk_size), offset, total)
+                failures = 0
+            except KaggleApiError as e:
+                failures += 1
+                # 404 / 410 はアップロードセッション自体が失効している
+                if e.status_code in (404, 410) or failures > MAX_CHUNK_RETRIES:
+                    raise
+                query = True
+                time.sleep(next(delays))
+
+
+def _upload(client, dir_path: Path, name: str, fingerprint: list, chunk_size: int) -> str:
+    """1ファイルをアップロード（途中なら再開）し、アップロードトークンを返す."""
+    key = _upload_key(name, fingerprint[2])
+    entry = _load_state()["uploads"].get(key)
+    resume = entry is not None
+    if entry is None:
+        path = dir_path / name
+        resp = client.start_blob_upload(name, fingerprint[1], path.stat().st_mtime)
+        entry = {"token": resp["token"], "url": resp["createUrl"], "size": fingerprint[1],
+                 "started_at": time.time(), "complete": False}
+
+        def record(state):
+            state["uploads"][key] = entry
+
+        _update_state(record)
+        click.echo(f"  Upload: {name} ({format_bytes(fingerprint[1])})")
+    else:
+        click.echo(f"  Resume: {name} ({format_bytes(fingerprint[1])})")
+
+    _send_file(client, dir_path / name, entry, chunk_size, resume)
+
+    def complete(state):
+        state["uploads"].setdefault(key, entry)["complete"] = True
+
+    _update_state(complete)
+    return entry["token"]
+
+
+def _add_dataset_source(kernel_dir: Path, dataset_id: str) -> bool:
+    """kernel-metadata.json の dataset_sources に dataset_id を追加する. 追加したら True."""
+    metadata_path = kernel_dir / "kernel-metadata.json"
+    metadata = json.loads(metadata_path.read_text(encoding="utf-8"))
+    sources = metadata.setdefault("dataset_sources", [])
+    if dataset_id in sources:
+        return False
+    sources.append(dataset_id)
+    metadata_path.write_text(json.dumps(metadata, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    return True
+
+
+def _create_request(metadata: dict, dataset_id: str, tokens: list[str]) -> dict:
+    owner, _, slug = dataset_id.partition("/")
+    licenses = metadata.get("licenses") or [{"name": "CC0-1.0"}]
+    request = {
+        "ownerSlug": owner,
+        "slug": slug,
+        "title": metadata.get("title") or slug,
+        "licenseName": licenses[0].get("name", "CC0-1.0"),
+        "isPrivate": metadata.get("isPrivate", True),
+        "files": [{"token": t} for t in tokens],
+        "categoryIds": metadata.get("keywords", []),
+    }
+    for key in ("subtitle", "description"):
+        if metadata.get(key):
+            request[key] = metadata[key]
+    return request
+
+
+@click.command()
+@click.argument("directory", default=".")
+@click.option("--message", "-m", default="", help="バージョンノート")
+@click.option("--kernel", "-k", "kernels", multiple=True,
+              help="dataset_sources にこのデータセットを追加するカーネルディレクトリ（複数指定可）")
+@click.option("--jobs", "-j", default=4, type=click.IntRange(min=1), help="並列アップロード数")
+@click.option("--chunk-mb", default=8, type=click.IntRange(min=1), help="再開可能アップロードの1チャンクのサイズ（MB）")
+@click.option("--force", "-f", is_flag=True, default=False, help="前回のバージョンから変更がなくても新しいバージョンを作る")
+@click.option("--dry-run", is_flag=True, default=False, help="アップロードせずに対象ファイルを表示")
+def dataset(directory, message, kernels, jobs, chunk_mb, force, dry_run):
+    """ローカルディレクトリをKaggle Datasetの新しいバージョンとしてアップロードする.
+
+    DIRECTORY は dataset-metadata.json（`kaggle datasets init` で生成）を含むディレクトリです。
+    データセットが存在しなければ作成します。
+
+    ファイルの sha256 を .kaggle-deploy/datasets.json に記録し、前回のバージョンから
+    何も変わっていなければスキップします。変更のないファイルは直近のアップロードを再利用し、
+    変更のあったファイルだけを --jobs 個ずつ並列に、--chunk-mb ごとのチャンクで送ります。
+    中断した場合は、もう一度実行すると送信済みの位置から再開します。
+    """
+    from kaggle_notebook_deploy._api import KaggleApiClient, KaggleApiError, load_credentials
+
+    dir_path = Path(normalize_path(directory))
+    metadata_path = dir_path / DATASET_METADATA_FILE
+    if not metadata_path.exists():
+        click.echo(f"Error: {metadata_path} が見つかりません。", err=True)
+        click.echo(f"  kaggle datasets init -p {dir_path} で作成してください。", err=True)
+        raise SystemExit(1)
+    with open(metadata_path, encoding="utf-8") as f:
+        metadata = json.load(f)
+    dataset_id = metadata.get("id", "")
+    if dataset_id.count("/") != 1:
+        click.echo(f"Error: {metadata_path} の id は 'owner/slug' 形式で指定してください。", err=True)
+        raise SystemExit(1)
+    for kernel_dir in kernels:
+        if not (Path(normalize_path(kernel_dir)) / "kernel-metadata.json").exists():
+            click.echo(f"Error: {Path(normalize_path(kernel_dir)) / 'kernel-metadata.json'} が見つかりません。", err=True)
+            raise SystemExit(1)
+
+    state = _load_state()
+    previous = state["datasets"].get(dataset_id, {})
+    files = _dataset_files(dir_path, previous.get("files", {}))
+    if not files:
+        click.echo(f"Error: {dir_path} にアップロードするファイルがありません。", err=True)
+        raise SystemExit(1)
+
+    click.echo(f"Dataset: {dataset_id} ({len(files)} files, {format_bytes(sum(f[1] for f in files.values()))})")
+    unchanged = {n: f[2] for n, f in files.items()} == {n: f[2] for n, f in previous.get("files", {}).items()}
+    if unchanged and not force:
+        click.echo("Skip: 前回のバージョンから変更がありません（--force で強制）")
+        _update_kernels(kernels, dataset_id)
+        return
+
+    reused = {}
+    for name, fingerprint in files.items():
+        entry = state["uploads"].get(_upload_key(name, fingerprint[2]))
+        if entry and entry.get("complete"):
+            reused[name] = entry["token"]
+            click.echo(f"  Unchanged: {name} (アップロード済み)")
+    pending = [name for name in files if name not in reused]
+
+    if dry_run:
+        for name in pending:
+            click.echo(f"  Dry run: upload {name} ({format_bytes(files[name][1])})")
+        return
+
+    credentials = load_credentials()
+    if credentials is None:
+        click.echo("Error: Kaggle APIの認証情報が見つかりません。", err=True)
+        click.echo("  ~/.kaggle/kaggle.json または KAGGLE_USERNAME / KAGGLE_KEY を設定してください。", err=True)
+        raise SystemExit(1)
+    client = KaggleApiClient(credentials)
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            tokens = dict(zip(pending, pool.map(
+                lambda name: _upload(client, dir_path, name, files[name], chunk_mb * MB), pending)))
+        tokens.update(reused)
+        ordered = [tokens[name] for name in files]
+
+        exists = bool(previous)
+        if not exists:
+            try:
+                client.get_dataset(dataset_id)
+                exists = True
+            except KaggleApiError as e:
+                if e.status_code != 404:
+                    raise
+        if exists:
+            click.echo("Creating dataset version...")
+            resp = client.create_dataset_version(dataset_id, {
+                "versionNotes": message,
+                "files": [{"token": t} for t in ordered],
+                "deleteOldVersions": False,
+            })
+        else:
+            click.echo("Creating dataset...")
+            resp = client.create_dataset(_create_request(metadata, dataset_id, ordered))
+    except (KaggleApiError, OSError, KeyError) as e:
+        click.echo(f"Error: {e}", err=True)
+        click.echo("  もう一度実行すると、送信済みのファイル・チャンクから再開します。", err=True)
+        raise SystemExit(1)
+    finally:
+        client.close()
+
+    if resp.get("error"):
+        click.echo(f"Error: {resp['error']}", err=True)
+        raise SystemExit(1)
+
+    def record(state):
+        state["datasets"][dataset_id] = {
+            "directory": dir_path.as_posix(),
+            "files": files,
+            "versioned_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+
+    _update_state(record)
+    click.echo(f"Dataset {'version created' if exists else 'created'}: {resp.get('url') or dataset_id}")
+    _update_kernels(kernels, dataset_id)
+
+
+def _update_kernels(kernels: tuple, dataset_id: str):
+    for kernel_dir in kernels:
+        path = Path(normalize_path(kernel_dir))
+        if _add_dataset_source(path, dataset_id):
+            click.echo(f"  dataset_sources に追加: {path / 'kernel-metadata.json'}")
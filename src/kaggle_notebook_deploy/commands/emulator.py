@@ -0,0 +1,62 @@
+"""kaggle-deploy emulator: Kaggle のカーネル API を手元で再現するサーバー."""
+
+import click
+
+from kaggle_notebook_deploy._emulator import EmulatorConfig, EmulatorServer
+from kaggle_notebook_deploy.commands._common import Duration
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="待ち受けるアドレス")
+@click.option("--port", default=8765, type=click.IntRange(min=0, max=65535), help="待ち受けるポート（0 で空きポート）")
+@click.option("--queue-time", default="5s", type=Duration(), help="push から RUNNING になるまでの時間")
+@click.option("--run-time", default="30s", type=Duration(), help="RUNNING から完了までの時間")
+@click.option("--error-rate", default=0.0, type=click.FloatRange(0, 1), help="ERROR で終わるカーネルの割合")
+@click.option("--fail-kernel", "fail_kernels", multiple=True, metavar="GLOB",
+              help="必ず ERROR で終わらせるカーネル ID のパターン（例: 'user/*-broken'、複数指定可）")
+@click.option("--log-mb", default=0.0625, type=click.FloatRange(min=0), help="完了後のカーネルログの大きさ（MB）")
+@click.option("--latency", default=0.0, type=click.FloatRange(min=0), help="各リクエストに加える遅延（秒）")
+@click.option("--throttle-rate", default=0.0, type=click.FloatRange(0, 1), help="429 を返すリクエストの割合")
+@click.option("--server-error-rate", default=0.0, type=click.FloatRange(0, 1), help="500/502/503 を返すリクエストの割合")
+@click.option("--retry-after", default="1s", type=Duration(), help="注入した 429 に付ける Retry-After")
+@click.option("--rate-limit", default=None, type=click.FloatRange(min=0, min_open=True),
+              help="クライアントごとの毎秒リクエスト数の上限. 超えたら 429 を返す")
+@click.option("--seed", default=None, type=int, help="エラー・障害注入の乱数シード")
+def emulator(host, port, queue_time, run_time, error_rate, fail_kernels, log_mb, latency, throttle_rate,
+             server_error_rate, retry_after, rate_limit, seed):
+    """Kaggle のカーネル API（push / status / output）を手元で再現するサーバーを起動する.
+
+    push したカーネルは --queue-time の間 QUEUED、--run-time の間 RUNNING になり、
+    その後 COMPLETE（--error-rate / --fail-kernel に当たれば ERROR）になります。
+    遅延・429・5xx を注入できるので、認証情報や実際のカーネルなしで
+    push --wait やリトライ、並列デプロイの負荷を試せます。
+    """
+    config = EmulatorConfig(
+        queue_seconds=queue_time,
+        run_seconds=run_time,
+        error_rate=error_rate,
+        fail_kernels=list(fail_kernels),
+        log_bytes=int(log_mb * 1024 * 1024),
+        latency=latency,
+        throttle_rate=throttle_rate,
+        server_error_rate=server_error_rate,
+        retry_after=retry_after,
+        rate_limit=rate_limit,
+        seed=seed,
+    )
+    try:
+        server = EmulatorServer((host, port), config)
+    except OSError as e:
+        click.echo(f"Error: {host}:{port} で待ち受けできません: {e}", err=True)
+        raise SystemExit(1)
+
+    click.echo(f"Kaggle API emulator on {server.url}")
+    click.echo("  export KAGGLE_DEPLOY_BACKEND=api KAGGLE_USERNAME=emulator KAGGLE_KEY=emulator")
+    click.echo(f"  export KAGGLE_API_ENDPOINT={server.url}")
+    try:
+        server.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        click.echo("Stopped.")
@@ -0,0 +1,77 @@
+"""kaggle-deploy history: push / --wait の実行履歴と実行時間の統計を表示する."""
+
+import json
+from datetime import datetime
+
+import click
+
+from kaggle_notebook_deploy._history import load_runs, summarize
+from kaggle_notebook_deploy.commands._common import format_duration
+
+
+def _fmt(seconds) -> str:
+    return format_duration(seconds) if seconds is not None else "-"
+
+
+def _print_table(headers: tuple, rows: list[tuple]):
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+    for row in [headers] + rows:
+        click.echo("  " + "  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip())
+
+
+def _print_runs(runs: list[dict]):
+    rows = []
+    for r in runs:
+        tail = (r["error_tail"] or "").strip().splitlines()
+        rows.append((
+            datetime.fromtimestamp(r["pushed_at"]).strftime("%Y-%m-%d %H:%M"),
+            r["status"],
+            _fmt(r["queue_seconds"]),
+            _fmt(r["run_seconds"]),
+            (r["git_sha"] or "-")[:7],
+            tail[-1][:80] if tail else "",
+        ))
+    _print_table(("PUSHED", "STATUS", "QUEUE", "RUN", "GIT", "ERROR"), rows)
+
+
+@click.command()
+@click.argument("kernel_id", required=False)
+@click.option("--window", default=10, type=click.IntRange(min=1), help="回帰判定のベースラインに使う直前の成功回数")
+@click.option("--threshold", default=1.5, type=click.FloatRange(min=1), help="ベースライン（中央値）の何倍で回帰とみなすか")
+@click.option("--limit", default=20, type=click.IntRange(min=1), help="KERNEL_ID 指定時に表示する直近の実行数")
+@click.option("--json", "as_json", is_flag=True, default=False, help="集計結果を JSON で出力する")
+@click.option("--fail-on-regression", is_flag=True, default=False, help="回帰があれば終了コード 1 を返す（CI 用）")
+def history(kernel_id, window, threshold, limit, as_json, fail_on_regression):
+    """push / --wait の実行履歴から、カーネルごとの実行時間と失敗率を表示する.
+
+    .kaggle-deploy/history.sqlite3 に記録された push ごとの git sha・コンテンツハッシュ・
+    キュー待ち時間・実行時間・最終ステータス・エラー末尾を集計します。
+    最新の成功時の実行時間が、直前 --window 回の成功の中央値の --threshold 倍を超えたら回帰として表示します。
+
+    KERNEL_ID を指定すると、そのカーネルの直近の実行一覧も表示します。
+    """
+    runs = load_runs(kernel_id)
+    by_kernel: dict[str, list[dict]] = {}
+    for r in runs:
+        by_kernel.setdefault(r["kernel_id"], []).append(r)
+    summaries = {k: summarize(v, window, threshold) for k, v in sorted(by_kernel.items())}
+
+    if as_json:
+        click.echo(json.dumps(summaries, indent=2))
+    elif not summaries:
+        click.echo("履歴がありません（push の実行時に .kaggle-deploy/history.sqlite3 に記録されます）。")
+    else:
+        rows = []
+        for k, s in summaries.items():
+            note = f"REGRESSION {_fmt(s['latest'])} vs {_fmt(s['baseline'])}" if s["regression"] else ""
+            rows.append((
+                k, str(s["runs"]), f"{s['failures']}/{s['finished']}", _fmt(s["p50"]), _fmt(s["p95"]),
+                _fmt(s["queue_p50"]), s["last_status"] or "-", note,
+            ))
+        _print_table(("KERNEL", "RUNS", "FAILED", "P50", "P95", "QUEUE P50", "LAST", ""), rows)
+        if kernel_id:
+            click.echo("")
+            _print_runs(by_kernel[kernel_id][-limit:])
+
+    if fail_on_regression and any(s["regression"] for s in summaries.values()):
+        raise SystemExit(1)
@@ -4,6 +4,7 @@ import json
 import os
 from pathlib import Path
 from string import Template
+from typing import Optional
 
 import click
 
@@ -82,26 +83,79 @@ def _get_kaggle_username() -> str:
     return os.environ.get("KAGGLE_USERNAME", "your-username")
 
 
+# --manifest で指定できる列（slug 以外は省略可）
+MANIFEST_FIELDS = ("slug", "variant", "directory", "title", "username", "gpu", "internet", "public")
+MANIFEST_FLAGS = ("gpu", "internet", "public")
+
+_TRUE_STRINGS = ("true", "yes", "y", "1", "on")
+_FALSE_STRINGS = ("false", "no", "n", "0", "off", "")
+
+
+def _render(competition_slug: str, username: str, title: Optional[str], gpu: bool, internet: bool, public: bool,
+            variant: str = "baseline") -> tuple[str, dict[str, str]]:
+    """kernel-metadata.json と Notebook の内容を生成し、(code_file, {ファイル名: 内容}) を返す."""
+    slug = f"{competition_slug}-{variant}"
+    if title is None:
+        title = competition_slug.replace("-", " ").title() + " " + variant.replace("-", " ").title()
+
+    metadata = KERNEL_METADATA_TEMPLATE.copy()
+    metadata["id"] = f"{username}/{slug}"
+    metadata["title"] = title
+    metadata["code_file"] = f"{slug}.ipynb"
+    metadata["is_private"] = "false" if public else "true"
+    metadata["enable_gpu"] = "true" if gpu else "false"
+    metadata["enable_internet"] = "true" if internet else "false"
+    metadata["competition_sources"] = [competition_slug]
+
+    notebook_content = NOTEBOOK_TEMPLATE.substitute(
+        title=title,
+        competition=competition_slug,
+    )
+    files = {
+        "kernel-metadata.json": json.dumps(metadata, indent=2, ensure_ascii=False) + "\n",
+        metadata["code_file"]: notebook_content,
+    }
+    return metadata["code_file"], files
+
+
 @click.command()
-@click.argument("competition_slug")
+@click.argument("competition_slug", required=False)
 @click.option("--username", "-u", default=None, help="Kaggleユーザー名（省略時は~/.kaggle/kaggle.jsonから取得）")
-@click.option("--title", "-t", default=None, help="Notebookのタイトル（省略時はslugから生成）")
+@click.option("--title", "-t", default=None,
+              help="Notebookのタイトル（省略時はslugから生成。--manifest ではエントリごとに title を指定）")
 @click.option("--gpu", is_flag=True, default=False, help="GPU有効化")
 @click.option("--internet", is_flag=True, default=False, help="インターネット有効化（コードコンペでは非推奨）")
 @click.option("--public", is_flag=True, default=False, help="公開Notebook（デフォルトは非公開）")
-def init(competition_slug, username, title, gpu, internet, public):
+@click.option("--manifest", "-m", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="複数ディレクトリをまとめて生成する YAML / CSV ファイル")
+@click.option("--jobs", "-j", default=8, type=click.IntRange(min=1), help="--manifest 時の並列書き込み数")
+def init(competition_slug, username, title, gpu, internet, public, manifest, jobs):
     """コンペ用ディレクトリを雛形から生成する.
 
     COMPETITION_SLUG はKaggleコンペのスラッグ（URLの末尾部分）です。
     例: kaggle-deploy init titanic
+
+    --manifest を指定すると、ファイルに列挙したコンペ・バリアントのディレクトリを
+    まとめて生成します。既に存在するディレクトリはスキップします。
     """
     if username is None:
         username = _get_kaggle_username()
 
-    if title is None:
-        title = competition_slug.replace("-", " ").title() + " Baseline"
-
-    slug = competition_slug + "-baseline"
+    if manifest:
+        if competition_slug:
+            click.echo("Error: COMPETITION_SLUG と --manifest は同時に指定できません。", err=True)
+            raise SystemExit(1)
+        if title is not None:
+            # 全エントリが同じタイトルになり、タイトルから決まるカーネル ID が衝突する
+            click.echo("Error: --title と --manifest は同時に指定できません。マニフェストの各エントリに title を指定してください。",
+                       err=True)
+            raise SystemExit(1)
+        defaults = {"username": username, "gpu": gpu, "internet": internet, "public": public}
+        _init_manifest(Path(manifest), defaults, jobs)
+        return
+    if not competition_slug:
+        click.echo("Error: COMPETITION_SLUG または --manifest を指定してください。", err=True)
+        raise SystemExit(1)
 
     # ディレクトリ作成
     dir_path = Path(competition_slug)
@@ -111,33 +165,13 @@ def init(competition_slug, username, title, gpu, internet, public):
 
     dir_path.mkdir(parents=True)
 
-    # kernel-metadata.json 生成
-    metadata = KERNEL_METADATA_TEMPLATE.copy()
-    metadata["id"] = f"{username}/{slug}"
-    metadata["title"] = title
-    metadata["code_file"] = f"{slug}.ipynb"
-    metadata["is_private"] = "false" if public else "true"
-    metadata["enable_gpu"] = "true" if gpu else "false"
-    metadata["enable_internet"] = "true" if internet else "false"
-    metadata["competition_sources"] = [competition_slug]
-
-    metadata_path = dir_path / "kernel-metadata.json"
-    with open(metadata_path, "w") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
-        f.write("\n")
-
-    click.echo(f"  {metadata_path}")
-
-    # Notebook 生成
-    notebook_content = NOTEBOOK_TEMPLATE.substitute(
-        title=title,
-        competition=competition_slug,
-    )
-    notebook_path = dir_path / f"{slug}.ipynb"
-    with open(notebook_path, "w") as f:
-        f.write(notebook_content)
+    code_file, files = _render(competition_slug, username, title, gpu, internet, public)
+    for name, content in files.items():
+        with open(dir_path / name, "w") as f:
+            f.write(content)
+        click.echo(f"  {dir_path / name}")
 
-    click.echo(f"  {notebook_path}")
+    notebook_path = dir_path / code_file
 
     # サマリ
     click.echo("")
@@ -151,3 +185,114 @@ def init(competition_slug, username, title, gpu, internet, public):
     if internet:
         click.echo("")
         click.echo("Warning: enable_internet=true はコードコンペでは提出不可になります。")
+
+
+def _parse_flag(value, field: str) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE_STRINGS:
+        return True
+    if text in _FALSE_STRINGS:
+        return False
+    raise ValueError(f"{field} '{value}' は真偽値として解釈できません")
+
+
+def load_manifest(path: Path) -> list[dict]:
+    """YAML / CSV のマニフェストを読み、エントリのリストを返す.
+
+    YAML はエントリのリスト、または {"defaults": {...}, "kernels": [...]}。
+    各エントリは文字列（slug のみ）か MANIFEST_FIELDS をキーに持つ dict。
+    CSV は1行目をヘッダとして同じ列名を使う。
+    """
+    if path.suffix.lower() == ".csv":
+        import csv
+
+        with open(path, newline="", encoding="utf-8") as f:
+            try:
+                rows = [{k.strip(): (v or "").strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+            except csv.Error as e:
+                raise ValueError(f"CSV パースエラー: {e}") from e
+        return [{k: v for k, v in row.items() if v != ""} for row in rows if any(row.values())]
+
+    import yaml
+
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = yaml.safe_load(f) or []
+        except yaml.YAMLError as e:
+            raise ValueError(f"YAML パースエラー: {e}") from e
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get("defaults") or {}
+        data = data.get("kernels") or []
+    if not isinstance(data, list) or not isinstance(defaults, dict):
+        raise ValueError("マニフェストはエントリのリスト、または defaults / kernels を持つ形式である必要があります")
+    return [{**defaults, **({"slug": e} if isinstance(e, str) else e)} for e in data]
+
+
+def _plan(entries: list[dict], defaults: dict) -> list[tuple[Path, dict]]:
+    """マニフェストの各エントリを (ディレクトリ, {ファイル名: 内容}) に展開する."""
+    plans = []
+    seen = {}
+    titles = {}
+    for i, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{i}件目: エントリは slug または dict である必要があります")
+        unknown = set(entry) - set(MANIFEST_FIELDS)
+        if unknown:
+            raise ValueError(f"{i}件目: 不明な項目 {sorted(unknown)}（有効値: {list(MANIFEST_FIELDS)}）")
+        if not entry.get("slug"):
+            raise ValueError(f"{i}件目: slug がありません")
+
+        options = {**defaults, **entry}
+        slug = str(options["slug"])
+        variant = str(options.get("variant") or "baseline")
+        directory = Path(str(options.get("directory") or (slug if variant == "baseline" else f"{slug}-{variant}")))
+        if directory in seen:
+            raise ValueError(f"{i}件目: ディレクトリ '{directory}' が{seen[directory]}件目と重複しています")
+        seen[directory] = i
+
+        flags = {name: _parse_flag(options.get(name, False), name) for name in MANIFEST_FLAGS}
+        _, files = _render(slug, str(options["username"]), options.get("title"), variant=variant, **flags)
+        # Kaggle はタイトルからカーネルの slug を決めるので、同じタイトルは同じカーネルへの push になる
+        title = json.loads(files["kernel-metadata.json"])["title"]
+        if title.lower() in titles:
+            raise ValueError(f"{i}件目: タイトル '{title}' が{titles[title.lower()]}件目と重複しています")
+        titles[title.lower()] = i
+        plans.append((directory, files))
+    return plans
+
+
+def _init_manifest(manifest: Path, defaults: dict, jobs: int):
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        plans = _plan(load_manifest(manifest), defaults)
+    except (OSError, ValueError, TypeError) as e:
+        click.echo(f"Error: {manifest}: {e}", err=True)
+        raise SystemExit(1)
+
+    # ディレクトリは1パスで作成し、既存のものは触らない
+    created = []
+    for directory, files in plans:
+        try:
+            directory.mkdir(parents=True)
+        except FileExistsError:
+            click.echo(f"  Skip: {directory}/ (既に存在)")
+            continue
+        created.append((directory, files))
+
+    def write(item):
+        directory, files = item
+        for name, content in files.items():
+            with open(directory / name, "w") as f:
+                f.write(content)
+        return directory
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for directory in pool.map(write, created):
+            click.echo(f"  {directory}/")
+
+    click.echo("")
+    click.echo(f"{len(created)} created, {len(plans) - len(created)} skipped.")
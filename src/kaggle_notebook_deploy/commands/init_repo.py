@@ -36,6 +36,137 @@ jobs:
         run: kaggle kernels push -p ${{ inputs.notebook_dir }}
 """
 
+# --matrix: push で変更されたカーネルディレクトリだけを並列ジョブで push する
+MATRIX_WORKFLOW_TEMPLATE = """\
+name: Push Notebook to Kaggle
+
+on:
+  push:
+    branches: [__BRANCH__]
+  workflow_dispatch:
+    inputs:
+      notebook_dir:
+        description: "Notebookが格納されたディレクトリ名（省略時は直前のコミットからの変更を検出）"
+        required: false
+        type: string
+
+concurrency:
+  group: kaggle-push-${{ github.ref }}
+  cancel-in-progress: false
+
+jobs:
+  detect:
+    runs-on: ubuntu-latest
+    outputs:
+      dirs: ${{ steps.detect.outputs.dirs }}
+    steps:
+      # 履歴はコミットのみ取得し（ツリー・ファイルは必要になるまで取得しない）、作業ツリーはほぼ空にする
+      - uses: actions/checkout@v4
+        with:
+          fetch-depth: 0
+          filter: tree:0
+          sparse-checkout: .github
+
+      - name: Detect changed kernel directories
+        id: detect
+        env:
+          BEFORE: ${{ github.event.before }}
+          DEFAULT_BRANCH: ${{ github.event.repository.default_branch }}
+          NOTEBOOK_DIR: ${{ inputs.notebook_dir }}
+        run: |
+          python3 - <<'EOF'
+          import json
+          import os
+          import subprocess
+
+          # 空ツリー. 比較対象のコミットがない（リポジトリ最初の push など）ときはツリー全体を変更とみなす
+          EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+          sha = os.environ["GITHUB_SHA"]
+          before = os.environ.get("BEFORE", "")
+
+          def git(*args):
+              return subprocess.run(["git", *args], capture_output=True, text=True)
+
+          def resolve(rev):
+              result = git("rev-parse", "--verify", "--quiet", rev + "^{commit}")
+              return result.stdout.strip() if result.returncode == 0 else None
+
+          def base_revision():
+              if before.strip("0"):
+                  # force-push で before が取得できない場合は None（全ディレクトリを push）
+                  return resolve(before)
+              default = os.environ.get("DEFAULT_BRANCH")
+              if os.environ.get("GITHUB_EVENT_NAME") == "push" and default:
+                  # 新しいブランチの最初の push: デフォルトブランチとの分岐点から比較する
+                  result = git("merge-base", "origin/" + default, sha)
+                  base = result.stdout.strip()
+                  if result.returncode == 0 and base != sha:
+                      return base
+                  return EMPTY_TREE
+              return resolve(sha + "~1") or EMPTY_TREE
+
+          def kernel_dir(d):
+              # 変更ファイルから上にたどり、kernel-metadata.json のあるディレクトリを探す
+              while True:
+                  probe = sha + ":" + (d + "/" if d else "") + "kernel-metadata.json"
+                  if git("cat-file", "-e", probe).returncode == 0:
+                      return d or "."
+                  if not d:
+                      return None
+                  d = os.path.dirname(d)
+
+          if os.environ.get("NOTEBOOK_DIR"):
+              dirs = [os.environ["NOTEBOOK_DIR"]]
+          else:
+              base = base_revision()
+              diff = git("diff", "--name-only", "--no-renames", base, sha) if base else None
+              if diff is None or diff.returncode != 0:
+                  print("Could not diff against", before or "the previous commit", "- pushing every kernel directory")
+                  paths = git("ls-tree", "-r", "--name-only", sha).stdout.splitlines()
+                  dirs = {os.path.dirname(p) or "." for p in paths if os.path.basename(p) == "kernel-metadata.json"}
+              else:
+                  candidates = {os.path.dirname(path) for path in diff.stdout.splitlines()}
+                  dirs = {d for d in map(kernel_dir, candidates) if d is not None}
+              dirs = sorted(dirs)
+          print("Changed kernel directories:", dirs)
+          with open(os.environ["GITHUB_OUTPUT"], "a") as f:
+              f.write("dirs=" + json.dumps(dirs) + "\\n")
+          EOF
+
+  push:
+    needs: detect
+    if: needs.detect.outputs.dirs != '[]'
+    runs-on: ubuntu-latest
+    strategy:
+      fail-fast: false
+      max-parallel: 10
+      matrix:
+        notebook_dir: ${{ fromJSON(needs.detect.outputs.dirs) }}
+    steps:
+      # 最新コミットだけを、対象ディレクトリとワークフロー定義に絞ってチェックアウトする
+      - uses: actions/checkout@v4
+        with:
+          fetch-depth: 1
+          sparse-checkout: |
+            ${{ matrix.notebook_dir }}
+            .github
+
+      - uses: actions/setup-python@v5
+        with:
+          python-version: "3.12"
+          cache: pip
+          cache-dependency-path: .github/workflows/kaggle-push.yml
+
+      - name: Install Kaggle CLI
+        run: pip install kaggle
+
+      - name: Push notebook to Kaggle
+        env:
+          KAGGLE_USERNAME: ${{ secrets.KAGGLE_USERNAME }}
+          KAGGLE_KEY: ${{ secrets.KAGGLE_KEY }}
+        run: kaggle kernels push -p "${{ matrix.notebook_dir }}"
+"""
+
 GITIGNORE_ADDITIONS = """\
 # === Kaggle Deploy ===
 # Data files
@@ -67,6 +198,10 @@ GITIGNORE_ADDITIONS = """\
 # Submissions
 submission*.csv
 
+# kaggle-notebook-deploy caches (state.json holds push hashes and may be committed)
+.kaggle-deploy/*
+!.kaggle-deploy/state.json
+
 # Credentials (NEVER commit these)
 .kaggle/
 kaggle.json
@@ -101,13 +236,19 @@ fi
 
 @click.command("init-repo")
 @click.option("--force", "-f", is_flag=True, default=False, help="既存ファイルを上書きする")
-def init_repo(force):
+@click.option("--matrix", is_flag=True, default=False,
+              help="push で変更されたカーネルディレクトリだけを並列ジョブで push するワークフローを生成する")
+@click.option("--branch", default="main", show_default=True, help="--matrix 時に push をトリガーするブランチ")
+def init_repo(force, matrix, branch):
     """リポジトリにGitHub Actionsワークフローと関連ファイルをセットアップする.
 
     カレントディレクトリに以下を生成します:
     - .github/workflows/kaggle-push.yml
     - scripts/setup-credentials.sh
     - .gitignore への追記
+
+    --matrix を指定すると、ワークフローは BRANCH への push で変更のあった
+    ディレクトリを検出し、それぞれを並列ジョブ（スパースチェックアウト・pip キャッシュ付き）で push します。
     """
     created = []
 
@@ -119,7 +260,7 @@ def init_repo(force):
         click.echo(f"  Skip: {workflow_path} (既に存在。--force で上書き)")
     else:
         workflow_dir.mkdir(parents=True, exist_ok=True)
-        workflow_path.write_text(WORKFLOW_TEMPLATE)
+        workflow_path.write_text(MATRIX_WORKFLOW_TEMPLATE.replace("__BRANCH__", branch) if matrix else WORKFLOW_TEMPLATE)
         created.append(str(workflow_path))
         click.echo(f"  {workflow_path}")
 
@@ -0,0 +1,45 @@
+"""kaggle-deploy logs: カーネルログを表示する."""
+
+import click
+
+from kaggle_notebook_deploy._utils import print_new_log_entries
+from kaggle_notebook_deploy.commands._common import Duration, resolve_backend, wait_for_kernel
+
+
+@click.command()
+@click.argument("kernel_id")
+@click.option("--follow", "-f", is_flag=True, default=False, help="カーネル完了まで新しいログを逐次表示する")
+@click.option("--timeout", default="12h", type=Duration(), help="--follow の待機上限（例: 90, 30m, 9h）")
+@click.option("--poll-interval", default="5s", type=Duration(),
+              help="--follow の最初のポーリング間隔。以降は指数的に伸びる")
+@click.option("--max-poll-interval", default="30s", type=Duration(), help="--follow のポーリング間隔の上限")
+def logs(kernel_id, follow, timeout, poll_interval, max_poll_interval):
+    """カーネルの stdout / stderr ログを表示する.
+
+    KERNEL_ID は username/slug 形式のカーネルIDです。
+    例: kaggle-deploy logs -f user/titanic-baseline
+
+    --follow では前回読んだ位置から続きだけを取得します（API は HTTP Range）。
+    kaggle CLI バックエンドは毎回ログ全体をダウンロードし、新しい部分だけを解析します。
+    """
+    backend = resolve_backend()
+
+    if not follow:
+        with backend.open_log(kernel_id) as log_stream:
+            if log_stream is None:
+                click.echo("(no kernel log found)")
+                return
+            print_new_log_entries(log_stream, 0, click.echo)
+        return
+
+    outcome = wait_for_kernel(
+        backend,
+        kernel_id,
+        click.echo,
+        timeout=timeout,
+        poll_interval=poll_interval,
+        max_poll_interval=max(poll_interval, max_poll_interval),
+        follow=True,
+    )
+    if outcome != "complete":
+        raise SystemExit(1)
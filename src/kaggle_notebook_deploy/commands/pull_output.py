@@ -0,0 +1,226 @@
+"""kaggle-deploy pull-output: カーネルの出力ファイルをダウンロードする."""
+
+import fnmatch
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+import click
+
+from kaggle_notebook_deploy._state import file_fingerprint, load_json, save_json
+from kaggle_notebook_deploy._utils import download_kernel_output, format_bytes, normalize_path
+from kaggle_notebook_deploy.commands._common import resolve_backend
+
+OUTPUT_STATE_FILE = "outputs.json"
+_CHUNK_SIZE = 1024 * 1024
+
+_state_lock = threading.Lock()
+
+
+def _selected(name: str, includes: tuple, excludes: tuple) -> bool:
+    if includes and not any(fnmatch.fnmatchcase(name, pattern) for pattern in includes):
+        return False
+    return not any(fnmatch.fnmatchcase(name, pattern) for pattern in excludes)
+
+
+def _target_path(dest: Path, name: str) -> Optional[Path]:
+    """出力ファイル名を保存先のパスに変換する. dest の外を指す名前は None."""
+    parts = PurePosixPath(name).parts
+    if not parts or PurePosixPath(name).is_absolute() or ".." in parts:
+        return None
+    return dest.joinpath(*parts)
+
+
+def _local_matches(target: Path, entry: Optional[dict]) -> bool:
+    """前回 pull したときのファイルがそのまま手元に残っていれば True."""
+    if not entry:
+        return False
+    fingerprint = file_fingerprint(target, entry.get("fingerprint"))
+    return fingerprint is not None and fingerprint[1:] == entry["fingerprint"][1:]
+
+
+def _write_atomic(chunks, target: Path, expected: Optional[int] = None) -> tuple[int, str]:
+    """chunks を同じディレクトリの一時ファイルに書いてから置き換え、(サイズ, sha256) を返す.
+
+    中断された場合や expected バイトに足りない場合は OSError になり、target は書き換えない。
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".part")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+        if expected is not None and size != expected:
+            raise OSError(f"{size} of {expected} bytes received")
+        os.replace(tmp, target)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return size, h.hexdigest()
+
+
+def _record(kernel_id: str, dest: Path, updates: dict):
+    """outputs.json に {保存先パス: エントリ} を書き足す（ワーカースレッドから呼ばれる）."""
+    with _state_lock:
+        state = load_json(OUTPUT_STATE_FILE)
+        kernel = state.setdefault("kernels", {}).setdefault(kernel_id, {})
+        kernel.setdefault("files", {}).update(updates)
+        kernel["directory"] = dest.as_posix()
+        kernel["pulled_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        save_json(OUTPUT_STATE_FILE, state)
+
+
+def _pull_file(client, item: dict, target: Path, previous: Optional[dict], force: bool) -> tuple[str, dict]:
+    """1ファイルをダウンロードし、("downloaded" | "unchanged", manifest エントリ) を返す.
+
+    出力ファイルの URL は GET 用に署名されているので HEAD は使えない。レスポンスヘッダの
+    ETag（なければ Content-Length）が前回と同じで、手元のファイルも前回のままなら、
+    本文を読まずに接続を閉じる。
+    """
+    resp = client.open_download(item["url"])
+    with resp:
+        etag = resp.headers.get("ETag")
+        length = resp.headers.get("Content-Length")
+        # Content-Encoding 付きの場合、Content-Length は展開後のサイズではない
+        expected = int(length) if length and not resp.headers.get("Content-Encoding") else None
+
+        if not force and _local_matches(target, previous):
+            if (etag and etag == previous.get("etag")) or (not etag and expected == previous["fingerprint"][1]):
+                return "unchanged", previous
+
+        size, sha256 = _write_atomic(resp.iter_content(_CHUNK_SIZE), target, expected)
+    st = target.stat()
+    return "downloaded", {"fingerprint": [st.st_mtime_ns, size, sha256], "etag": etag}
+
+
+def _pull_api(client, kernel_id: str, dest: Path, includes: tuple, excludes: tuple,
+              jobs: int, force: bool, dry_run: bool) -> list[str]:
+    """API で出力ファイルを一覧し、選択されたものを jobs 個ずつ並列にダウンロードする. 失敗したファイル名を返す."""
+    from kaggle_notebook_deploy._api import KaggleApiError
+
+    previous = load_json(OUTPUT_STATE_FILE).get("kernels", {}).get(kernel_id, {}).get("files", {})
+    targets = []
+    for item in client.list_output_files(kernel_id):
+        name = item["fileName"]
+        if not _selected(name, includes, excludes):
+            continue
+        target = _target_path(dest, name)
+        if target is None:
+            click.echo(f"  Skip: {name} (保存先ディレクトリの外を指しています)", err=True)
+            continue
+        targets.append((item, target))
+
+    if not targets:
+        click.echo("No matching output files.")
+        return []
+    if dry_run:
+        for item, target in targets:
+            click.echo(f"  Dry run: {item['fileName']} -> {target}")
+        return []
+
+    def run(pair):
+        item, target = pair
+        key = target.as_posix()
+        try:
+            status, entry = _pull_file(client, item, target, previous.get(key), force)
+        except (KaggleApiError, OSError) as e:
+            click.echo(f"  Failed: {item['fileName']}: {e}", err=True)
+            return item["fileName"]
+        if status == "unchanged":
+            click.echo(f"  Unchanged: {item['fileName']}")
+        else:
+            click.echo(f"  Downloaded: {item['fileName']} ({format_bytes(entry['fingerprint'][1])})")
+            _record(kernel_id, dest, {key: entry})
+        return None
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return [name for name in pool.map(run, targets) if name]
+
+
+def _pull_cli(kaggle_cmd: str, kernel_id: str, dest: Path, includes: tuple, excludes: tuple,
+              force: bool, dry_run: bool) -> list[str]:
+    """kaggle CLI で出力をダウンロードする. 一覧は取れないので、落としてから手元と比較して置き換える."""
+    if dry_run:
+        click.echo(f"  Dry run: kaggle kernels output {kernel_id} -p {dest}")
+        return []
+
+    previous = load_json(OUTPUT_STATE_FILE).get("kernels", {}).get(kernel_id, {}).get("files", {})
+    pattern = "^(?:" + "|".join(fnmatch.translate(p) for p in includes) + ")" if includes else None
+    dest.mkdir(parents=True, exist_ok=True)
+    updates = {}
+    # 置き換えを os.replace で行えるよう、一時ディレクトリは保存先と同じファイルシステムに作る
+    with tempfile.TemporaryDirectory(dir=dest, prefix=".pull-output.") as tmpdir:
+        result = download_kernel_output(kaggle_cmd, kernel_id, Path(tmpdir), pattern)
+        if result.returncode != 0:
+            click.echo(f"Error: {(result.stderr or result.stdout).strip()}", err=True)
+            raise SystemExit(1)
+        for path in sorted(p for p in Path(tmpdir).rglob("*") if p.is_file()):
+            name = path.relative_to(tmpdir).as_posix()
+            if not _selected(name, includes, excludes):
+                continue
+            target = dest.joinpath(*PurePosixPath(name).parts)
+            key = target.as_posix()
+            fingerprint = file_fingerprint(path)
+            if not force and _local_matches(target, previous.get(key)) and previous[key]["fingerprint"][2] == fingerprint[2]:
+                click.echo(f"  Unchanged: {name}")
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, target)
+            st = target.stat()
+            updates[key] = {"fingerprint": [st.st_mtime_ns, st.st_size, fingerprint[2]], "etag": None}
+            click.echo(f"  Downloaded: {name} ({format_bytes(st.st_size)})")
+    if updates:
+        _record(kernel_id, dest, updates)
+    return []
+
+
+@click.command("pull-output")
+@click.argument("kernel_id")
+@click.option("--path", "-p", "path", default=".", help="保存先ディレクトリ")
+@click.option("--include", "-i", "includes", multiple=True,
+              help="ダウンロードするファイルの glob（例: 'submission.csv', 'models/*.pt'。複数指定可）")
+@click.option("--exclude", "-x", "excludes", multiple=True, help="除外するファイルの glob（複数指定可）")
+@click.option("--jobs", "-j", default=4, type=click.IntRange(min=1), help="並列ダウンロード数")
+@click.option("--force", "-f", is_flag=True, default=False, help="手元のファイルが最新でもダウンロードし直す")
+@click.option("--dry-run", is_flag=True, default=False, help="ダウンロードせずに対象ファイルを表示")
+def pull_output(kernel_id, path, includes, excludes, jobs, force, dry_run):
+    """カーネルの出力ファイル（submission.csv、OOF、モデルなど）をダウンロードする.
+
+    KERNEL_ID は username/slug 形式のカーネルIDです。
+    例: kaggle-deploy pull-output user/titanic-baseline -i submission.csv -i 'oof_*.npy'
+
+    ダウンロードしたファイルのサイズと sha256 を .kaggle-deploy/outputs.json に記録し、
+    手元のファイルが前回のままでリモートも変わっていなければダウンロードしません。
+    各ファイルは一時ファイルに書いてから置き換えるので、中断しても壊れたファイルは残りません。
+    Kaggle API を使える場合は --jobs 個ずつ並列にダウンロードします。
+    """
+    from kaggle_notebook_deploy._api import KaggleApiError
+
+    dest = Path(normalize_path(path))
+    backend = resolve_backend()
+    click.echo(f"Pulling output: {kernel_id} -> {dest}")
+
+    if backend.name == "api":
+        try:
+            failed = _pull_api(backend.client, kernel_id, dest, includes, excludes, jobs, force, dry_run)
+        except KaggleApiError as e:
+            if not backend.fallback:
+                click.echo(f"Error: {e}", err=True)
+                raise SystemExit(1)
+            failed = _pull_cli(backend.fallback.kaggle_cmd, kernel_id, dest, includes, excludes, force, dry_run)
+    else:
+        failed = _pull_cli(backend.kaggle_cmd, kernel_id, dest, includes, excludes, force, dry_run)
+
+    if failed:
+        click.echo(f"Error: {len(failed)} 個のファイルをダウンロードできませんでした。", err=True)
+        click.echo("  もう一度実行すると、取得済みのファイルはスキップします。", err=True)
+        raise SystemExit(1)
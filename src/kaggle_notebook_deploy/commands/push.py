@@ -1,31 +1,266 @@
 """kaggle-deploy push: KaggleにNotebookをプッシュする."""
 
+import hashlib
 import json
-import subprocess
-import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
 import click
 
-import time
+from kaggle_notebook_deploy._history import record_push, update_run
+from kaggle_notebook_deploy._profile import iter_profile_records, print_profile_report
+from kaggle_notebook_deploy._stage import staged_kernel_dir
+from kaggle_notebook_deploy._state import PUSH_STATE_FILE, content_hash, load_json, save_json
+from kaggle_notebook_deploy._trace import count, span
+from kaggle_notebook_deploy._utils import find_kernel_dirs, format_bytes, normalize_path, print_kernel_diagnostics
+from kaggle_notebook_deploy.commands._common import Duration, resolve_backend, wait_for_kernel
+from kaggle_notebook_deploy.commands.run_local import preflight_directory
+from kaggle_notebook_deploy.commands.validate import check_directories
 
-from kaggle_notebook_deploy._utils import get_kernel_status, normalize_path, show_kernel_diagnostics
+
+def _validate_dir(directory: str) -> bool:
+    """validate コマンドを実行し、エラーがなければ True を返す."""
+    from kaggle_notebook_deploy.commands.validate import validate as validate_cmd
+
+    ctx = click.Context(validate_cmd, info_name="validate")
+    try:
+        ctx.invoke(validate_cmd, directory=directory)
+    except SystemExit as e:
+        if e.code != 0:
+            return False
+    return True
+
+
+_state_lock = threading.Lock()
+
+
+@dataclass
+class PushOptions:
+    """push コマンドのオプション（ワーカースレッドへまとめて渡す）."""
+
+    dry_run: bool = False
+    wait: bool = False
+    follow: bool = False
+    force: bool = False
+    slim: bool = False
+    preflight: bool = False
+    profile: bool = False
+    timeout: float = 1200
+    poll_interval: float = 5
+    max_poll_interval: float = 60
+
+
+def _pushed_hash(kernel_id: str) -> Optional[str]:
+    """前回pushに成功した時点のコンテンツハッシュを返す."""
+    entry = load_json(PUSH_STATE_FILE).get("kernels", {}).get(kernel_id)
+    return entry.get("hash") if entry else None
+
+
+def _record_push(kernel_id: str, dir_path: Path, digest: str):
+    """push成功時のコンテンツハッシュを .kaggle-deploy/state.json に記録する."""
+    with _state_lock:
+        state = load_json(PUSH_STATE_FILE)
+        state.setdefault("kernels", {})[kernel_id] = {
+            "hash": digest,
+            "directory": dir_path.as_posix(),
+            "pushed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        save_json(PUSH_STATE_FILE, state)
+
+
+def _push_one(dir_path: Path, backend, opts: PushOptions, echo) -> dict:
+    """_push_kernel を "push" スパンとして計測し、結果を pushes_total に数える."""
+    with span("push", directory=str(dir_path)) as s:
+        result = _push_kernel(dir_path, backend, opts, echo)
+        s.update(kernel=result["kernel_id"], status=result["status"])
+    count("pushes_total", status=result["status"])
+    return result
+
+
+def _push_kernel(dir_path: Path, backend, opts: PushOptions, echo) -> dict:
+    """1ディレクトリをpushし、結果を dict で返す.
+
+    echo は click.echo 互換の出力関数。並列実行時はディレクトリ名のプレフィックス付きで渡される。
+    前回pushから kernel-metadata.json と code_file が変わっていなければ（opts.force でない限り）スキップする。
+    """
+    with open(dir_path / "kernel-metadata.json") as f:
+        metadata = json.load(f)
+
+    kernel_id = metadata["id"]
+    result = {"directory": str(dir_path), "kernel_id": kernel_id, "status": "", "returncode": 0}
+    try:
+        digest = content_hash(dir_path, metadata["code_file"])
+    except OSError:
+        digest = None
+    profile = opts.profile and metadata["code_file"].endswith(".ipynb")
+    if opts.profile and not profile:
+        echo("Warning: --profile は .ipynb の code_file にのみ対応しています。計測なしでpushします。")
+    if digest and profile:
+        # 計測セル入りの版と通常の版は別の内容として扱う（切り替えたときはpushし直す）
+        digest = hashlib.sha256(f"{digest}:profile".encode()).hexdigest()
+
+    if digest and not opts.force and _pushed_hash(kernel_id) == digest:
+        echo("Skip: 前回pushから変更がありません（--force で強制push）")
+        result["status"] = "unchanged"
+        return result
+
+    if opts.slim or profile:
+        # 作業ツリーには触れず、出力などを落とした（計測セルを入れた）コピーをステージングしてpushする
+        with staged_kernel_dir(dir_path, metadata["code_file"], slim=opts.slim, profile=profile) as (
+            push_dir, before, after,
+        ):
+            if opts.slim:
+                echo(f"Slim: {format_bytes(before)} -> {format_bytes(after)} ({format_bytes(before - after)} saved)")
+            if profile:
+                echo("Profile: セルごとの計測フックを入れたコピーをpushします")
+            _upload(push_dir, backend, opts, echo, result)
+    else:
+        _upload(dir_path, backend, opts, echo, result)
+
+    if result["status"] in ("pushed", "failed"):
+        result["run_id"] = record_push(kernel_id, dir_path, digest, result["status"], result.get("stderr"))
+    if result["status"] != "pushed":
+        return result
+
+    if digest:
+        _record_push(kernel_id, dir_path, digest)
+    if not opts.wait:
+        return result
+
+    timings = {}
+    outcome = wait_for_kernel(
+        backend,
+        kernel_id,
+        echo,
+        timeout=opts.timeout,
+        poll_interval=opts.poll_interval,
+        max_poll_interval=opts.max_poll_interval,
+        follow=opts.follow,
+        timings=timings,
+    )
+    result.update(status=outcome, returncode=0 if outcome == "complete" else 1)
+    update_run(result["run_id"], status=outcome, **timings)
+    if profile and outcome != "timeout":
+        with span("profile_report", kernel=kernel_id), backend.open_log(kernel_id) as log_stream:
+            print_profile_report(list(iter_profile_records(log_stream)), echo)
+    return result
+
+
+def _upload(push_dir: Path, backend, opts: PushOptions, echo, result: dict):
+    """push_dir をアップロードし、result の status / returncode を更新する."""
+    if opts.dry_run:
+        echo(f"Dry run: {backend.describe_push(push_dir)}")
+        result["status"] = "dry-run"
+        return
+
+    echo("Pushing to Kaggle...")
+    with span("upload", kernel=result["kernel_id"], backend=backend.name) as s:
+        try:
+            returncode, stdout, stderr = backend.push(push_dir)
+        except FileNotFoundError:
+            s["error"] = "kaggle executable not found"
+            echo("Error: kaggle コマンドが見つかりません。", err=True)
+            echo("  pip install kaggle でインストールしてください。", err=True)
+            result.update(status="failed", returncode=1)
+            return
+        s["returncode"] = returncode
+        if returncode != 0:
+            s["error"] = (stderr or stdout).strip()[-500:] or f"exit {returncode}"
+
+    if stdout:
+        echo(stdout.rstrip())
+    if stderr:
+        echo(stderr.rstrip(), err=True)
+
+    if returncode != 0:
+        result.update(status="failed", returncode=returncode, stderr=stderr[-2000:] or None)
+    else:
+        result["status"] = "pushed"
+
+
+def _print_summary(results: list[dict]):
+    """並列push結果をテーブル形式で表示する."""
+    headers = ("DIRECTORY", "KERNEL", "STATUS")
+    rows = [(r["directory"], r["kernel_id"] or "-", r["status"]) for r in results]
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+
+    click.echo("")
+    click.echo("Summary:")
+    for row in [headers] + rows:
+        click.echo("  " + "  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip())
+
+    failed = sum(1 for r in results if r["returncode"] != 0)
+    click.echo("")
+    click.echo(f"{len(results) - failed} succeeded, {failed} failed.")
 
 
 @click.command()
-@click.argument("directory", default=".")
+@click.argument("directories", nargs=-1)
+@click.option("--all", "push_all", is_flag=True, default=False, help="kernel-metadata.jsonを含む全ディレクトリをpush")
+@click.option("--jobs", "-j", default=4, type=click.IntRange(min=1), help="並列push数（複数ディレクトリ時）")
 @click.option("--skip-validate", is_flag=True, default=False, help="バリデーションをスキップ")
 @click.option("--dry-run", is_flag=True, default=False, help="実行せずにコマンドを表示")
 @click.option("--wait", is_flag=True, default=False, help="Push後にカーネル完了を待機し、ERRORなら診断を表示")
-def push(directory, skip_validate, dry_run, wait):
+@click.option("--follow", is_flag=True, default=False, help="--wait 中にカーネルログを逐次表示する")
+@click.option("--timeout", default="20m", type=Duration(), help="--wait の待機上限（例: 90, 30m, 9h）")
+@click.option("--poll-interval", default="5s", type=Duration(),
+              help="--wait の最初のポーリング間隔。以降は指数的に伸びる")
+@click.option("--max-poll-interval", default="60s", type=Duration(), help="--wait のポーリング間隔の上限")
+@click.option("--force", "-f", is_flag=True, default=False, help="前回pushから変更がなくてもpushする")
+@click.option("--slim", is_flag=True, default=False,
+              help="出力・実行番号・エディタ用メタデータを除いたコピーをpushする（元ファイルは変更しない）")
+@click.option("--preflight", is_flag=True, default=False,
+              help="push前に code_file を手元でサンプルデータに対して実行し、失敗したらpushしない（run-local 参照）")
+@click.option("--profile", is_flag=True, default=False,
+              help="セルごとの実行時間・メモリをカーネルログに出す計測セルを入れたコピーをpushし、--wait 後にレポートを表示する")
+def push(directories, push_all, jobs, skip_validate, dry_run, wait, follow, timeout, poll_interval, max_poll_interval,
+         force, slim, preflight, profile):
     """KaggleにNotebookをプッシュする.
 
-    DIRECTORY はkernel-metadata.jsonを含むディレクトリです（デフォルト: カレントディレクトリ）。
+    DIRECTORIES はkernel-metadata.jsonを含むディレクトリです（デフォルト: カレントディレクトリ）。
+    複数指定または --all の場合は --jobs 個ずつ並列にpushし、最後にサマリを表示します。
+
+    前回push時の kernel-metadata.json と code_file のハッシュを .kaggle-deploy/state.json に記録し、
+    変更のないディレクトリはスキップします（--force で強制push）。
 
-    内部で `kaggle kernels push -p <directory>` を実行します。
-    事前に `kaggle` CLIのインストールと認証情報の設定が必要です。
+    Kaggle の認証情報（KAGGLE_API_TOKEN、KAGGLE_USERNAME / KAGGLE_KEY または ~/.kaggle/kaggle.json）があれば
+    Kaggle API を直接呼び出して push します。API での push に失敗しても kaggle CLI には切り替えません。
+    認証情報がない場合、または KAGGLE_DEPLOY_BACKEND=cli の場合は `kaggle kernels push -p <directory>` を実行します
+    （`kaggle` CLI のインストールが必要です）。
     """
-    dir_path = Path(normalize_path(directory))
+    if push_all:
+        roots = [Path(normalize_path(d)) for d in directories] or [Path(".")]
+        dir_paths = [p for root in roots for p in find_kernel_dirs(root)]
+        if not dir_paths:
+            click.echo("Error: kernel-metadata.json を含むディレクトリが見つかりません。", err=True)
+            raise SystemExit(1)
+    else:
+        dir_paths = [Path(normalize_path(d)) for d in directories or (".",)]
+
+    opts = PushOptions(
+        dry_run=dry_run,
+        wait=wait or follow,
+        follow=follow,
+        force=force,
+        slim=slim,
+        preflight=preflight,
+        profile=profile,
+        timeout=timeout,
+        poll_interval=poll_interval,
+        max_poll_interval=max(poll_interval, max_poll_interval),
+    )
+    if len(dir_paths) == 1 and not push_all:
+        _push_single(dir_paths[0], skip_validate, opts)
+    else:
+        _push_many(dir_paths, jobs, skip_validate, opts)
+
+
+def _push_single(dir_path: Path, skip_validate: bool, opts: PushOptions):
     metadata_path = dir_path / "kernel-metadata.json"
 
     if not metadata_path.exists():
@@ -33,17 +268,19 @@ def push(directory, skip_validate, dry_run, wait):
         raise SystemExit(1)
 
     # バリデーション
-    if not skip_validate:
-        from kaggle_notebook_deploy.commands.validate import validate as validate_cmd
+    with span("validate", directory=str(dir_path)) as s:
+        s["ok"] = skip_validate or _validate_dir(str(dir_path))
+    if not s["ok"]:
+        click.echo("")
+        click.echo("バリデーションエラーがあります。--skip-validate で無視できます。", err=True)
+        raise SystemExit(1)
 
-        ctx = click.Context(validate_cmd, info_name="validate")
-        try:
-            ctx.invoke(validate_cmd, directory=directory)
-        except SystemExit as e:
-            if e.code != 0:
-                click.echo("")
-                click.echo("バリデーションエラーがあります。--skip-validate で無視できます。", err=True)
-                raise SystemExit(1)
+    if opts.preflight:
+        click.echo("")
+        with span("preflight", directory=str(dir_path)) as s:
+            s["ok"] = preflight_directory(dir_path, click.echo)
+        if not s["ok"]:
+            raise SystemExit(1)
 
     # メタデータ表示
     with open(metadata_path) as f:
@@ -56,78 +293,94 @@ def push(directory, skip_validate, dry_run, wait):
     click.echo(f"  GPU:    {metadata['enable_gpu']}")
     click.echo(f"  Private: {metadata['is_private']}")
 
-    import shutil
-    import sysconfig
+    backend = resolve_backend()
 
-    def _find_kaggle():
-        for name in ("kaggle", "kaggle.exe"):
-            if found := shutil.which(name):
-                return found
-        for scheme in ("nt_user", "posix_user", None):
-            try:
-                scripts = Path(sysconfig.get_path("scripts", scheme) or "")
-            except KeyError:
-                continue
-            for name in ("kaggle.exe", "kaggle"):
-                candidate = scripts / name
-                if candidate.exists():
-                    return str(candidate)
-        return None
-
-    kaggle_cmd = _find_kaggle()
-    if kaggle_cmd:
-        cmd = [kaggle_cmd, "kernels", "push", "-p", str(dir_path)]
-    else:
-        click.echo("Error: kaggle コマンドが見つかりません。", err=True)
-        click.echo("  pip install kaggle でインストールしてください。", err=True)
-        raise SystemExit(1)
+    click.echo("")
+    result = _push_one(dir_path, backend, opts, click.echo)
 
-    if dry_run:
-        click.echo("")
-        click.echo(f"Dry run: {' '.join(cmd)}")
+    if result["status"] == "error" and not opts.follow:
+        click.echo("\n=== Kernel diagnostics ===")
+        with span("diagnostics", kernel=result["kernel_id"]), backend.open_log(result["kernel_id"]) as log_stream:
+            update_run(result.get("run_id"), error_tail=print_kernel_diagnostics(log_stream) or None)
+    if result["returncode"] != 0:
+        raise SystemExit(result["returncode"])
+    if opts.dry_run or result["status"] == "unchanged":
         return
 
     click.echo("")
-    click.echo("Pushing to Kaggle...")
+    click.echo("次のステップ:")
+    click.echo("  ブラウザでKaggle Notebook画面を開き「Submit to Competition」をクリック")
+    click.echo(f"  kaggle kernels status {result['kernel_id']}")
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-    except FileNotFoundError:
-        click.echo("Error: kaggle コマンドが見つかりません。", err=True)
-        click.echo("  pip install kaggle でインストールしてください。", err=True)
-        raise SystemExit(1)
 
-    if result.stdout:
-        click.echo(result.stdout.rstrip())
-    if result.stderr:
-        click.echo(result.stderr.rstrip(), err=True)
+def _push_many(dir_paths: list[Path], jobs: int, skip_validate: bool, opts: PushOptions):
+    results = []
+    targets = []
+    for dir_path in dir_paths:
+        if not (dir_path / "kernel-metadata.json").exists():
+            click.echo(f"Error: {dir_path / 'kernel-metadata.json'} が見つかりません。", err=True)
+            results.append({"directory": str(dir_path), "kernel_id": "", "status": "missing", "returncode": 1})
+            continue
+        targets.append(dir_path)
 
-    if result.returncode != 0:
-        raise SystemExit(result.returncode)
+    # バリデーションは push 前にまとめて行い、エラーのあるディレクトリを除外する
+    if not skip_validate and targets:
+        with span("validate", directories=len(targets)):
+            checks = check_directories([str(p) for p in targets], os.cpu_count() or 1)
+        valid = []
+        for dir_path, check in zip(targets, checks):
+            for e in check["errors"]:
+                click.echo(f"[{dir_path}] x {e}", err=True)
+            if check["errors"]:
+                results.append({"directory": str(dir_path), "kernel_id": "", "status": "invalid", "returncode": 1})
+            else:
+                valid.append(dir_path)
+        targets = valid
 
-    kernel_id = metadata["id"]
+    # ローカル実行は重いので並列にせず、1ディレクトリずつ行う
+    if opts.preflight and targets:
+        passed = []
+        for dir_path in targets:
+            def echo(message, err=False, dir_path=dir_path):
+                for line in str(message).splitlines() or [""]:
+                    click.echo(f"[{dir_path}] {line}", err=err)
+
+            with span("preflight", directory=str(dir_path)) as s:
+                s["ok"] = preflight_directory(dir_path, echo)
+            if s["ok"]:
+                passed.append(dir_path)
+            else:
+                results.append({"directory": str(dir_path), "kernel_id": "", "status": "preflight-failed",
+                                "returncode": 1})
+        targets = passed
 
-    if wait:
+    if targets:
+        backend = resolve_backend()
         click.echo("")
-        click.echo(f"Waiting for kernel to complete: {kernel_id}")
-        for i in range(40):
-            status = get_kernel_status(kaggle_cmd, kernel_id)
-            click.echo(f"  [{i + 1}/40] {status or '(unknown)'}")
-            upper = status.upper()
-            if "COMPLETE" in upper:
-                click.echo("Kernel completed successfully.")
-                break
-            if "ERROR" in upper or "CANCEL" in upper:
-                click.echo(f"\nKernel failed: {status}")
-                click.echo("\n=== Kernel diagnostics ===")
-                show_kernel_diagnostics(kaggle_cmd, kernel_id)
-                raise SystemExit(1)
-            time.sleep(30)
-        else:
-            click.echo("Timeout: kernel did not complete in 20 minutes.", err=True)
-            raise SystemExit(1)
+        click.echo(f"Pushing {len(targets)} kernels (jobs={jobs})...")
 
-    click.echo("")
-    click.echo("次のステップ:")
-    click.echo("  ブラウザでKaggle Notebook画面を開き「Submit to Competition」をクリック")
-    click.echo(f"  kaggle kernels status {kernel_id}")
+        def run(dir_path):
+            def echo(message, err=False):
+                for line in str(message).splitlines() or [""]:
+                    click.echo(f"[{dir_path}] {line}", err=err)
+
+            try:
+                return _push_one(dir_path, backend, opts, echo)
+            except (OSError, ValueError, KeyError) as e:
+                echo(f"Error: {e}", err=True)
+                return {"directory": str(dir_path), "kernel_id": "", "status": "failed", "returncode": 1}
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results.extend(pool.map(run, targets))
+
+        # 診断は出力が混ざらないよう全push完了後にまとめて表示する
+        for r in results:
+            if r["status"] == "error" and not opts.follow:
+                click.echo(f"\n=== Kernel diagnostics: {r['kernel_id']} ===")
+                with span("diagnostics", kernel=r["kernel_id"]), backend.open_log(r["kernel_id"]) as log_stream:
+                    update_run(r.get("run_id"), error_tail=print_kernel_diagnostics(log_stream) or None)
+
+    _print_summary(results)
+
+    if any(r["returncode"] != 0 for r in results):
+        raise SystemExit(1)
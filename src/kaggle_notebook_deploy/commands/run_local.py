@@ -0,0 +1,132 @@
+"""kaggle-deploy run-local: Kaggleに送る前に code_file を手元で実行する."""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from kaggle_notebook_deploy._preflight import load_code_cells, rewrite_paths, run_notebook, sample_input
+from kaggle_notebook_deploy._state import state_dir
+from kaggle_notebook_deploy._utils import format_bytes, normalize_path
+from kaggle_notebook_deploy.commands._common import Duration, format_duration
+
+# /kaggle/input の代わりに使うローカルディレクトリ（--data の既定値）
+INPUT_DIR_ENV = "KAGGLE_DEPLOY_INPUT_DIR"
+DEFAULT_INPUT_DIR = "input"
+DEFAULT_SAMPLE_ROWS = 1000
+DEFAULT_PREFLIGHT_TIMEOUT = 30 * 60
+
+
+def _print_report(outcome: dict, echo):
+    """セルごとの実行時間とピークメモリを表示する."""
+    records = outcome["records"]
+    if not records:
+        return
+    headers = ("CELL", "TIME", "PEAK", "MAX RSS")
+    rows = [
+        (
+            f"[{r['cell']}]",
+            f"{r['seconds']:.2f}s",
+            format_bytes(r["peak"]),
+            format_bytes(r["rss"]) if r["rss"] is not None else "-",
+        )
+        for r in records
+    ]
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+
+    echo("")
+    echo("Preflight report:")
+    for row, record in zip([headers] + rows, [None] + records):
+        line = "  " + "  ".join(col.ljust(w) for col, w in zip(row, widths))
+        echo(f"{line}  x {record['error']}" if record and record["error"] else line.rstrip())
+    total = sum(r["seconds"] for r in records)
+    echo(f"  {len(records)} cells, {total:.2f}s total, peak {format_bytes(max(r['peak'] for r in records))}")
+    echo("  (TIME は tracemalloc でメモリを計測しながらの値です。Python オブジェクトを大量に作るセルは実際より遅く出ます)")
+
+
+def preflight_directory(dir_path: Path, echo, *, data_dir: Optional[Path] = None,
+                        sample_rows: int = DEFAULT_SAMPLE_ROWS, timeout: float = DEFAULT_PREFLIGHT_TIMEOUT,
+                        working_dir: Optional[Path] = None) -> bool:
+    """dir_path の code_file を手元で実行し、最後まで成功すれば True を返す.
+
+    data_dir（既定: $KAGGLE_DEPLOY_INPUT_DIR または ./input）を /kaggle/input として使う。
+    sample_rows > 0 の場合は CSV/TSV を先頭 sample_rows 行に絞ったコピーを使う。
+    working_dir を省略すると /kaggle/working 相当の一時ディレクトリを作り、終了後に削除する。
+    """
+    with open(dir_path / "kernel-metadata.json", encoding="utf-8") as f:
+        metadata = json.load(f)
+    code_path = dir_path / metadata["code_file"]
+    data_dir = data_dir or Path(os.environ.get(INPUT_DIR_ENV) or DEFAULT_INPUT_DIR)
+    if not data_dir.is_dir():
+        echo(f"Warning: 入力ディレクトリ {data_dir} がありません。空の /kaggle/input として実行します。")
+
+    root = state_dir() / "preflight"
+    root.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=root, prefix=f"{dir_path.resolve().name}-") as tmpdir:
+        input_dir = Path(tmpdir) / "input"
+        if data_dir.is_dir() and sample_rows > 0:
+            sample_input(data_dir, input_dir, sample_rows)
+        elif data_dir.is_dir():
+            input_dir = data_dir
+        else:
+            input_dir.mkdir()
+        work = working_dir or Path(tmpdir) / "working"
+        work.mkdir(parents=True, exist_ok=True)
+
+        cells = [
+            (index, rewrite_paths(source, input_dir.resolve(), work.resolve()))
+            for index, source in load_code_cells(code_path)
+        ]
+        sampled = f", sampled to {sample_rows} rows" if data_dir.is_dir() and sample_rows > 0 else ""
+        echo(f"Preflight: {code_path} ({len(cells)} code cells, input: {data_dir}{sampled})")
+        outcome = run_notebook(cells, work.resolve(), lambda line: echo(f"  | {line}"), timeout)
+
+    _print_report(outcome, echo)
+    if outcome["status"] == "timeout":
+        echo(f"Preflight timeout: {format_duration(timeout)} 以内に終わりませんでした。", err=True)
+    elif outcome["status"] == "error":
+        failed = next((r for r in outcome["records"] if r["error"]), None)
+        where = f"cell [{failed['cell']}]" if failed else "起動時"
+        echo(f"Preflight failed at {where}.", err=True)
+    else:
+        echo("Preflight passed.")
+    return outcome["status"] == "ok"
+
+
+@click.command("run-local")
+@click.argument("directory", default=".")
+@click.option("--data", "data_dir", default=None,
+              help=f"/kaggle/input として使うディレクトリ（既定: ${INPUT_DIR_ENV} または ./{DEFAULT_INPUT_DIR}）")
+@click.option("--sample-rows", default=DEFAULT_SAMPLE_ROWS, type=click.IntRange(min=0),
+              help="CSV/TSV を先頭この行数に絞ったコピーで実行する（0 で全行）")
+@click.option("--timeout", default="30m", type=Duration(), help="実行時間の上限（例: 90, 30m, 2h）")
+@click.option("--working-dir", default=None,
+              help="/kaggle/working として使うディレクトリ（省略時は一時ディレクトリで、終了後に削除）")
+def run_local(directory, data_dir, sample_rows, timeout, working_dir):
+    """code_file を手元で実行し、セルごとの実行時間とピークメモリを表示する.
+
+    DIRECTORY はkernel-metadata.jsonを含むディレクトリです（デフォルト: カレントディレクトリ）。
+    Notebook 中の /kaggle/input と /kaggle/working は手元のディレクトリに置き換えて実行します。
+    --data には Kaggle と同じ配置（例: input/<competition-slug>/train.csv）でデータを置いてください。
+
+    最初にエラーになったセルで実行を止め、終了コード 1 を返します。
+    PEAK は tracemalloc で計測するため、実行時間にはその分のオーバーヘッドが含まれます。
+    """
+    dir_path = Path(normalize_path(directory))
+    if not (dir_path / "kernel-metadata.json").exists():
+        click.echo(f"Error: {dir_path / 'kernel-metadata.json'} が見つかりません。", err=True)
+        raise SystemExit(1)
+
+    ok = preflight_directory(
+        dir_path,
+        click.echo,
+        data_dir=Path(normalize_path(data_dir)) if data_dir else None,
+        sample_rows=sample_rows,
+        timeout=timeout,
+        working_dir=Path(normalize_path(working_dir)) if working_dir else None,
+    )
+    if not ok:
+        raise SystemExit(1)
@@ -0,0 +1,109 @@
+"""kaggle-deploy serve: コマンドを受け付けるローカルデーモン."""
+
+import os
+import signal
+import socket
+import socketserver
+import sys
+import time
+from pathlib import Path
+
+import click
+
+from kaggle_notebook_deploy._daemon import handle_connection, socket_path
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # フォークしたワーカー内で実行される。デーモン側の SIGTERM ハンドラは引き継がない.
+        # クライアントが切断したときにコマンドと子プロセスだけを止められるよう、独立したプロセスグループにする
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.setpgid(0, 0)
+        log_fd = os.dup(2)
+        start = time.monotonic()
+
+        def log(message):
+            os.write(log_fd, f"[{os.getpid()}] {message} ({time.monotonic() - start:.2f}s)\n".encode())
+
+        try:
+            handle_connection(self.request, log)
+        finally:
+            os.close(log_fd)
+
+
+class _Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def _warm_up():
+    """全サブコマンドを import し、kaggle コマンドと認証情報を解決しておく（フォーク先はこれを引き継ぐ）."""
+    from kaggle_notebook_deploy.cli import main
+    from kaggle_notebook_deploy.commands._common import preload_backend
+
+    ctx = click.Context(main)
+    for name in main.list_commands(ctx):
+        main.get_command(ctx, name)
+    return preload_backend()
+
+
+def _remove_stale_socket(path: Path):
+    if not path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()
+    else:
+        click.echo(f"Error: {path} で既にデーモンが起動しています。", err=True)
+        raise SystemExit(1)
+    finally:
+        probe.close()
+
+
+@click.command()
+@click.option("--socket", "socket_file", default=None, type=click.Path(dir_okay=False),
+              help="待ち受ける Unix ソケット（デフォルト: $KAGGLE_DEPLOY_SOCKET またはユーザーごとの一時ディレクトリ）")
+@click.option("--max-workers", default=16, type=click.IntRange(min=1), help="同時に実行するリクエスト数の上限")
+def serve(socket_file, max_workers):
+    """コマンドを受け付けるローカルデーモンを起動する.
+
+    KAGGLE_DEPLOY_DAEMON=1 を設定して実行した kaggle-notebook-deploy コマンドは、
+    同じユーザーのデーモンが起動していればソケット経由で渡され、フォークしたワーカーで並行に実行されます。
+    省けるのはモジュールの import と kaggle コマンド・認証情報の解決だけで、
+    HTTP 接続はリクエストごとにワーカーが張り直し、リクエスト間で結果はキャッシュしません。
+    クライアントを Ctrl-C で止めると、ワーカーのコマンドも中断されます。
+    """
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "fork"):
+        click.echo("Error: serve は Unix ソケットと fork が使える環境でのみ利用できます。", err=True)
+        raise SystemExit(1)
+
+    path = Path(socket_file) if socket_file else socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _remove_stale_socket(path)
+
+    backend = _warm_up()
+
+    # 他のユーザーが接続できないよう、ソケットは所有者のみ読み書き可能にする
+    old_umask = os.umask(0o177)
+    try:
+        server = _Server(str(path), _Handler)
+    finally:
+        os.umask(old_umask)
+    server.max_children = max_workers
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    click.echo(f"Serving on {path} (pid {os.getpid()}, backend: {backend.name if backend else 'none'})")
+    sys.stdout.flush()
+    try:
+        server.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+        click.echo("Stopped.")
@@ -1,11 +1,18 @@
 """kaggle-deploy validate: kernel-metadata.jsonのバリデーション."""
 
+import functools
 import json
+import os
 from pathlib import Path
+from typing import Optional
 
 import click
 
-from kaggle_notebook_deploy._utils import normalize_path
+from kaggle_notebook_deploy import __version__
+from kaggle_notebook_deploy._analysis import ANALYZER_VERSION, CellAnalyzer, save_cell_cache
+from kaggle_notebook_deploy._notebook import scan_notebook
+from kaggle_notebook_deploy._state import file_fingerprint, load_json, save_json
+from kaggle_notebook_deploy._utils import find_kernel_dirs, format_bytes, normalize_path
 
 
 REQUIRED_FIELDS = [
@@ -24,30 +31,50 @@ VALID_LANGUAGES = ["python", "r", "rmarkdown"]
 VALID_KERNEL_TYPES = ["script", "notebook"]
 VALID_BOOL_STRINGS = ["true", "false"]
 
+# この数未満のディレクトリはプロセスプールを使わずに逐次検証する（起動コストの方が大きい）
+PARALLEL_THRESHOLD = 16
 
-@click.command()
-@click.argument("directory", default=".")
-def validate(directory):
-    """kernel-metadata.jsonのバリデーションを行う.
+# コード解析の指摘を1メッセージに列挙する最大件数
+MAX_LOCATIONS = 3
 
-    DIRECTORY はkernel-metadata.jsonを含むディレクトリです（デフォルト: カレントディレクトリ）。
+# Notebook のサイズ予算（MB 単位。セル・出力のサイズは JSON 上の文字数で測る）
+DEFAULT_BUDGETS = {"max_notebook_mb": 50.0, "max_cell_mb": 10.0, "max_cells": 1000}
+
+MB = 1024 * 1024
+# チェック内容やメッセージを変えたら上げる（validate-cache.json の古い結果を使わないため）
+CHECKS_VERSION = 2
+
+# 検証結果のキャッシュ. kernel-metadata.json と code_file が変わっていなければ再検証しない
+VALIDATE_CACHE_FILE = "validate-cache.json"
+MAX_CACHED_DIRECTORIES = 10000
+
+
+def check_directory(directory: str, budgets: Optional[dict] = None) -> dict:
+    """1ディレクトリを検証し、結果を dict で返す.
+
+    出力や SystemExit を伴わない純粋な関数なので、プロセスプールからも呼び出せる。
+    戻り値: {"directory", "errors", "warnings", "fatal", "notebook"}。
+    fatal は kernel-metadata.json が読めず以降のチェックを行えなかったことを示す。
+    notebook は code_file が .ipynb の場合のサイズ情報（scan_notebook の戻り値）。
     """
-    dir_path = Path(normalize_path(directory))
+    dir_path = Path(directory)
     metadata_path = dir_path / "kernel-metadata.json"
+    result = {"directory": directory, "errors": [], "warnings": [], "fatal": False, "notebook": None}
+    errors = result["errors"]
+    warnings = result["warnings"]
 
     if not metadata_path.exists():
-        click.echo(f"Error: {metadata_path} が見つかりません。", err=True)
-        raise SystemExit(1)
+        errors.append(f"{metadata_path} が見つかりません。")
+        result["fatal"] = True
+        return result
 
     with open(metadata_path) as f:
         try:
             metadata = json.load(f)
         except json.JSONDecodeError as e:
-            click.echo(f"Error: JSONパースエラー: {e}", err=True)
-            raise SystemExit(1)
-
-    errors = []
-    warnings = []
+            errors.append(f"JSONパースエラー: {e}")
+            result["fatal"] = True
+            return result
 
     # 必須フィールドチェック
     for field in REQUIRED_FIELDS:
@@ -55,9 +82,8 @@ def validate(directory):
             errors.append(f"必須フィールド '{field}' がありません")
 
     if errors:
-        # 必須フィールドが足りないと後続チェックが失敗するので先に出力
-        _print_results(errors, warnings)
-        raise SystemExit(1)
+        # 必須フィールドが足りないと後続チェックが失敗するのでここで返す
+        return result
 
     # id フォーマット: username/slug
     kernel_id = metadata["id"]
@@ -99,6 +125,22 @@ def validate(directory):
             " 提出用Notebookでは false に設定してください"
         )
 
+    # Notebook のサイズ・セル数チェックとコード解析
+    if code_path.suffix in (".ipynb", ".py") and code_path.is_file():
+        analyzer = CellAnalyzer()
+        cells = []
+        if code_path.suffix == ".ipynb":
+            def visit(index, cell):
+                if cell.get("cell_type") == "code":
+                    source = cell.get("source", "")
+                    cells.append((index, analyzer.analyze("".join(source) if isinstance(source, list) else source)))
+
+            _check_notebook(code_path, {**DEFAULT_BUDGETS, **(budgets or {})}, result, visit)
+        else:
+            cells.append((None, analyzer.analyze(code_path.read_text(encoding="utf-8", errors="replace"))))
+        _check_code(cells, metadata, result)
+        result["cell_cache"] = analyzer.updates
+
     # title と slug の整合性チェック
     if "/" in kernel_id:
         slug = kernel_id.split("/", 1)[1]
@@ -108,12 +150,245 @@ def validate(directory):
             # 厳密一致は求めないが、情報として出す
             pass
 
-    _print_results(errors, warnings)
+    return result
 
-    if errors:
+
+def _check_notebook(code_path: Path, budgets: dict, result: dict, visit=None):
+    """Notebook をストリーミングで走査し、予算超過をエラーとして result に追加する."""
+    errors = result["errors"]
+    try:
+        stats = scan_notebook(code_path, visit=visit, max_item_size=int(budgets["max_cell_mb"] * MB))
+    except ValueError as e:
+        errors.append(f"code_file '{code_path.name}' のJSONパースエラー: {e}")
+        return
+    result["notebook"] = stats
+
+    if stats["size"] > budgets["max_notebook_mb"] * MB:
+        errors.append(
+            f"Notebook のサイズ {format_bytes(stats['size'])} が上限 {budgets['max_notebook_mb']:g} MB を超えています"
+        )
+    if stats["cells"] > budgets["max_cells"]:
+        errors.append(f"セル数 {stats['cells']} が上限 {budgets['max_cells']} を超えています")
+    # 上位 N 件の表示用リストではなく、走査中に数えた全件を報告する（大きい順）
+    if oversized := sorted(stats["oversized_cells"], reverse=True):
+        cells = [f"セル #{index} {format_bytes(size)}" for size, index in oversized]
+        errors.append(f"{len(cells)} 個のセルが上限 {budgets['max_cell_mb']:g} MB を超えています: {_summarize(cells)}")
+    if oversized := sorted(stats["oversized_outputs"], reverse=True):
+        outputs = [f"セル #{index} の出力 #{out_index} {format_bytes(size)}" for size, index, out_index in oversized]
+        errors.append(f"{len(outputs)} 個の出力が上限 {budgets['max_cell_mb']:g} MB を超えています: {_summarize(outputs)}")
+
+
+def _locations(findings: list, index: Optional[int]) -> list[str]:
+    cell = f"セル #{index} " if index is not None else ""
+    return [f"{cell}行 {line}: {what}" for line, what in findings]
+
+
+def _summarize(locations: list[str]) -> str:
+    text = ", ".join(locations[:MAX_LOCATIONS])
+    if len(locations) > MAX_LOCATIONS:
+        text += f" 他 {len(locations) - MAX_LOCATIONS} 件"
+    return text
+
+
+def _check_code(cells: list[tuple], metadata: dict, result: dict):
+    """セルごとのコード解析結果から、提出時に失敗しそうな箇所をエラー・警告にする."""
+    internet = [loc for index, a in cells for loc in _locations(a["internet"], index)]
+    paths = [loc for index, a in cells for loc in _locations(a["paths"], index)]
+    input_paths = [loc for index, a in cells for loc in _locations(a["input_paths"], index)]
+    imports = [loc for index, a in cells for loc in _locations(a["internet_imports"], index)]
+
+    if internet:
+        if metadata["enable_internet"] == "false":
+            result["errors"].append(
+                f"enable_internet=false ですがインターネット接続が必要なコードがあります: {_summarize(internet)}"
+            )
+        elif metadata.get("competition_sources"):
+            result["warnings"].append(
+                f"インターネット接続が必要なコードはコードコンペの提出時に失敗します: {_summarize(internet)}"
+            )
+    # import だけでは通信しない（例外クラスや URL 組み立てにだけ使うこともある）ので警告に留める
+    if imports and (metadata["enable_internet"] == "false" or metadata.get("competition_sources")):
+        result["warnings"].append(
+            f"HTTP クライアントが import されています。オフラインで呼び出すと失敗します: {_summarize(imports)}"
+        )
+    if paths:
+        result["warnings"].append(f"Kaggle 上に存在しないパスがハードコードされています: {_summarize(paths)}")
+    if input_paths and not any(a["data_dir"] for _, a in cells):
+        result["warnings"].append(
+            "/kaggle/input 以下のパスがハードコードされています。"
+            f" DATA_DIR で自動検出してください（README 参照）: {_summarize(input_paths)}"
+        )
+
+
+def _fingerprint(dir_path: Path) -> dict:
+    """kernel-metadata.json と code_file の [mtime_ns, size, sha256] を返す."""
+    files = {"kernel-metadata.json": file_fingerprint(dir_path / "kernel-metadata.json")}
+    try:
+        with open(dir_path / "kernel-metadata.json") as f:
+            code_file = json.load(f)["code_file"]
+        files[code_file] = file_fingerprint(dir_path / code_file)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return files
+
+
+def _lookup(entry: Optional[dict], dir_path: Path, cache_key: list) -> tuple[Optional[dict], bool]:
+    """キャッシュ済みの結果がまだ有効ならそれを返す.
+
+    戻り値は (結果または None, 記録を更新したか)。内容が同じで mtime だけ変わった
+    ファイルは、次回ハッシュを計算せずに済むよう entry の記録を更新する。
+    """
+    if not entry or entry.get("key") != cache_key:
+        return None, False
+    files = entry["files"]
+    refreshed = False
+    for name, recorded in files.items():
+        current = file_fingerprint(dir_path / name, recorded)
+        if current is recorded:
+            continue
+        if current is None or recorded is None or current[2] != recorded[2]:
+            return None, False
+        files[name] = current
+        refreshed = True
+    return entry["result"], refreshed
+
+
+def _run_checks(directories: list[str], jobs: int, budgets: Optional[dict]) -> list[dict]:
+    check = functools.partial(check_directory, budgets=budgets)
+    if jobs <= 1 or len(directories) < PARALLEL_THRESHOLD:
+        results = [check(d) for d in directories]
+    else:
+        # プロセスプールは --all で件数が多いときしか使わないので、ここで import する
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunksize = max(1, len(directories) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(check, directories, chunksize=chunksize))
+
+    # 各ワーカーが新たに解析したセルの結果はここでまとめてキャッシュに書き込む
+    updates = {}
+    for r in results:
+        updates.update(r.pop("cell_cache", {}))
+    try:
+        save_cell_cache(updates)
+    except OSError:
+        pass
+    return results
+
+
+def check_directories(directories: list[str], jobs: int, budgets: Optional[dict] = None,
+                      use_cache: bool = True) -> list[dict]:
+    """複数ディレクトリを検証する. 数が多い場合はプロセスプールで並列化する.
+
+    use_cache の場合、kernel-metadata.json と code_file のパス・mtime・サイズ・ハッシュが
+    前回と同じディレクトリは .kaggle-deploy/validate-cache.json の結果を返す。
+    """
+    if not use_cache:
+        return _run_checks(directories, jobs, budgets)
+
+    cache_key = [__version__, CHECKS_VERSION, ANALYZER_VERSION, {**DEFAULT_BUDGETS, **(budgets or {})}]
+    cache = load_json(VALIDATE_CACHE_FILE).get("entries", {})
+    results = [None] * len(directories)
+    misses = []
+    dirty = False
+    for i, directory in enumerate(directories):
+        cached, refreshed = _lookup(cache.get(os.path.abspath(directory)), Path(directory), cache_key)
+        dirty |= refreshed
+        if cached is not None:
+            results[i] = {**cached, "directory": directory}
+        else:
+            misses.append(i)
+
+    if misses:
+        # 検証中にファイルが変わっても古い結果を新しい内容に結び付けないよう、指紋は検証前に取る
+        fingerprints = [_fingerprint(Path(directories[i])) for i in misses]
+        checked = _run_checks([directories[i] for i in misses], jobs, budgets)
+        for i, fingerprint, result in zip(misses, fingerprints, checked):
+            results[i] = result
+            cache[os.path.abspath(directories[i])] = {"key": cache_key, "files": fingerprint, "result": result}
+        dirty = True
+
+    if dirty:
+        if len(cache) > MAX_CACHED_DIRECTORIES:
+            # 消えたディレクトリの結果から捨てる
+            cache = {k: v for k, v in cache.items() if os.path.isdir(k)}
+            cache = dict(list(cache.items())[-MAX_CACHED_DIRECTORIES:])
+        try:
+            save_json(VALIDATE_CACHE_FILE, {"entries": cache})
+        except OSError:
+            pass
+    return results
+
+
+@click.command()
+@click.argument("directory", default=".")
+@click.option("--all", "validate_all", is_flag=True, default=False,
+              help="DIRECTORY以下のkernel-metadata.jsonを含む全ディレクトリを検証")
+@click.option("--jobs", "-j", default=None, type=click.IntRange(min=1),
+              help="--all 時の並列プロセス数（デフォルト: CPUコア数）")
+@click.option("--report", "report_path", default=None, type=click.Path(dir_okay=False),
+              help="検証結果レポートの出力先")
+@click.option("--report-format", type=click.Choice(["json", "junit"]), default=None,
+              help="レポート形式（省略時は拡張子 .xml なら junit、それ以外は json）")
+@click.option("--max-notebook-mb", default=DEFAULT_BUDGETS["max_notebook_mb"], type=click.FloatRange(min=0),
+              show_default=True, help="Notebook ファイルサイズの上限（MB）")
+@click.option("--max-cell-mb", default=DEFAULT_BUDGETS["max_cell_mb"], type=click.FloatRange(min=0),
+              show_default=True, help="1セル・1出力あたりのサイズ上限（MB）")
+@click.option("--max-cells", default=DEFAULT_BUDGETS["max_cells"], type=click.IntRange(min=0),
+              show_default=True, help="セル数の上限")
+@click.option("--no-cache", is_flag=True, default=False,
+              help="前回の検証結果（.kaggle-deploy/validate-cache.json）を使わずに全て検証し直す")
+def validate(directory, validate_all, jobs, report_path, report_format, max_notebook_mb, max_cell_mb, max_cells,
+             no_cache):
+    """kernel-metadata.jsonのバリデーションを行う.
+
+    DIRECTORY はkernel-metadata.jsonを含むディレクトリです（デフォルト: カレントディレクトリ）。
+    --all を指定すると DIRECTORY 以下を1プロセスで走査し、全ディレクトリを並列に検証します。
+    code_file が .ipynb の場合は、全体を読み込まずにサイズ・最大セル・最大出力・セル数を予算と照合します。
+    kernel-metadata.json と code_file が前回から変わっていないディレクトリは前回の結果を使います（--no-cache で無効化）。
+    """
+    dir_path = Path(normalize_path(directory))
+    budgets = {"max_notebook_mb": max_notebook_mb, "max_cell_mb": max_cell_mb, "max_cells": max_cells}
+
+    if validate_all:
+        directories = [str(p) for p in find_kernel_dirs(dir_path)]
+        if not directories:
+            click.echo(f"Error: {dir_path} 以下に kernel-metadata.json が見つかりません。", err=True)
+            raise SystemExit(1)
+        results = check_directories(directories, jobs or os.cpu_count() or 1, budgets, use_cache=not no_cache)
+        _print_summary(results)
+    else:
+        results = check_directories([str(dir_path)], 1, budgets, use_cache=not no_cache)
+        result = results[0]
+        if result["fatal"]:
+            click.echo(f"Error: {result['errors'][0]}", err=True)
+        else:
+            _print_notebook_stats(result["notebook"], "")
+            _print_results(result["errors"], result["warnings"])
+
+    if report_path:
+        if report_format is None:
+            report_format = "junit" if report_path.endswith(".xml") else "json"
+        _write_report(Path(report_path), results, report_format)
+        click.echo(f"Report: {report_path}")
+
+    if any(r["errors"] for r in results):
         raise SystemExit(1)
 
 
+def _print_notebook_stats(stats: Optional[dict], indent: str):
+    """Notebook のサイズ情報を表示する."""
+    if not stats:
+        return
+    click.echo(f"{indent}Notebook: {format_bytes(stats['size'])}, {stats['cells']} cells")
+    if stats["largest_cells"]:
+        cells = ", ".join(f"#{i} {format_bytes(size)}" for size, i in stats["largest_cells"])
+        click.echo(f"{indent}  largest cells: {cells}")
+    if stats["largest_outputs"]:
+        outputs = ", ".join(f"#{i}.{j} {format_bytes(size)}" for size, i, j in stats["largest_outputs"])
+        click.echo(f"{indent}  largest outputs: {outputs}")
+
+
 def _print_results(errors: list[str], warnings: list[str]):
     """バリデーション結果を表示する."""
     if errors:
@@ -131,3 +406,49 @@ def _print_results(errors: list[str], warnings: list[str]):
     elif not errors:
         click.echo("")
         click.echo("OK (with warnings): kernel-metadata.json is valid.")
+
+
+def _print_summary(results: list[dict]):
+    """--all の検証結果をディレクトリごとに1行ずつ表示する."""
+    for r in results:
+        mark = "NG" if r["errors"] else "OK"
+        click.echo(f"{mark} {r['directory']}")
+        if r["errors"]:
+            _print_notebook_stats(r["notebook"], "  ")
+        for e in r["errors"]:
+            click.echo(f"  x {e}")
+        for w in r["warnings"]:
+            click.echo(f"  ! {w}")
+
+    failed = sum(1 for r in results if r["errors"])
+    click.echo("")
+    click.echo(f"{len(results)} directories: {len(results) - failed} ok, {failed} with errors.")
+
+
+def _write_report(path: Path, results: list[dict], report_format: str):
+    """検証結果を JSON または JUnit XML で書き出す."""
+    failed = sum(1 for r in results if r["errors"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if report_format == "json":
+        report = {
+            "summary": {"total": len(results), "passed": len(results) - failed, "failed": failed},
+            "results": results,
+        }
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        return
+
+    from xml.etree import ElementTree
+
+    suite = ElementTree.Element(
+        "testsuite", name="kaggle-notebook-deploy validate",
+        tests=str(len(results)), failures=str(failed), errors="0",
+    )
+    for r in results:
+        case = ElementTree.SubElement(suite, "testcase", classname="validate", name=r["directory"])
+        if r["errors"]:
+            failure = ElementTree.SubElement(case, "failure", message=r["errors"][0])
+            failure.text = "\n".join(r["errors"])
+        if r["warnings"]:
+            ElementTree.SubElement(case, "system-out").text = "\n".join(r["warnings"])
+    ElementTree.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
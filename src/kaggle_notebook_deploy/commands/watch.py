@@ -0,0 +1,94 @@
+"""kaggle-deploy watch: 変更されたディレクトリだけを検証（と push）し直す."""
+
+import time
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from kaggle_notebook_deploy._utils import find_kernel_dirs, normalize_path
+from kaggle_notebook_deploy._watch import WatchError, open_watcher
+from kaggle_notebook_deploy.commands._common import Duration
+from kaggle_notebook_deploy.commands.validate import check_directories
+
+
+def _kernel_dir(directory: Path, roots: list[Path]) -> Optional[Path]:
+    """変更のあったディレクトリから、kernel-metadata.json を含む最も近い祖先を探す."""
+    for candidate in (directory, *directory.parents):
+        if (candidate / "kernel-metadata.json").exists():
+            return candidate
+        if candidate in roots:
+            return None
+    return None
+
+
+def _collect(watcher, debounce: float) -> set[Path]:
+    """最初の変更を待ち、その後 debounce 秒間変更が途切れるまでまとめて受け取る."""
+    changed = set()
+    while not changed:
+        changed = watcher.changes(None)
+    while more := watcher.changes(debounce):
+        changed |= more
+    return changed
+
+
+def _check(dir_path: Path) -> bool:
+    result = check_directories([str(dir_path)], 1)[0]
+    mark = "NG" if result["errors"] else "OK"
+    click.echo(f"[{time.strftime('%H:%M:%S')}] {mark} {dir_path}")
+    for e in result["errors"]:
+        click.echo(f"  x {e}")
+    for w in result["warnings"]:
+        click.echo(f"  ! {w}")
+    return not result["errors"]
+
+
+@click.command()
+@click.argument("directories", nargs=-1)
+@click.option("--push", "push_on_success", is_flag=True, default=False, help="検証が通ったディレクトリをpushする")
+@click.option("--debounce", default="0.5", type=Duration(),
+              help="最後の変更からこの時間だけ待ってまとめて検証する（例: 0.5, 2s）")
+def watch(directories, push_on_success, debounce):
+    """ファイルの変更を監視し、変更のあったディレクトリだけを検証する.
+
+    DIRECTORIES 以下（デフォルト: カレントディレクトリ）の kernel-metadata.json を含む
+    ディレクトリを監視します。エディタの連続保存は --debounce でまとめ、
+    ポーリングや全体の再走査はしません。--push を指定すると検証が通ったディレクトリをpushします。
+    Linux では inotify、その他の環境では watchdog パッケージを使います。
+    """
+    roots = [Path(normalize_path(d)).resolve() for d in directories or (".",)]
+    for root in roots:
+        if not root.is_dir():
+            click.echo(f"Error: {root} はディレクトリではありません。", err=True)
+            raise SystemExit(1)
+
+    try:
+        watcher = open_watcher(roots)
+    except WatchError as e:
+        click.echo(f"Error: {e}", err=True)
+        raise SystemExit(1)
+
+    count = sum(len(find_kernel_dirs(root)) for root in roots)
+    click.echo(f"Watching {count} kernel directories under {', '.join(map(str, roots))} (Ctrl-C to stop)")
+
+    ctx = click.get_current_context()
+    try:
+        while True:
+            changed = _collect(watcher, debounce)
+            for dir_path in sorted({k for d in changed if (k := _kernel_dir(d, roots))}):
+                if _check(dir_path) and push_on_success:
+                    _push(ctx, dir_path)
+    except KeyboardInterrupt:
+        click.echo("Stopped.")
+    finally:
+        watcher.close()
+
+
+def _push(ctx: click.Context, dir_path: Path):
+    from kaggle_notebook_deploy.commands.push import push
+
+    try:
+        ctx.invoke(push, directories=(str(dir_path),), skip_validate=True)
+    except SystemExit as e:
+        if e.code:
+            click.echo(f"Push failed: {dir_path}", err=True)
@@ -1,17 +1,50 @@
 """kaggle-notebook-deploy CLI tests."""
 
+import hashlib
+import io
+import itertools
 import json
 import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+import pytest
 from click.testing import CliRunner
 
+from kaggle_notebook_deploy._api import KaggleApiClient, KaggleApiError
 from kaggle_notebook_deploy.cli import main
-from kaggle_notebook_deploy._utils import normalize_path
+from kaggle_notebook_deploy._jsonstream import iter_json_array, iter_json_array_from, iter_member_array
+from kaggle_notebook_deploy._notebook import scan_notebook
+from kaggle_notebook_deploy._utils import (
+    backoff_delays,
+    find_kaggle,
+    find_kernel_dirs,
+    get_kernel_status,
+    normalize_path,
+    open_kernel_log,
+    print_kernel_diagnostics,
+    print_new_log_entries,
+)
 
 
 runner = CliRunner()
 
 
+@pytest.fixture(autouse=True)
+def _cli_backend(monkeypatch, tmp_path):
+    """手元の Kaggle 認証情報やキャッシュに依存しないよう、既定では kaggle CLI バックエンドと一時的な状態ディレクトリを使う."""
+    monkeypatch.setenv("KAGGLE_DEPLOY_BACKEND", "cli")
+    monkeypatch.setenv("KAGGLE_DEPLOY_STATE_DIR", str(tmp_path / ".kaggle-deploy"))
+    # レート制限のバケットはテストごとに作り直し、再試行の待ち時間は短くする
+    monkeypatch.setattr("kaggle_notebook_deploy._ratelimit._limits", None)
+    monkeypatch.setattr("kaggle_notebook_deploy._ratelimit.RETRY_DELAY", 0.01)
+
+
 def test_version():
     result = runner.invoke(main, ["--version"])
     assert result.exit_code == 0
@@ -27,6 +60,77 @@ def test_help():
     assert "push" in result.output
 
 
+def _cumulative_import_times(statement: str) -> dict:
+    """-X importtime で statement を実行し、モジュール名 -> 累積 import 時間（マイクロ秒）を返す."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                         capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in err.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.removeprefix("import time:").split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup:
+    def test_subcommands_load_lazily(self):
+        code = (
+            "import sys; from kaggle_notebook_deploy.cli import main\n"
+            "try: main(['validate', '--help'])\n"
+            "except SystemExit: pass\n"
+            "print(','.join(sorted(sys.modules)))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        modules = set(out.strip().splitlines()[-1].split(","))
+        assert "kaggle_notebook_deploy.commands.validate" in modules
+        for heavy in ("kaggle_notebook_deploy.commands.push", "requests", "concurrent.futures.process"):
+            assert heavy not in modules
+
+    def test_cli_import_is_light(self):
+        code = (
+            "import sys; import click; before = set(sys.modules)\n"
+            "import kaggle_notebook_deploy.cli\n"
+            "print(','.join(sorted(set(sys.modules) - before)))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        added = set(out.strip().split(","))
+        package = {m for m in added if m.startswith("kaggle_notebook_deploy")}
+        assert package == {"kaggle_notebook_deploy", "kaggle_notebook_deploy.cli", "kaggle_notebook_deploy._trace"}
+        for heavy in ("requests", "urllib3", "socket", "ssl", "http", "sqlite3", "concurrent", "multiprocessing"):
+            assert heavy not in added
+
+    @pytest.mark.skipif(not os.environ.get("KAGGLE_DEPLOY_TIMING_TESTS"), reason="set KAGGLE_DEPLOY_TIMING_TESTS=1")
+    def test_import_time_budget(self):
+        # 同じプロセス内で計測した click 本体の import 時間に対する上乗せ分（負荷の高い CI でも揺れにくい相対値）
+        times = _cumulative_import_times("import kaggle_notebook_deploy.cli")
+        overhead = times["kaggle_notebook_deploy.cli"] - times["click"]
+        assert overhead < times["click"]
+
+    def test_kaggle_path_cached_per_path(self, tmp_path, monkeypatch):
+        import kaggle_notebook_deploy._utils as utils
+
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        kaggle = bin_dir / "kaggle"
+        kaggle.write_text("#!/bin/sh\n")
+        kaggle.chmod(0o755)
+        monkeypatch.setenv("KAGGLE_DEPLOY_STATE_DIR", str(tmp_path / "state"))
+        monkeypatch.setenv("PATH", str(bin_dir))
+        monkeypatch.setattr(utils, "_kaggle_path_cache", {})
+        assert find_kaggle() == str(kaggle)
+
+        # 新しいプロセス相当（メモリ上のキャッシュなし）でもディスクのキャッシュから解決し、探索しない
+        monkeypatch.setattr(utils, "_kaggle_path_cache", {})
+        monkeypatch.setattr(utils, "_search_kaggle", lambda: pytest.fail("searched again"))
+        assert find_kaggle() == str(kaggle)
+
+        # PATH が変わったら探索し直す
+        monkeypatch.setenv("PATH", str(tmp_path))
+        monkeypatch.setattr(utils, "_search_kaggle", lambda: None)
+        assert find_kaggle() is None
+
+
 class TestNormalizePath:
     def test_git_bash_c_drive(self):
         assert normalize_path("/c/Users/foo/bar") == "C:/Users/foo/bar"
@@ -99,6 +203,68 @@ class TestInit:
         assert result.exit_code == 0
         assert "enable_internet=true" in result.output
 
+    def test_manifest_yaml(self, tmp_path):
+        os.chdir(tmp_path)
+        (tmp_path / "titanic").mkdir()
+        (tmp_path / "kernels.yml").write_text(
+            "defaults:\n"
+            "  gpu: true\n"
+            "kernels:\n"
+            "  - titanic\n"
+            "  - slug: titanic\n"
+            "    variant: lgbm\n"
+            "    title: Titanic LightGBM\n"
+            "  - {slug: spaceship-titanic, gpu: false, public: yes}\n"
+        )
+        result = runner.invoke(main, ["init", "-u", "user1", "--manifest", "kernels.yml"])
+        assert result.exit_code == 0, result.output
+        assert "Skip: titanic/" in result.output
+        assert "2 created, 1 skipped." in result.output
+
+        lgbm = json.loads((tmp_path / "titanic-lgbm" / "kernel-metadata.json").read_text())
+        assert lgbm["id"] == "user1/titanic-lgbm"
+        assert lgbm["title"] == "Titanic LightGBM"
+        assert lgbm["enable_gpu"] == "true"
+        assert (tmp_path / "titanic-lgbm" / "titanic-lgbm.ipynb").exists()
+        spaceship = json.loads((tmp_path / "spaceship-titanic" / "kernel-metadata.json").read_text())
+        assert spaceship["enable_gpu"] == "false"
+        assert spaceship["is_private"] == "false"
+
+        # 2回目は全てスキップ
+        result = runner.invoke(main, ["init", "-u", "user1", "--manifest", "kernels.yml"])
+        assert result.exit_code == 0
+        assert "0 created, 3 skipped." in result.output
+
+    def test_manifest_rejects_shared_title(self, tmp_path):
+        os.chdir(tmp_path)
+        (tmp_path / "kernels.yml").write_text("kernels:\n  - titanic\n  - spaceship-titanic\n")
+        result = runner.invoke(main, ["init", "-u", "user1", "--manifest", "kernels.yml", "--title", "My Notebook"])
+        assert result.exit_code == 1
+        assert "--title と --manifest" in result.output
+        assert not (tmp_path / "titanic").exists()
+
+        # defaults で title を共有した場合も、カーネル ID が衝突するので生成しない
+        (tmp_path / "kernels.yml").write_text(
+            "defaults:\n  title: My Notebook\nkernels:\n  - titanic\n  - spaceship-titanic\n"
+        )
+        result = runner.invoke(main, ["init", "-u", "user1", "--manifest", "kernels.yml"])
+        assert result.exit_code == 1
+        assert "タイトル 'My Notebook' が1件目と重複しています" in result.output
+        assert not (tmp_path / "titanic").exists()
+
+    def test_manifest_csv_errors(self, tmp_path):
+        os.chdir(tmp_path)
+        (tmp_path / "kernels.csv").write_text("slug,variant,gpu\nabc,,maybe\n")
+        result = runner.invoke(main, ["init", "-u", "user1", "-m", "kernels.csv"])
+        assert result.exit_code == 1
+        assert "gpu 'maybe'" in result.output
+
+        (tmp_path / "kernels.csv").write_text("slug,variant,gpu\nabc,,1\nabc,baseline,0\n")
+        result = runner.invoke(main, ["init", "-u", "user1", "-m", "kernels.csv"])
+        assert result.exit_code == 1
+        assert "重複" in result.output
+        assert not (tmp_path / "abc").exists()
+
 
 class TestInitRepo:
     def test_basic(self, tmp_path):
@@ -140,6 +306,80 @@ class TestInitRepo:
         assert "node_modules/" in content
         assert "# === Kaggle Deploy ===" in content
 
+    def _detect_step(self, tmp_path):
+        import yaml
+
+        os.chdir(tmp_path)
+        result = runner.invoke(main, ["init-repo", "--matrix", "--branch", "master"])
+        assert result.exit_code == 0
+        workflow = yaml.safe_load((tmp_path / ".github" / "workflows" / "kaggle-push.yml").read_text())
+        return workflow, next(step for step in workflow["jobs"]["detect"]["steps"] if step.get("id") == "detect")
+
+    def _git(self, tmp_path, *args):
+        return subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], cwd=tmp_path,
+                              check=True, capture_output=True, text=True).stdout.strip()
+
+    def _commit(self, tmp_path, *files, message="change"):
+        for name in files:
+            path = tmp_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("{}")
+        self._git(tmp_path, "add", "-A")
+        self._git(tmp_path, "commit", "-q", "--allow-empty", "-m", message)
+        return self._git(tmp_path, "rev-parse", "HEAD")
+
+    def _run_detect(self, tmp_path, detect, before, **env):
+        output = tmp_path / "github_output"
+        output.unlink(missing_ok=True)
+        env = {**os.environ, "GITHUB_SHA": self._git(tmp_path, "rev-parse", "HEAD"), "BEFORE": before,
+               "NOTEBOOK_DIR": "", "GITHUB_OUTPUT": str(output), **env}
+        subprocess.run(["bash", "-c", detect["run"]], cwd=tmp_path, env=env, check=True, capture_output=True)
+        return json.loads(output.read_text().removeprefix("dirs="))
+
+    def test_matrix_workflow_detects_changed_dirs(self, tmp_path):
+        workflow, detect = self._detect_step(tmp_path)
+        assert workflow[True]["push"]["branches"] == ["master"]
+        push_job = workflow["jobs"]["push"]
+        assert "fromJSON" in push_job["strategy"]["matrix"]["notebook_dir"]
+        steps = {step.get("uses", step.get("name")): step for step in push_job["steps"]}
+        assert "${{ matrix.notebook_dir }}" in steps["actions/checkout@v4"]["with"]["sparse-checkout"]
+        assert steps["actions/setup-python@v5"]["with"]["cache"] == "pip"
+
+        self._git(tmp_path, "init", "-q")
+        self._commit(tmp_path, message="base")
+        before = self._commit(tmp_path, *(f"{name}/kernel-metadata.json" for name in ("comp-a", "comp-b", "nested/comp-c")))
+        self._commit(tmp_path, "comp-a/a.ipynb", "nested/comp-c/src/util.py", "README.md")
+        assert self._run_detect(tmp_path, detect, before) == ["comp-a", "nested/comp-c"]
+
+    def test_matrix_detect_root_commit(self, tmp_path):
+        _, detect = self._detect_step(tmp_path)
+        self._git(tmp_path, "init", "-q")
+        self._commit(tmp_path, "comp-a/kernel-metadata.json", "comp-b/kernel-metadata.json", "README.md")
+        zero = "0" * 40
+        # リポジトリ最初の push（デフォルトブランチもまだない）と、手動実行
+        assert self._run_detect(tmp_path, detect, zero, GITHUB_EVENT_NAME="push",
+                                DEFAULT_BRANCH="master") == ["comp-a", "comp-b"]
+        assert self._run_detect(tmp_path, detect, "", GITHUB_EVENT_NAME="workflow_dispatch") == ["comp-a", "comp-b"]
+
+    def test_matrix_detect_new_branch_uses_merge_base(self, tmp_path):
+        _, detect = self._detect_step(tmp_path)
+        self._git(tmp_path, "init", "-q")
+        base = self._commit(tmp_path, *(f"{name}/kernel-metadata.json" for name in ("comp-a", "comp-b", "comp-c")))
+        self._git(tmp_path, "update-ref", "refs/remotes/origin/main", base)
+        # 新しいブランチで複数コミットをまとめて push する. 最後のコミットだけでなく全体を比較する
+        self._commit(tmp_path, "comp-a/a.ipynb")
+        self._commit(tmp_path, "comp-b/b.ipynb")
+        assert self._run_detect(tmp_path, detect, "0" * 40, GITHUB_EVENT_NAME="push",
+                                DEFAULT_BRANCH="main") == ["comp-a", "comp-b"]
+
+    def test_matrix_detect_unknown_before_pushes_all(self, tmp_path):
+        _, detect = self._detect_step(tmp_path)
+        self._git(tmp_path, "init", "-q")
+        self._commit(tmp_path, "comp-a/kernel-metadata.json", "nested/comp-c/kernel-metadata.json")
+        self._commit(tmp_path, "comp-a/a.ipynb")
+        # force-push で before のコミットが取得できない
+        assert self._run_detect(tmp_path, detect, "1" * 40, GITHUB_EVENT_NAME="push") == ["comp-a", "nested/comp-c"]
+
 
 class TestValidate:
     def _make_valid_dir(self, tmp_path):
@@ -233,6 +473,173 @@ class TestValidate:
         assert result.exit_code == 0  # warning, not error
         assert "enable_internet=true" in result.output
 
+    def test_notebook_budgets(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        cells = [{"cell_type": "code", "source": "x", "outputs": []} for _ in range(5)]
+        cells[2]["outputs"] = [{"output_type": "stream", "name": "stdout", "text": "y" * 2 * 1024 * 1024}]
+        (comp_dir / "test-comp-baseline.ipynb").write_text(json.dumps({"cells": cells, "nbformat": 4}))
+
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert result.exit_code == 0
+        assert "5 cells" in result.output
+        assert "largest outputs: #2.0 2.0 MB" in result.output
+
+        result = runner.invoke(main, ["validate", str(comp_dir), "--max-cell-mb", "1", "--max-cells", "4"])
+        assert result.exit_code == 1
+        assert "セル #2 の出力 #0" in result.output
+        assert "セル数 5 が上限 4" in result.output
+
+    def test_budget_violations_counted_beyond_top(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        cells = [{"cell_type": "code", "source": "x" * (20000 + i), "outputs": []} for i in range(6)]
+        cells.append({"cell_type": "code", "source": "small", "outputs": [
+            {"output_type": "stream", "name": "stdout", "text": "y" * 20000} for _ in range(5)
+        ]})
+        (comp_dir / "test-comp-baseline.ipynb").write_text(json.dumps({"cells": cells, "nbformat": 4}))
+
+        result = runner.invoke(main, ["validate", str(comp_dir), "--max-cell-mb", "0.01"])
+        assert result.exit_code == 1
+        # 表示用の上位 3 件ではなく、超過した全件を数える
+        assert "7 個のセルが上限 0.01 MB を超えています: セル #6" in result.output
+        assert "他 4 件" in result.output
+        assert "5 個の出力が上限 0.01 MB を超えています" in result.output
+
+    def _write_cells(self, comp_dir, *sources):
+        cells = [{"cell_type": "code", "source": src, "outputs": []} for src in sources]
+        (comp_dir / "test-comp-baseline.ipynb").write_text(json.dumps({"cells": cells}))
+
+    def test_code_analysis(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        self._write_cells(
+            comp_dir,
+            "!pip install lightgbm\nimport os",
+            ["import pandas as pd\n", "df = pd.read_csv('/kaggle/input/test-comp/train.csv')\n"],
+            "df.to_csv('/home/me/out.csv')",
+        )
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert result.exit_code == 1
+        assert "enable_internet=false" in result.output
+        assert "セル #0 行 1: pip install" in result.output
+        assert "セル #2 行 1: /home/me/out.csv" in result.output
+        assert "DATA_DIR" in result.output
+
+    def test_offline_install_not_flagged(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        self._write_cells(
+            comp_dir,
+            "!pip install --no-index --find-links=/kaggle/input/wheels lightgbm",
+            "!pip install /kaggle/input/my-wheels/*.whl",
+            "%%bash\npip install -q ../input/wheels/foo-1.0-py3-none-any.whl",
+        )
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert result.exit_code == 0, result.output
+        assert "インターネット" not in result.output
+
+        result = runner.invoke(main, ["push", str(comp_dir), "--dry-run"])
+        assert result.exit_code == 0, result.output
+
+    def test_http_client_import_is_warning(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        self._write_cells(comp_dir, "import requests", "import urllib.request\nimport urllib.parse")
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert result.exit_code == 0, result.output
+        assert "Warning" in result.output
+        assert "セル #0 行 1: import requests" in result.output
+        assert "セル #1 行 1: import urllib.request" in result.output
+        assert "enable_internet=false" not in result.output
+
+    def test_network_call_is_error(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        self._write_cells(
+            comp_dir,
+            "import requests as rq\nr = rq.get('https://example.com/model.bin')",
+            "r = requests.post('https://example.com/submit')",
+            "!pip install --no-index lightgbm && wget https://example.com/a.zip",
+        )
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert result.exit_code == 1
+        assert "enable_internet=false" in result.output
+        assert "セル #0 行 2: rq.get()" in result.output
+        assert "セル #1 行 1: requests.post()" in result.output
+        assert "セル #2 行 1: wget" in result.output
+
+    def test_code_analysis_cached_per_cell(self, tmp_path, monkeypatch):
+        import kaggle_notebook_deploy._analysis as analysis
+
+        comp_dir = self._make_valid_dir(tmp_path)
+        sources = [f"x{i} = {i}" for i in range(5)]
+        self._write_cells(comp_dir, *sources)
+        assert runner.invoke(main, ["validate", str(comp_dir)]).exit_code == 0
+
+        analyzed = []
+        real = analysis.analyze_cell
+        monkeypatch.setattr(analysis, "analyze_cell", lambda src: analyzed.append(src) or real(src))
+        sources[3] = "import requests"
+        self._write_cells(comp_dir, *sources)
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert analyzed == ["import requests"]
+        assert "セル #3 行 1: import requests" in result.output
+
+    def test_result_cache(self, tmp_path, monkeypatch):
+        import kaggle_notebook_deploy.commands.validate as validate_mod
+
+        for i in range(3):
+            self._make_valid_dir(tmp_path).rename(tmp_path / f"comp-{i}")
+        assert runner.invoke(main, ["validate", "--all", str(tmp_path)]).exit_code == 0
+
+        checked = []
+        real = validate_mod.check_directory
+        monkeypatch.setattr(
+            validate_mod, "check_directory", lambda d, budgets=None: checked.append(d) or real(d, budgets)
+        )
+
+        # 内容が同じなら mtime が変わってもキャッシュから返す
+        os.utime(tmp_path / "comp-0" / "kernel-metadata.json", ns=(0, 0))
+        (tmp_path / "comp-1" / "test-comp-baseline.ipynb").write_text("not json")
+        result = runner.invoke(main, ["validate", "--all", str(tmp_path)])
+        assert result.exit_code == 1
+        assert checked == [str(tmp_path / "comp-1")]
+        assert "JSONパースエラー" in result.output
+
+        checked.clear()
+        assert runner.invoke(main, ["validate", "--all", str(tmp_path)]).exit_code == 1
+        assert checked == []
+
+        runner.invoke(main, ["validate", "--all", str(tmp_path), "--no-cache"])
+        assert len(checked) == 3
+
+    def test_invalid_notebook_json(self, tmp_path):
+        comp_dir = self._make_valid_dir(tmp_path)
+        (comp_dir / "test-comp-baseline.ipynb").write_text('{"cells": [{"source": ')
+        result = runner.invoke(main, ["validate", str(comp_dir)])
+        assert result.exit_code == 1
+        assert "JSONパースエラー" in result.output
+
+
+    def test_all_json_report(self, tmp_path):
+        for i in range(20):
+            comp_dir = self._make_valid_dir(tmp_path)
+            comp_dir.rename(tmp_path / f"comp-{i:02d}")
+        (tmp_path / "comp-05" / "test-comp-baseline.ipynb").unlink()
+        report = tmp_path / "report.json"
+        result = runner.invoke(main, ["validate", str(tmp_path), "--all", "-j", "2", "--report", str(report)])
+        assert result.exit_code == 1
+        assert "20 directories: 19 ok, 1 with errors." in result.output
+
+        data = json.loads(report.read_text())
+        assert data["summary"] == {"total": 20, "passed": 19, "failed": 1}
+        failed = [r for r in data["results"] if r["errors"]]
+        assert failed[0]["directory"].endswith("comp-05")
+
+    def test_all_junit_report(self, tmp_path):
+        self._make_valid_dir(tmp_path)
+        report = tmp_path / "report.xml"
+        result = runner.invoke(main, ["validate", str(tmp_path), "--all", "--report", str(report)])
+        assert result.exit_code == 0
+        content = report.read_text()
+        assert "<testsuite" in content
+        assert 'failures="0"' in content
+
 
 class TestPush:
     def test_dry_run(self, tmp_path):
@@ -260,3 +667,1340 @@ class TestPush:
     def test_missing_dir(self):
         result = runner.invoke(main, ["push", "/nonexistent/path"])
         assert result.exit_code == 1
+
+    def _make_kernel_dir(self, parent, name):
+        comp_dir = parent / name
+        comp_dir.mkdir(parents=True)
+        metadata = {
+            "id": f"user/{name}-baseline",
+            "title": f"{name} Baseline",
+            "code_file": f"{name}-baseline.ipynb",
+            "language": "python",
+            "kernel_type": "notebook",
+            "is_private": "true",
+            "enable_gpu": "false",
+            "enable_tpu": "false",
+            "enable_internet": "false",
+        }
+        (comp_dir / "kernel-metadata.json").write_text(json.dumps(metadata))
+        (comp_dir / f"{name}-baseline.ipynb").write_text("{}")
+        return comp_dir
+
+    def test_multiple_dirs_dry_run(self, tmp_path):
+        a = self._make_kernel_dir(tmp_path, "comp-a")
+        b = self._make_kernel_dir(tmp_path, "comp-b")
+        result = runner.invoke(main, ["push", str(a), str(b), "--dry-run", "--jobs", "2"])
+        assert result.exit_code == 0
+        assert "Summary:" in result.output
+        assert "user/comp-a-baseline" in result.output
+        assert "user/comp-b-baseline" in result.output
+        assert "2 succeeded, 0 failed." in result.output
+
+    def test_all_discovers_kernel_dirs(self, tmp_path):
+        self._make_kernel_dir(tmp_path, "comp-a")
+        self._make_kernel_dir(tmp_path / "experiments", "comp-b")
+        self._make_kernel_dir(tmp_path / ".ipynb_checkpoints", "ignored")
+        result = runner.invoke(main, ["push", "--all", str(tmp_path), "--dry-run"])
+        assert result.exit_code == 0
+        assert "user/comp-b-baseline" in result.output
+        assert "ignored" not in result.output
+
+    def test_multiple_dirs_failure_exit_code(self, tmp_path):
+        a = self._make_kernel_dir(tmp_path, "comp-a")
+        result = runner.invoke(main, ["push", str(a), str(tmp_path / "missing"), "--dry-run"])
+        assert result.exit_code == 1
+        assert "1 succeeded, 1 failed." in result.output
+
+
+    def _fake_push(self, monkeypatch, tmp_path):
+        """kaggle kernels push を成功扱いにし、呼び出されたディレクトリを記録する."""
+        import subprocess
+
+        monkeypatch.setenv("KAGGLE_DEPLOY_STATE_DIR", str(tmp_path / ".kaggle-deploy"))
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: "kaggle")
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd[-1])
+            return subprocess.CompletedProcess(cmd, 0, stdout="Kernel version 1 successfully pushed.", stderr="")
+
+        monkeypatch.setattr("kaggle_notebook_deploy._utils.subprocess.run", fake_run)
+        return calls
+
+    def test_skip_unchanged(self, tmp_path, monkeypatch):
+        calls = self._fake_push(monkeypatch, tmp_path)
+        comp_dir = self._make_kernel_dir(tmp_path, "comp-a")
+
+        result = runner.invoke(main, ["push", str(comp_dir)])
+        assert result.exit_code == 0
+        assert len(calls) == 1
+        state = json.loads((tmp_path / ".kaggle-deploy" / "state.json").read_text())
+        assert "user/comp-a-baseline" in state["kernels"]
+
+        result = runner.invoke(main, ["push", str(comp_dir)])
+        assert result.exit_code == 0
+        assert "Skip" in result.output
+        assert len(calls) == 1
+
+        (comp_dir / "comp-a-baseline.ipynb").write_text('{"cells": []}')
+        result = runner.invoke(main, ["push", str(comp_dir)])
+        assert len(calls) == 2
+
+    def test_force_pushes_unchanged(self, tmp_path, monkeypatch):
+        calls = self._fake_push(monkeypatch, tmp_path)
+        comp_dir = self._make_kernel_dir(tmp_path, "comp-a")
+        runner.invoke(main, ["push", str(comp_dir)])
+        result = runner.invoke(main, ["push", str(comp_dir), "--force"])
+        assert result.exit_code == 0
+        assert len(calls) == 2
+
+    def test_all_skips_unchanged(self, tmp_path, monkeypatch):
+        calls = self._fake_push(monkeypatch, tmp_path)
+        self._make_kernel_dir(tmp_path, "comp-a")
+        b = self._make_kernel_dir(tmp_path, "comp-b")
+        runner.invoke(main, ["push", "--all", str(tmp_path)])
+        assert len(calls) == 2
+
+        (b / "comp-b-baseline.ipynb").write_text('{"cells": []}')
+        result = runner.invoke(main, ["push", "--all", str(tmp_path)])
+        assert result.exit_code == 0
+        assert calls[2:] == [str(b)]
+        assert "unchanged" in result.output
+
+
+    def _fake_clock(self, monkeypatch, statuses):
+        """time.sleep/time.monotonic を仮想時計に差し替え、ステータスを順に返す."""
+        import time as time_mod
+
+        clock = {"now": 0.0}
+        sleeps = []
+
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            clock["now"] += seconds
+
+        monkeypatch.setattr(time_mod, "sleep", fake_sleep)
+        monkeypatch.setattr(time_mod, "monotonic", lambda: clock["now"])
+        it = iter(statuses)
+        monkeypatch.setattr(
+            "kaggle_notebook_deploy._backend.CliBackend.status",
+            lambda self, kernel_id: next(it, "running"),
+        )
+        return sleeps
+
+    def test_wait_backoff(self, tmp_path, monkeypatch):
+        self._fake_push(monkeypatch, tmp_path)
+        sleeps = self._fake_clock(monkeypatch, ["queued", "running", "running", "running", "complete"])
+        comp_dir = self._make_kernel_dir(tmp_path, "comp-a")
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait", "--poll-interval", "2", "--max-poll-interval", "5"])
+        assert result.exit_code == 0
+        assert "Kernel completed successfully." in result.output
+        assert len(sleeps) == 4
+        assert sleeps[0] < 3
+        assert sleeps[-1] > sleeps[0]
+        assert max(sleeps) <= 5 * 1.2
+
+    def test_wait_timeout(self, tmp_path, monkeypatch):
+        self._fake_push(monkeypatch, tmp_path)
+        sleeps = self._fake_clock(monkeypatch, [])
+        comp_dir = self._make_kernel_dir(tmp_path, "comp-a")
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait", "--timeout", "1m"])
+        assert result.exit_code == 1
+        assert "Timeout: kernel did not complete in 1m." in result.output
+        assert sum(sleeps) == pytest.approx(60)
+
+    def test_invalid_timeout(self, tmp_path):
+        comp_dir = self._make_kernel_dir(tmp_path, "comp-a")
+        result = runner.invoke(main, ["push", str(comp_dir), "--timeout", "soon"])
+        assert result.exit_code == 2
+
+
+    def test_slim_pushes_staged_copy(self, tmp_path, monkeypatch):
+        import subprocess
+        from pathlib import Path
+
+        monkeypatch.setenv("KAGGLE_DEPLOY_STATE_DIR", str(tmp_path / ".kaggle-deploy"))
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: "kaggle")
+        comp_dir = self._make_kernel_dir(tmp_path, "comp-a")
+        notebook = {
+            "cells": [{
+                "cell_type": "code",
+                "execution_count": 7,
+                "metadata": {"scrolled": True, "tags": ["keep"]},
+                "outputs": [{"output_type": "display_data", "data": {"image/png": "A" * 100000}}],
+                "source": ["print(1)"],
+            }],
+            "metadata": {"kernelspec": {"name": "python3"}, "widgets": {"state": "B" * 1000}},
+            "nbformat": 4,
+            "nbformat_minor": 4,
+        }
+        source_text = json.dumps(notebook)
+        (comp_dir / "comp-a-baseline.ipynb").write_text(source_text)
+        pushed = {}
+
+        def fake_run(cmd, **kwargs):
+            push_dir = Path(cmd[-1])
+            pushed["dir"] = push_dir
+            pushed["notebook"] = json.loads((push_dir / "comp-a-baseline.ipynb").read_text())
+            pushed["metadata_inode"] = (push_dir / "kernel-metadata.json").stat().st_ino
+            return subprocess.CompletedProcess(cmd, 0, stdout="ok", stderr="")
+
+        monkeypatch.setattr("kaggle_notebook_deploy._utils.subprocess.run", fake_run)
+        result = runner.invoke(main, ["push", str(comp_dir), "--slim"])
+        assert result.exit_code == 0, result.output
+        assert "saved)" in result.output
+
+        assert pushed["dir"] != comp_dir
+        assert not pushed["dir"].exists()
+        cell = pushed["notebook"]["cells"][0]
+        assert cell["outputs"] == []
+        assert cell["execution_count"] is None
+        assert cell["metadata"] == {"tags": ["keep"]}
+        assert "widgets" not in pushed["notebook"]["metadata"]
+        assert pushed["metadata_inode"] == (comp_dir / "kernel-metadata.json").stat().st_ino
+        assert (comp_dir / "comp-a-baseline.ipynb").read_text() == source_text
+
+
+class TestBackoffDelays:
+    def test_grows_and_caps(self):
+        delays = backoff_delays(1, 10, factor=2, jitter=0)
+        assert [next(delays) for _ in range(6)] == [1, 2, 4, 8, 10, 10]
+
+    def test_jitter_bounds(self):
+        delays = backoff_delays(10, 10, jitter=0.2)
+        for _ in range(100):
+            assert 8 <= next(delays) <= 12
+
+
+class TestFindKernelDirs:
+    def test_finds_nested_dirs(self, tmp_path):
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "kernel-metadata.json").write_text("{}")
+        (tmp_path / "b" / "c").mkdir(parents=True)
+        (tmp_path / "b" / "c" / "kernel-metadata.json").write_text("{}")
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "kernel-metadata.json").write_text("{}")
+        assert find_kernel_dirs(tmp_path) == [tmp_path / "a", tmp_path / "b" / "c"]
+
+
+def _kernel_log(n_stdout, n_stderr):
+    entries = [{"stream_name": "stdout", "time": i, "data": f"out {i}\n"} for i in range(n_stdout)]
+    entries += [{"stream_name": "stderr", "time": i, "data": f"err {i}\n"} for i in range(n_stderr)]
+    return json.dumps(entries)
+
+
+class TestJsonStream:
+    def test_small_chunks(self):
+        text = _kernel_log(50, 50)
+        assert list(iter_json_array(io.StringIO(text), chunk_size=7)) == json.loads(text)
+
+    def test_numbers_split_across_chunks(self):
+        assert list(iter_json_array(io.StringIO("[1, 23, 456, 7890]"), chunk_size=2)) == [1, 23, 456, 7890]
+
+    def test_empty_array(self):
+        assert list(iter_json_array(io.StringIO(" [ ] "))) == []
+
+    def test_truncated(self):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO('[{"a": 1}, {"b"'), chunk_size=4))
+
+    def test_resume_at_byte_offset(self):
+        text = json.dumps([{"data": "é" * i} for i in range(20)], ensure_ascii=False)
+        data = text.encode("utf-8")
+        offset, items = 0, []
+        # 途中で切れたドキュメントを少しずつ伸ばしながら読み直す
+        for cut in (1, 90, 91, 200, len(data) - 1, len(data)):
+            stream = io.TextIOWrapper(io.BytesIO(data[offset:cut]), encoding="utf-8", errors="surrogateescape")
+            try:
+                for item, offset in iter_json_array_from(stream, offset, chunk_size=5):
+                    items.append(item)
+            except ValueError:
+                pass
+        assert items == json.loads(text)
+        assert offset == len(data) - 1
+
+    def test_member_array_sizes(self):
+        text = '{"metadata": {"k": [1, 2]}, "cells": [{"a": 1}, "xyz", [] ], "nbformat": 4}'
+        items = list(iter_member_array(io.StringIO(text), "cells", chunk_size=3))
+        assert items == [({"a": 1}, 8), ("xyz", 5), ([], 2)]
+        assert list(iter_member_array(io.StringIO("{}"), "cells")) == []
+
+    def test_scan_notebook(self, tmp_path):
+        cells = [{"cell_type": "code", "source": "s" * n, "outputs": [{"text": "o" * n * 10}]} for n in range(10)]
+        path = tmp_path / "nb.ipynb"
+        path.write_text(json.dumps({"cells": cells}))
+        stats = scan_notebook(path, top=2)
+        assert stats["cells"] == 10
+        assert stats["size"] == path.stat().st_size
+        assert [i for _, i in stats["largest_cells"]] == [9, 8]
+        assert [(i, j) for _, i, j in stats["largest_outputs"]] == [(9, 0), (8, 0)]
+
+
+class TestKernelDiagnostics:
+    def test_stdout_and_stderr_tail(self, capsys):
+        print_kernel_diagnostics(io.StringIO(_kernel_log(3, 100)))
+        out = capsys.readouterr().out
+        assert "--- kernel stdout ---" in out
+        assert "out 2" in out
+        assert "err 69" not in out
+        assert "err 70" in out
+        assert "err 99" in out
+
+    def test_entries_without_data(self, capsys):
+        log = json.dumps([
+            {"stream_name": "stdout", "time": 0},
+            {"stream_name": "stdout", "time": 1, "data": "hello\n"},
+            {"stream_name": "stderr", "time": 2},
+            {"stream_name": "stderr", "time": 3, "data": "boom\n"},
+        ])
+        assert print_kernel_diagnostics(io.StringIO(log)) == "boom\n"
+        assert "hello" in capsys.readouterr().out
+
+    def test_no_log(self, capsys):
+        print_kernel_diagnostics(None)
+        assert "(no kernel log found)" in capsys.readouterr().out
+
+    def test_cli_downloads_only_log(self, monkeypatch):
+        import subprocess
+        from pathlib import Path
+
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            out_dir = Path(cmd[cmd.index("-p") + 1])
+            (out_dir / "my-kernel.log").write_text(_kernel_log(1, 1))
+            return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+        monkeypatch.setattr("kaggle_notebook_deploy._utils.subprocess.run", fake_run)
+        with open_kernel_log("kaggle", "user/my-kernel") as log_stream:
+            entries = list(iter_json_array(log_stream))
+        assert len(entries) == 2
+        assert calls[0][-2:] == ["--file-pattern", "^my\\-kernel\\.log$"]
+
+    def test_new_entries_resume_at_offset(self, monkeypatch):
+        import subprocess
+        from pathlib import Path
+
+        logs = iter([_kernel_log(2, 0)[:-1], _kernel_log(3, 1)])
+
+        def fake_run(cmd, **kwargs):
+            (Path(cmd[cmd.index("-p") + 1]) / "my-kernel.log").write_text(next(logs), encoding="utf-8")
+            return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+        monkeypatch.setattr("kaggle_notebook_deploy._utils.subprocess.run", fake_run)
+        printed = []
+        offset = 0
+        for _ in range(2):
+            with open_kernel_log("kaggle", "user/my-kernel", offset) as log_stream:
+                offset = print_new_log_entries(log_stream, offset, lambda text, err=False: printed.append(text))
+        assert printed == ["out 0", "out 1", "out 2", "err 0"]
+        assert offset == len(_kernel_log(3, 1).encode()) - 1
+
+
+class _StubKaggleHandler(BaseHTTPRequestHandler):
+    """Kaggle RPC API (POST /v1/<service>/<method>) のスタブ."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        method = self.path.rsplit("/", 1)[-1]
+        self.server.calls.append((method, body))
+        self.server.auth_headers.append(self.headers.get("Authorization"))
+        self.server.client_ports.add(self.client_address[1])
+
+        response = self.server.responses.get(method, {})
+        if callable(response):
+            response = response(body)
+        code, payload = response if isinstance(response, tuple) else (200, response)
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.downloads.append(self.path)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        range_header = self.headers.get("Range")
+        self.server.ranges.append(range_header)
+        if range_header and self.server.accept_ranges:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            data = data[start:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        """再開可能アップロード（Content-Range: bytes a-b/total または bytes */total）."""
+        data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        spec, _, total = self.headers["Content-Range"].removeprefix("bytes ").partition("/")
+        stored = self.server.uploads.setdefault(self.path, bytearray())
+        if data and self.server.put_limit is not None and self.server.put_bytes >= self.server.put_limit:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if spec != "*" and int(spec.split("-")[0]) == len(stored):
+            stored.extend(data)
+            self.server.put_bytes += len(data)
+
+        self.send_response(200 if len(stored) == int(total) else 308)
+        if stored and len(stored) < int(total):
+            self.send_header("Range", f"bytes=0-{len(stored) - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubKaggleHandler)
+    server.calls = []
+    server.auth_headers = []
+    server.client_ports = set()
+    server.responses = {}
+    server.files = {}
+    server.downloads = []
+    server.ranges = []
+    server.accept_ranges = True
+    server.uploads = {}
+    server.put_bytes = 0
+    server.put_limit = None
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    monkeypatch.setenv("KAGGLE_API_ENDPOINT", server.url)
+    monkeypatch.setenv("KAGGLE_USERNAME", "user")
+    monkeypatch.setenv("KAGGLE_KEY", "secret")
+    monkeypatch.setenv("KAGGLE_DEPLOY_BACKEND", "api")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestKaggleApiClient:
+    def test_status_reuses_connection(self, stub_api):
+        stub_api.responses["GetKernelSessionStatus"] = {"status": "RUNNING"}
+        client = KaggleApiClient({"username": "user", "key": "secret"})
+        for _ in range(3):
+            assert client.kernel_status("user/my-kernel")["status"] == "RUNNING"
+        client.close()
+
+        assert stub_api.calls[0] == ("GetKernelSessionStatus", {"userName": "user", "kernelSlug": "my-kernel"})
+        assert stub_api.auth_headers[0].startswith("Basic ")
+        assert len(stub_api.client_ports) == 1
+
+    def test_error_response(self, stub_api):
+        stub_api.responses["GetKernelSessionStatus"] = (500, {"code": 500, "message": "boom"})
+        client = KaggleApiClient({"token": "abc"})
+        with pytest.raises(KaggleApiError) as excinfo:
+            client.kernel_status("user/my-kernel")
+        assert excinfo.value.status_code == 500
+        assert stub_api.auth_headers[0] == "Bearer abc"
+
+    def test_error_code_as_string(self, stub_api):
+        stub_api.responses["GetKernelSessionStatus"] = {"code": "404", "message": "Not found"}
+        client = KaggleApiClient({"token": "abc"})
+        with pytest.raises(KaggleApiError, match="Not found"):
+            client.kernel_status("user/my-kernel")
+
+        stub_api.responses["GetKernelSessionStatus"] = {"code": "OK", "status": "RUNNING"}
+        assert client.kernel_status("user/my-kernel")["status"] == "RUNNING"
+
+    def test_push_and_wait_in_process(self, stub_api, tmp_path, monkeypatch):
+        monkeypatch.setenv("KAGGLE_DEPLOY_STATE_DIR", str(tmp_path / ".kaggle-deploy"))
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: None)
+        stub_api.responses["SaveKernel"] = {"ref": "/code/user/api-baseline", "url": "https://kaggle/x", "versionNumber": 3}
+        stub_api.responses["GetKernelSessionStatus"] = {"status": "COMPLETE"}
+
+        comp_dir = tmp_path / "api"
+        comp_dir.mkdir()
+        metadata = {
+            "id": "user/api-baseline",
+            "title": "Api Baseline",
+            "code_file": "api-baseline.ipynb",
+            "language": "python",
+            "kernel_type": "notebook",
+            "is_private": "true",
+            "enable_gpu": "false",
+            "enable_tpu": "false",
+            "enable_internet": "false",
+        }
+        notebook = {"cells": [{"cell_type": "code", "source": ["a = 1\n", "a"], "outputs": [{"data": "x"}]}]}
+        (comp_dir / "kernel-metadata.json").write_text(json.dumps(metadata))
+        (comp_dir / "api-baseline.ipynb").write_text(json.dumps(notebook))
+
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait"])
+        assert result.exit_code == 0, result.output
+        assert "Kernel version 3 successfully pushed." in result.output
+        assert "Kernel completed successfully." in result.output
+
+        method, body = stub_api.calls[0]
+        assert method == "SaveKernel"
+        assert body["slug"] == "user/api-baseline"
+        assert body["enableInternet"] is False
+        cell = json.loads(body["text"])["cells"][0]
+        assert cell["outputs"] == []
+        assert cell["source"] == "a = 1\na"
+
+    def test_open_kernel_log_streams_log_file(self, stub_api):
+        stub_api.files["/outputs/my-kernel.log"] = _kernel_log(2, 40).encode()
+        stub_api.responses["ListKernelSessionOutput"] = {
+            "files": [
+                {"fileName": "model.bin", "url": "/outputs/model.bin"},
+                {"fileName": "my-kernel.log", "url": "/outputs/my-kernel.log"},
+            ],
+        }
+        client = KaggleApiClient({"username": "user", "key": "secret"})
+        log_stream = client.open_kernel_log("user/my-kernel")
+        with log_stream:
+            entries = list(iter_json_array(log_stream))
+        assert len(entries) == 42
+
+        # ログの末尾から再開すると 416 になり、空のストリームが返る
+        size = len(stub_api.files["/outputs/my-kernel.log"])
+        with client.open_kernel_log("user/my-kernel", size) as log_stream:
+            assert log_stream.read() == ""
+        assert stub_api.ranges[-1] == f"bytes={size}-"
+
+    def test_open_kernel_log_inline(self, stub_api):
+        stub_api.responses["ListKernelSessionOutput"] = {"files": [], "log": _kernel_log(1, 0)}
+        client = KaggleApiClient({"username": "user", "key": "secret"})
+        assert list(iter_json_array(client.open_kernel_log("user/my-kernel")))[0]["data"] == "out 0\n"
+
+    def _growing_kernel(self, stub_api, statuses, logs):
+        status_iter = iter(statuses)
+        log_iter = iter(logs)
+        stub_api.responses["GetKernelSessionStatus"] = lambda body: {"status": next(status_iter)}
+        stub_api.responses["ListKernelSessionOutput"] = lambda body: {"files": [], "log": next(log_iter)}
+
+    def test_logs_follow_prints_only_new_entries(self, stub_api):
+        self._growing_kernel(
+            stub_api,
+            ["RUNNING", "RUNNING", "COMPLETE"],
+            [_kernel_log(1, 0), _kernel_log(3, 0)[:-20], _kernel_log(4, 1)],
+        )
+        result = runner.invoke(main, ["logs", "-f", "user/my-kernel", "--poll-interval", "0.01"])
+        assert result.exit_code == 0, result.output
+        for i in range(4):
+            assert result.output.count(f"out {i}\n") == 1
+        assert "err 0" in result.output
+        assert "Kernel completed successfully." in result.output
+
+    @pytest.mark.parametrize("accept_ranges", [True, False])
+    def test_logs_follow_resumes_log_file(self, stub_api, accept_ranges):
+        stub_api.accept_ranges = accept_ranges
+        full = _kernel_log(5, 1).encode()
+        # ポーリングごとに伸びるログファイル（途中でエントリが切れている回、変化のない回を含む）
+        cut = [full.index(b"out 2"), full.index(b"out 4") + 3, full.index(b"out 4") + 3, len(full)]
+        statuses = iter(["RUNNING", "RUNNING", "RUNNING", "COMPLETE"])
+
+        def status(body):
+            stub_api.files["/outputs/my-kernel.log"] = full[:cut.pop(0)]
+            return {"status": next(statuses)}
+
+        stub_api.responses["GetKernelSessionStatus"] = status
+        stub_api.responses["ListKernelSessionOutput"] = {
+            "files": [{"fileName": "my-kernel.log", "url": "/outputs/my-kernel.log"}],
+        }
+        result = runner.invoke(main, ["logs", "-f", "user/my-kernel", "--poll-interval", "0.01"])
+        assert result.exit_code == 0, result.output
+        for i in range(5):
+            assert result.output.count(f"out {i}\n") == 1
+        assert result.output.count("err 0") == 1
+
+        offsets = [int(r.removeprefix("bytes=").rstrip("-")) if r else 0 for r in stub_api.ranges]
+        assert offsets[0] == 0 and offsets[1] > 0
+        assert offsets == sorted(offsets)
+        assert offsets[2] == offsets[3]
+
+    def test_logs_follow_error_exit_code(self, stub_api):
+        self._growing_kernel(stub_api, ["ERROR"], [_kernel_log(0, 1)])
+        result = runner.invoke(main, ["logs", "-f", "user/my-kernel", "--poll-interval", "0.01"])
+        assert result.exit_code == 1
+        assert "err 0" in result.output
+
+    def test_logs_once(self, stub_api):
+        stub_api.responses["ListKernelSessionOutput"] = {"files": [], "log": _kernel_log(2, 1)}
+        result = runner.invoke(main, ["logs", "user/my-kernel"])
+        assert result.exit_code == 0
+        assert "out 1" in result.output
+        assert "err 0" in result.output
+
+
+class TestDataset:
+    @pytest.fixture
+    def dataset_env(self, stub_api, tmp_path, monkeypatch):
+        monkeypatch.setattr("kaggle_notebook_deploy.commands.dataset.RETRY_DELAY", 0)
+        sessions = itertools.count()
+        stub_api.responses["StartBlobUpload"] = lambda body: {
+            "token": f"tok-{body['name']}-{(n := next(sessions))}", "createUrl": f"/upload/{n}",
+        }
+        stub_api.responses["GetDataset"] = (404, {"code": 404, "message": "not found"})
+        stub_api.responses["CreateDataset"] = {"url": "https://www.kaggle.com/datasets/user/features"}
+        stub_api.responses["CreateDatasetVersion"] = {"url": "https://www.kaggle.com/datasets/user/features"}
+
+        data_dir = tmp_path / "features"
+        data_dir.mkdir()
+        (data_dir / "dataset-metadata.json").write_text(json.dumps({
+            "title": "Features", "id": "user/features", "licenses": [{"name": "CC0-1.0"}],
+        }))
+        (data_dir / "train.bin").write_bytes(bytes(range(256)) * (3 * 4096 + 100))
+        (data_dir / "notes.txt").write_text("v1")
+        kernel_dir = tmp_path / "titanic"
+        kernel_dir.mkdir()
+        (kernel_dir / "kernel-metadata.json").write_text(json.dumps({"id": "user/titanic", "dataset_sources": []}))
+        return stub_api, data_dir, kernel_dir
+
+    def test_resume_after_interruption(self, dataset_env):
+        stub_api, data_dir, kernel_dir = dataset_env
+        size = (data_dir / "train.bin").stat().st_size
+        args = ["dataset", str(data_dir), "--chunk-mb", "1", "-j", "1", "--kernel", str(kernel_dir)]
+
+        # 1チャンク目だけ届いた後に接続が失敗し続ける
+        stub_api.put_limit = 1024 * 1024
+        result = runner.invoke(main, args)
+        assert result.exit_code == 1
+        assert "再開します" in result.output
+        assert "user/features" not in json.loads((kernel_dir / "kernel-metadata.json").read_text())["dataset_sources"]
+
+        stub_api.put_limit = None
+        result = runner.invoke(main, args)
+        assert result.exit_code == 0, result.output
+        assert "Resume: train.bin" in result.output
+        assert "Dataset created: https://www.kaggle.com/datasets/user/features" in result.output
+
+        # 送信済みのチャンクは再送されない
+        assert stub_api.put_bytes == size + 2
+        assert sorted(bytes(b) for b in stub_api.uploads.values()) == [(data_dir / "train.bin").read_bytes(), b"v1"]
+        starts = [body["name"] for method, body in stub_api.calls if method == "StartBlobUpload"]
+        assert sorted(starts) == ["notes.txt", "train.bin"]
+        create = [body for method, body in stub_api.calls if method == "CreateDataset"][0]
+        assert create["ownerSlug"] == "user" and create["slug"] == "features"
+        assert len(create["files"]) == 2
+        assert json.loads((kernel_dir / "kernel-metadata.json").read_text())["dataset_sources"] == ["user/features"]
+
+    def test_unchanged_files_are_not_uploaded_again(self, dataset_env):
+        stub_api, data_dir, _ = dataset_env
+        assert runner.invoke(main, ["dataset", str(data_dir)]).exit_code == 0
+        first_tokens = {f["token"] for f in [b for m, b in stub_api.calls if m == "CreateDataset"][0]["files"]}
+
+        stub_api.calls.clear()
+        result = runner.invoke(main, ["dataset", str(data_dir)])
+        assert result.exit_code == 0, result.output
+        assert "Skip: 前回のバージョンから変更がありません" in result.output
+        assert stub_api.calls == []
+
+        (data_dir / "notes.txt").write_text("v2")
+        put_bytes = stub_api.put_bytes
+        result = runner.invoke(main, ["dataset", str(data_dir), "-m", "notes v2"])
+        assert result.exit_code == 0, result.output
+        assert "Unchanged: train.bin" in result.output
+        assert [b["name"] for m, b in stub_api.calls if m == "StartBlobUpload"] == ["notes.txt"]
+        assert stub_api.put_bytes - put_bytes == 2
+        method, body = stub_api.calls[-1]
+        assert method == "CreateDatasetVersion"
+        assert body["ownerSlug"] == "user" and body["datasetSlug"] == "features"
+        assert body["body"]["versionNotes"] == "notes v2"
+        tokens = {f["token"] for f in body["body"]["files"]}
+        assert len(tokens) == 2 and len(tokens & first_tokens) == 1
+
+    def test_missing_metadata(self, tmp_path):
+        result = runner.invoke(main, ["dataset", str(tmp_path)])
+        assert result.exit_code == 1
+        assert "dataset-metadata.json が見つかりません" in result.output
+
+
+class TestProfile:
+    def test_setup_cell_prints_records(self, capsys):
+        interactiveshell = pytest.importorskip("IPython.core.interactiveshell")
+        from kaggle_notebook_deploy._profile import instrument_notebook, iter_profile_records
+
+        notebook = {"cells": [
+            {"cell_type": "markdown", "source": "# title"},
+            {"cell_type": "code", "source": "x = list(range(10))"},
+            {"cell_type": "code", "source": "y = sum(x)"},
+        ]}
+        assert instrument_notebook(notebook) == 2
+        shell = interactiveshell.InteractiveShell.instance()
+        try:
+            for cell in notebook["cells"]:
+                if cell["cell_type"] == "code":
+                    shell.run_cell(cell["source"], store_history=False)
+        finally:
+            interactiveshell.InteractiveShell.clear_instance()
+
+        lines = capsys.readouterr().out
+        log = json.dumps([{"stream_name": "stdout", "time": 0, "data": line + "\n"} for line in lines.splitlines()])
+        records = list(iter_profile_records(io.StringIO(log)))
+        assert [r["cell"] for r in records] == [1, 2]
+        assert all(r["seconds"] >= 0 and r["max_rss"] > 0 and not r["error"] for r in records)
+
+    def test_blank_cells_not_counted(self, capsys):
+        interactiveshell = pytest.importorskip("IPython.core.interactiveshell")
+        from kaggle_notebook_deploy._profile import instrument_notebook, iter_profile_records
+
+        notebook = {"cells": [
+            {"cell_type": "code", "source": "a = 1"},
+            {"cell_type": "code", "source": ""},
+            {"cell_type": "code", "source": ["import time\n", "time.sleep(0.3)"]},
+        ]}
+        assert instrument_notebook(notebook) == 2
+        shell = interactiveshell.InteractiveShell.instance()
+        try:
+            for cell in notebook["cells"]:
+                shell.run_cell("".join(cell["source"]), store_history=False)
+        finally:
+            interactiveshell.InteractiveShell.clear_instance()
+
+        lines = capsys.readouterr().out
+        log = json.dumps([{"stream_name": "stdout", "time": 0, "data": line + "\n"} for line in lines.splitlines()])
+        records = {r["cell"]: r for r in iter_profile_records(io.StringIO(log))}
+        assert sorted(records) == [0, 2]
+        assert records[2]["seconds"] >= 0.3
+        assert records[0]["seconds"] < 0.3
+
+    def test_push_profile_report(self, stub_api, tmp_path, monkeypatch):
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: None)
+        stub_api.responses["SaveKernel"] = {"url": "https://kaggle/x", "versionNumber": 1}
+        stub_api.responses["GetKernelSessionStatus"] = {"status": "ERROR"}
+        records = [
+            {"cell": 0, "seconds": 1.5, "rss": 2 ** 20, "max_rss": 2 ** 21, "peak_growth": 0, "error": False},
+            {"cell": 2, "seconds": 42.0, "rss": 2 ** 30, "max_rss": 2 ** 31, "peak_growth": 2 ** 31, "error": True},
+        ]
+        log = [{"stream_name": "stdout", "time": 0, "data": "KAGGLE_DEPLOY_PROFILE " + json.dumps(r) + "\n"}
+               for r in records]
+        log.append({"stream_name": "stderr", "time": 1, "data": "MemoryError\n"})
+        stub_api.responses["ListKernelSessionOutput"] = {"files": [], "log": json.dumps(log)}
+
+        comp_dir = TestPush()._make_kernel_dir(tmp_path, "prof")
+        notebook = {"cells": [{"cell_type": "code", "source": "a = 1", "outputs": []}]}
+        (comp_dir / "prof-baseline.ipynb").write_text(json.dumps(notebook))
+
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait", "--profile", "--skip-validate",
+                                      "--poll-interval", "0.01"])
+        assert result.exit_code == 1
+        assert "Top 2 cells by time:\n  [2] 42.00s (97%)  x error\n  [0] 1.50s (3%)" in result.output
+        assert "[2] +2.0 GB (peak 2.0 GB, rss 1.0 GB)" in result.output
+        assert "MemoryError" in result.output
+        assert "KAGGLE_DEPLOY_PROFILE" not in result.output
+
+        pushed = json.loads([b for m, b in stub_api.calls if m == "SaveKernel"][0]["text"])
+        assert "_kaggle_deploy_profile([0])" in pushed["cells"][0]["source"]
+        assert json.loads((comp_dir / "prof-baseline.ipynb").read_text()) == notebook
+
+
+class TestHistory:
+    def test_push_wait_is_recorded(self, stub_api, tmp_path, monkeypatch):
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: None)
+        statuses = iter(["QUEUED", "RUNNING", "ERROR"])
+        stub_api.responses["SaveKernel"] = {"url": "https://kaggle/x", "versionNumber": 1}
+        stub_api.responses["GetKernelSessionStatus"] = lambda body: {"status": next(statuses)}
+        stub_api.responses["ListKernelSessionOutput"] = {"files": [], "log": _kernel_log(0, 3)}
+        comp_dir = TestPush()._make_kernel_dir(tmp_path, "hist")
+
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait", "--skip-validate", "--poll-interval", "0.01"])
+        assert result.exit_code == 1
+
+        from kaggle_notebook_deploy._history import load_runs
+
+        [run] = load_runs("user/hist-baseline")
+        assert run["status"] == "error"
+        assert run["queue_seconds"] is not None and run["run_seconds"] is not None
+        assert run["content_hash"] and run["directory"] == comp_dir.as_posix()
+        assert run["error_tail"] == "err 0\nerr 1\nerr 2\n"
+
+        result = runner.invoke(main, ["history", "user/hist-baseline"])
+        assert result.exit_code == 0, result.output
+        assert "user/hist-baseline  1     1/1" in result.output
+        assert "err 2" in result.output
+
+    def test_regression_against_rolling_baseline(self, tmp_path):
+        from kaggle_notebook_deploy._history import record_push, update_run
+
+        for seconds in [600, 620, 610, 590, 1500]:
+            run_id = record_push("user/slow", tmp_path, "h", "pushed")
+            update_run(run_id, status="complete", queue_seconds=30, run_seconds=seconds)
+        update_run(record_push("user/fast", tmp_path, "h", "pushed"), status="complete", run_seconds=60)
+
+        result = runner.invoke(main, ["history"])
+        assert result.exit_code == 0, result.output
+        assert "REGRESSION 25m vs 10m05s" in result.output
+        assert result.output.count("REGRESSION") == 1
+
+        result = runner.invoke(main, ["history", "--json", "--fail-on-regression"])
+        assert result.exit_code == 1
+        summary = json.loads(result.output)["user/slow"]
+        assert summary["p50"] == 610 and summary["runs"] == 5 and summary["regression"] is True
+
+
+class TestTrace:
+    def test_push_wait_spans_and_metrics(self, stub_api, tmp_path, monkeypatch):
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: None)
+        statuses = iter(["QUEUED", "RUNNING", "COMPLETE"])
+        stub_api.responses["SaveKernel"] = {"url": "https://kaggle/x", "versionNumber": 1}
+        stub_api.responses["GetKernelSessionStatus"] = lambda body: {"status": next(statuses)}
+        comp_dir = TestPush()._make_kernel_dir(tmp_path, "traced")
+        trace_path = tmp_path / "trace.jsonl"
+        metrics_path = tmp_path / "metrics" / "kaggle.prom"
+
+        result = runner.invoke(main, [
+            "--trace", str(trace_path), "--metrics-file", str(metrics_path),
+            "push", str(comp_dir), "--wait", "--skip-validate", "--poll-interval", "0.01",
+        ])
+        assert result.exit_code == 0, result.output
+
+        spans = [json.loads(line) for line in trace_path.read_text().splitlines()]
+        by_name = {}
+        for s in spans:
+            by_name.setdefault(s["name"], []).append(s)
+        assert len(by_name["poll"]) == 3
+        assert [s["attempt"] for s in by_name["poll"]] == [1, 2, 3]
+        [command] = by_name["command"]
+        assert command["command"] == "push" and command["parent_id"] is None
+        [upload] = by_name["upload"]
+        assert upload["kernel"] == "user/traced-baseline" and upload["backend"] == "api"
+        assert upload["parent_id"] == by_name["push"][0]["span_id"]
+        assert all(s["duration"] >= 0 for s in spans)
+
+        metrics = metrics_path.read_text()
+        assert "# TYPE kaggle_deploy_phase_duration_seconds histogram" in metrics
+        assert 'kaggle_deploy_phase_duration_seconds_count{phase="poll"} 3' in metrics
+        assert 'kaggle_deploy_phase_duration_seconds_bucket{phase="poll",le="+Inf"} 3' in metrics
+        assert "kaggle_deploy_polls_total 3" in metrics
+        assert 'kaggle_deploy_pushes_total{status="complete"} 1' in metrics
+        assert 'kaggle_deploy_kernel_wait_seconds_count{outcome="complete"} 1' in metrics
+        assert 'kaggle_deploy_last_run_timestamp_seconds{command="push"}' in metrics
+        assert "failures_total" not in metrics
+
+    def test_disabled_by_default(self, tmp_path):
+        from kaggle_notebook_deploy import _trace
+
+        before = _trace.render_metrics()
+        with _trace.span("validate", directory="x") as s:
+            s["ok"] = True
+        _trace.count("polls_total")
+        assert not _trace.enabled()
+        assert _trace.render_metrics() == before
+
+    def test_failure_counted(self, tmp_path):
+        from kaggle_notebook_deploy import _trace
+
+        _trace.configure(metrics_path=str(tmp_path / "m.prom"))
+        with pytest.raises(RuntimeError):
+            with _trace.span("upload"):
+                raise RuntimeError('bad "quote"')
+        _trace.finish("push")
+        metrics = (tmp_path / "m.prom").read_text()
+        assert 'kaggle_deploy_failures_total{phase="upload"} 1' in metrics
+        assert not _trace.enabled()
+
+
+class TestBenchmark:
+    @pytest.mark.skipif(sys.platform == "win32", reason="the fake kaggle is a POSIX shell script")
+    def test_smoke(self, tmp_path):
+        script = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts", "benchmark.py")
+        out = tmp_path / "bench.json"
+        args = [sys.executable, script, "--dirs", "3", "--push-dirs", "2", "--jobs", "2", "--polls", "2",
+                "--log-mb", "0.05", "--latency", "0", "--repeat", "1", "--output", str(out)]
+        subprocess.run(args, capture_output=True, text=True, check=True)
+        report = json.loads(out.read_text())
+        names = [b["name"] for b in report["benchmarks"]]
+        assert names == ["validate_cold", "validate_cached", "push_all_j1", "push_all_j2", "poll_cli",
+                         "diagnostics_parse", "follow_parse", "diagnostics_cli"]
+        assert all(b["seconds"]["min"] <= b["seconds"]["median"] <= b["seconds"]["max"] for b in report["benchmarks"])
+
+        # 前回結果との比較: 中央値が大きく悪化したら終了コード 1
+        for b in report["benchmarks"]:
+            b["seconds"]["median"] = 1e-9
+        out.write_text(json.dumps(report))
+        proc = subprocess.run(args[:-2] + ["--only", "poll", "--compare", str(out)], capture_output=True, text=True)
+        assert proc.returncode == 1
+        assert "REGRESSION poll_cli" in proc.stderr
+
+
+@pytest.fixture
+def emulator(monkeypatch):
+    from kaggle_notebook_deploy._emulator import EmulatorConfig, EmulatorServer
+
+    servers = []
+
+    def start(**config):
+        server = EmulatorServer(("127.0.0.1", 0), EmulatorConfig(**{"queue_seconds": 0.05, "run_seconds": 0.1, **config}))
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("KAGGLE_API_ENDPOINT", server.url)
+        monkeypatch.setenv("KAGGLE_USERNAME", "emulator")
+        monkeypatch.setenv("KAGGLE_KEY", "emulator")
+        monkeypatch.setenv("KAGGLE_DEPLOY_BACKEND", "api")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class TestEmulator:
+    def test_push_wait_and_pull_output(self, emulator, tmp_path, monkeypatch):
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: None)
+        emulator()
+        comp_dir = TestPush()._make_kernel_dir(tmp_path, "emu")
+
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait", "--skip-validate", "--poll-interval", "0.02"])
+        assert result.exit_code == 0, result.output
+        assert "Kernel version 1 successfully pushed." in result.output
+        assert "QUEUED" in result.output and "Kernel completed successfully." in result.output
+
+        dest = tmp_path / "out"
+        result = runner.invoke(main, ["pull-output", "user/emu-baseline", "-p", str(dest)])
+        assert result.exit_code == 0, result.output
+        assert (dest / "submission.csv").read_text().startswith("id,target")
+        entries = json.loads((dest / "emu-baseline.log").read_text())
+        assert entries[0]["data"] == "[user/emu-baseline v1] step 1/20\n"
+
+    def test_failing_kernel_diagnostics(self, emulator, tmp_path, monkeypatch):
+        monkeypatch.setattr("kaggle_notebook_deploy.commands._common.find_kaggle", lambda: None)
+        emulator(fail_kernels=["user/*-baseline"])
+        comp_dir = TestPush()._make_kernel_dir(tmp_path, "broken")
+
+        result = runner.invoke(main, ["push", str(comp_dir), "--wait", "--skip-validate", "--poll-interval", "0.02"])
+        assert result.exit_code == 1
+        assert "Kernel failed: ERROR" in result.output
+        assert "RuntimeError: injected failure" in result.output
+
+    def test_large_log_is_streamed(self, emulator):
+        server = emulator(queue_seconds=0, run_seconds=0.01, log_bytes=2 * 1024 * 1024)
+        client = KaggleApiClient({"username": "u", "key": "k"})
+        client.save_kernel({"slug": "user/big", "text": "{}"})
+        time.sleep(0.05)
+        with client.open_kernel_log("user/big") as stream:
+            entries = list(iter_json_array(stream))
+        assert len(entries) > 10000
+        assert entries[19]["data"].endswith("step 20/20\n")
+        assert server.stats["requests.download"] == 1
+
+        # 途中から再開すると残りだけが返る
+        offset = 0
+        with client.open_kernel_log("user/big", 0) as stream:
+            for _, offset in itertools.islice(iter_json_array_from(stream, 0), 5000):
+                pass
+        with client.open_kernel_log("user/big", offset) as stream:
+            rest = [entry for entry, _ in iter_json_array_from(stream, offset)]
+        assert rest == entries[5000:]
+        with client.open_kernel_log("user/big", 10 ** 9) as stream:
+            assert stream.read() == ""
+
+    def test_malformed_body_is_bad_request(self, emulator):
+        import requests
+
+        server = emulator()
+        url = f"{server.url}/v1/kernels.KernelsApiService/SaveKernel"
+        headers = {"Authorization": "Basic x", "Content-Type": "application/json"}
+        for body in (b"{not json", b"\xff\xfe\x00", b"[1, 2]"):
+            resp = requests.post(url, data=body, headers=headers, timeout=5)
+            assert resp.status_code == 400
+            assert resp.json()["code"] == 400
+        # 同じ接続で続けてリクエストできる
+        assert requests.post(url, json={"slug": "user/ok", "text": "{}"}, headers=headers, timeout=5).ok
+
+    def test_fault_injection(self, emulator, monkeypatch):
+        import requests
+
+        monkeypatch.setenv("KAGGLE_DEPLOY_RETRIES", "0")
+        server = emulator(throttle_rate=1, retry_after=7)
+        client = KaggleApiClient({"username": "u", "key": "k"})
+        with pytest.raises(KaggleApiError) as exc:
+            client.kernel_status("user/x")
+        assert exc.value.status_code == 429
+        assert requests.post(f"{server.url}/v1/x/y", json={}).headers["Retry-After"] == "7"
+
+        server.config.throttle_rate = 0
+        server.config.server_error_rate = 1
+        with pytest.raises(KaggleApiError) as exc:
+            client.kernel_status("user/x")
+        assert exc.value.status_code in (500, 502, 503)
+
+        server.config.server_error_rate = 0
+        server.config.rate_limit = 2
+        codes = [requests.post(f"{server.url}/v1/x/y", json={}).status_code for _ in range(4)]
+        assert codes[-1] == 429 and codes.count(429) <= 2
+        stats = requests.get(f"{server.url}/emulator/stats").json()
+        assert stats["faults.429"] >= 3
+
+    def test_command_starts_server(self):
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "from kaggle_notebook_deploy.cli import main; main()", "emulator", "--port", "0"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            line = proc.stdout.readline()
+            assert line.startswith("Kaggle API emulator on http://127.0.0.1:")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+class TestRateLimit:
+    def test_retry_honors_retry_after(self, emulator, monkeypatch):
+        monkeypatch.setenv("KAGGLE_DEPLOY_RATE_LIMIT", "off")
+        server = emulator(rate_limit=3)
+        client = KaggleApiClient({"username": "u", "key": "k"})
+        client.save_kernel({"slug": "user/rl", "text": "{}"})
+        start = time.monotonic()
+        statuses = [client.kernel_status("user/rl")["status"] for _ in range(5)]
+        assert all(statuses)
+        assert server.stats["faults.429"] >= 1
+        # Retry-After: 1 を待ってから再送している
+        assert time.monotonic() - start >= 0.9
+
+    def test_shared_bucket_avoids_throttling(self, emulator, monkeypatch):
+        monkeypatch.setenv("KAGGLE_DEPLOY_RATE_LIMIT", "5")
+        server = emulator(rate_limit=10)
+        client = KaggleApiClient({"username": "u", "key": "k"})
+        client.save_kernel({"slug": "user/rl", "text": "{}"})
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: client.kernel_status("user/rl"), range(8)))
+        assert time.monotonic() - start >= 0.7
+        assert "faults.429" not in server.stats
+
+    def test_push_is_not_retried_on_server_error(self, emulator):
+        server = emulator(server_error_rate=1)
+        client = KaggleApiClient({"username": "u", "key": "k"})
+        with pytest.raises(KaggleApiError):
+            client.save_kernel({"slug": "user/rl", "text": "{}"})
+        assert server.stats["requests.SaveKernel"] == 1
+        with pytest.raises(KaggleApiError):
+            client.kernel_status("user/rl")
+        assert server.stats["requests.GetKernelSessionStatus"] == 5
+
+    def test_cli_retries_throttled_status(self, monkeypatch):
+        import subprocess
+
+        outputs = iter([
+            ("", "429 Client Error: Too Many Requests for url: https://www.kaggle.com/api/v1/kernels/status"),
+            ('user/k has status "KernelWorkerStatus.RUNNING"\n', ""),
+        ])
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            stdout, stderr = next(outputs)
+            return subprocess.CompletedProcess(cmd, 1 if stderr else 0, stdout=stdout, stderr=stderr)
+
+        monkeypatch.setattr("kaggle_notebook_deploy._utils.subprocess.run", fake_run)
+        assert get_kernel_status("kaggle", "user/k") == "KernelWorkerStatus.RUNNING"
+        assert len(calls) == 2
+
+    def test_config_parsing(self):
+        from kaggle_notebook_deploy._ratelimit import Transient, parse_retry_after, parse_spec, transient_from_output
+
+        assert parse_spec("status=2, push=0.5, 5") == {"status": 2.0, "push": 0.5, "*": 5.0}
+        assert parse_spec("download=off,bogus=x") == {"download": 0.0}
+        assert parse_retry_after("3") == 3.0
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert parse_retry_after("soon") is None
+        assert transient_from_output("503 Server Error: Service Unavailable") == Transient(503)
+        assert transient_from_output("Kernel version 1 successfully pushed.") is None
+
+
+class TestPullOutput:
+    @pytest.fixture
+    def outputs(self, stub_api):
+        stub_api.files["/outputs/submission.csv"] = b"id,target\n1,0\n"
+        stub_api.files["/outputs/models/fold0.bin"] = bytes(range(256)) * 4096
+        stub_api.files["/outputs/my-kernel.log"] = _kernel_log(1, 0).encode()
+        pages = {
+            None: {"files": [
+                {"fileName": "submission.csv", "url": "/outputs/submission.csv"},
+                {"fileName": "my-kernel.log", "url": "/outputs/my-kernel.log"},
+            ], "nextPageToken": "p2"},
+            "p2": {"files": [
+                {"fileName": "models/fold0.bin", "url": "/outputs/models/fold0.bin"},
+                {"fileName": "../escape.txt", "url": "/outputs/submission.csv"},
+            ]},
+        }
+        stub_api.responses["ListKernelSessionOutput"] = lambda body: pages[body.get("pageToken")]
+        return stub_api
+
+    def test_selective_and_incremental(self, outputs, tmp_path):
+        dest = tmp_path / "out"
+        args = ["pull-output", "user/my-kernel", "-p", str(dest), "-x", "*.log", "-j", "2"]
+        result = runner.invoke(main, args)
+        assert result.exit_code == 0, result.output
+        assert (dest / "submission.csv").read_bytes() == b"id,target\n1,0\n"
+        assert (dest / "models" / "fold0.bin").read_bytes() == outputs.files["/outputs/models/fold0.bin"]
+        assert not (dest / "my-kernel.log").exists()
+        assert not (tmp_path / "escape.txt").exists()
+        assert "Skip: ../escape.txt" in result.output
+        assert not list(dest.rglob("*.part"))
+
+        result = runner.invoke(main, args)
+        assert result.exit_code == 0, result.output
+        assert result.output.count("Unchanged:") == 2
+        assert "Downloaded:" not in result.output
+
+        # 手元で書き換えたファイルとリモートで変わったファイルだけを取り直す
+        (dest / "submission.csv").write_text("edited")
+        outputs.files["/outputs/models/fold0.bin"] = b"retrained"
+        result = runner.invoke(main, args)
+        assert result.exit_code == 0, result.output
+        assert "Downloaded: submission.csv" in result.output
+        assert "Downloaded: models/fold0.bin" in result.output
+        assert (dest / "submission.csv").read_bytes() == b"id,target\n1,0\n"
+        assert (dest / "models" / "fold0.bin").read_bytes() == b"retrained"
+
+    def test_include_glob(self, outputs, tmp_path):
+        dest = tmp_path / "out"
+        result = runner.invoke(main, ["pull-output", "user/my-kernel", "-p", str(dest), "-i", "submission.*"])
+        assert result.exit_code == 0, result.output
+        assert [p.name for p in dest.rglob("*") if p.is_file()] == ["submission.csv"]
+        assert outputs.downloads == ["/outputs/submission.csv"]
+
+    def test_interrupted_write_keeps_previous_file(self, tmp_path):
+        from kaggle_notebook_deploy.commands.pull_output import _write_atomic
+
+        target = tmp_path / "oof.npy"
+        target.write_bytes(b"previous")
+
+        def chunks():
+            yield b"partial"
+            raise ConnectionError("reset")
+
+        with pytest.raises(ConnectionError):
+            _write_atomic(chunks(), target)
+        with pytest.raises(OSError):
+            _write_atomic(iter([b"short"]), target, expected=10)
+        assert target.read_bytes() == b"previous"
+        assert list(tmp_path.iterdir()) == [target]
+
+
+class TestRunLocal:
+    def _kernel(self, tmp_path, cells):
+        os.chdir(tmp_path)
+        assert runner.invoke(main, ["init", "titanic", "-u", "me"]).exit_code == 0
+        comp_dir = tmp_path / "titanic"
+        code_path = next(comp_dir.glob("*.ipynb"))
+        notebook = json.loads(code_path.read_text())
+        # テンプレートの DATA_DIR 検出はそのまま使い、pandas / numpy への依存だけ外す
+        template_cell = notebook["cells"][1]
+        template_cell["source"] = [line for line in template_cell["source"] if " as pd" not in line and " as np" not in line]
+        notebook["cells"] += [
+            {"cell_type": "code", "metadata": {}, "outputs": [], "execution_count": None, "source": source}
+            for source in cells
+        ]
+        code_path.write_text(json.dumps(notebook))
+        data_dir = tmp_path / "input" / "competitions" / "titanic"
+        data_dir.mkdir(parents=True)
+        (data_dir / "train.csv").write_text("id,y\n" + "".join(f"{i},{i % 2}\n" for i in range(5000)))
+        return comp_dir, tmp_path / "input"
+
+    def test_report_and_sampled_input(self, tmp_path):
+        comp_dir, input_dir = self._kernel(tmp_path, [
+            "rows = len(open(DATA_DIR / 'train.csv').readlines()) - 1\nprint('rows', rows)",
+            "open('/kaggle/working/submission.csv', 'w').write('id\\n')",
+        ])
+        work = tmp_path / "work"
+        result = runner.invoke(main, ["run-local", str(comp_dir), "--data", str(input_dir), "--sample-rows", "100",
+                                      "--working-dir", str(work)])
+        assert result.exit_code == 0, result.output
+        assert "competitions/titanic" in result.output
+        assert "| rows 100" in result.output
+        assert "Preflight report:" in result.output
+        assert "tracemalloc" in result.output
+        for cell in ("[1]", "[2]", "[3]"):
+            assert cell in result.output
+        assert "Preflight passed." in result.output
+        assert (work / "submission.csv").read_text() == "id\n"
+
+    def test_stops_at_first_error(self, tmp_path):
+        comp_dir, input_dir = self._kernel(tmp_path, ["raise ValueError('bad feature')", "print('not reached')"])
+        result = runner.invoke(main, ["run-local", str(comp_dir), "--data", str(input_dir)])
+        assert result.exit_code == 1
+        assert "ValueError: bad feature" in result.output
+        assert "not reached" not in result.output
+        assert "Preflight failed at cell [2]." in result.output
+
+    def test_push_preflight_blocks_push(self, tmp_path, monkeypatch):
+        comp_dir, input_dir = self._kernel(tmp_path, ["1 / 0"])
+        monkeypatch.setenv("KAGGLE_DEPLOY_INPUT_DIR", str(input_dir))
+        result = runner.invoke(main, ["push", str(comp_dir), "--preflight", "--dry-run"])
+        assert result.exit_code == 1
+        assert "ZeroDivisionError" in result.output
+        assert "Dry run" not in result.output
+
+    def test_rewrite_paths(self):
+        from pathlib import Path
+
+        from kaggle_notebook_deploy._preflight import rewrite_paths
+
+        source = "a = '/kaggle/input/x.csv'; b = '../input/y'; c = '/kaggle/working'; d = '/kaggle/input-extra'"
+        assert rewrite_paths(source, Path("/data"), Path("/out")) == (
+            "a = '/data/x.csv'; b = '/data/y'; c = '/out'; d = '/kaggle/input-extra'"
+        )
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="serve requires fork and Unix sockets")
+class TestServe:
+    _client = "import sys; from kaggle_notebook_deploy.cli import main; sys.argv[0] = 'kaggle-notebook-deploy'; main()"
+
+    @pytest.fixture
+    def daemon(self, tmp_path, monkeypatch):
+        sock = tmp_path / "d.sock"
+        monkeypatch.setenv("KAGGLE_DEPLOY_SOCKET", str(sock))
+        monkeypatch.setenv("KAGGLE_DEPLOY_STATE_DIR", str(tmp_path / "state"))
+        log = open(tmp_path / "daemon.log", "w")
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "from kaggle_notebook_deploy.cli import main; main(['serve'])"],
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+        for _ in range(100):
+            if sock.exists():
+                break
+            time.sleep(0.05)
+        yield tmp_path / "daemon.log"
+        proc.terminate()
+        proc.wait(timeout=10)
+        log.close()
+        assert not sock.exists()
+
+    def _run(self, *args, **env):
+        return subprocess.run(
+            [sys.executable, "-c", self._client, *args],
+            capture_output=True, text=True, env={**os.environ, "KAGGLE_DEPLOY_DAEMON": "1", **env},
+        )
+
+    def test_commands_run_in_daemon(self, daemon, tmp_path):
+        os.chdir(tmp_path)
+        assert self._run("init", "titanic", "-u", "me").returncode == 0
+        result = self._run("validate", "titanic")
+        assert result.returncode == 0
+        assert "OK: kernel-metadata.json is valid." in result.stdout
+
+        result = self._run("validate", "missing")
+        assert result.returncode == 1
+        assert "見つかりません" in result.stderr
+
+        log = daemon.read_text()
+        assert "validate titanic -> exit 0" in log
+        assert "validate missing -> exit 1" in log
+
+    def test_ctrl_c_interrupts_worker(self, daemon, tmp_path):
+        out_path = tmp_path / "client.out"
+        with open(out_path, "w") as out:
+            client = subprocess.Popen(
+                [sys.executable, "-c", self._client, "emulator", "--port", "0"],
+                stdout=out, stderr=subprocess.PIPE, text=True, env={**os.environ, "KAGGLE_DEPLOY_DAEMON": "1"},
+            )
+        for _ in range(100):
+            if "Kaggle API emulator on" in out_path.read_text():
+                break
+            time.sleep(0.05)
+        client.send_signal(signal.SIGINT)
+        _, stderr = client.communicate(timeout=10)
+        assert client.returncode == 130
+        assert "Traceback" not in stderr
+
+        # ワーカーは切断を検知してコマンドを中断する
+        for _ in range(100):
+            if "emulator --port 0 -> exit" in daemon.read_text():
+                break
+            time.sleep(0.05)
+        assert "client disconnected" in daemon.read_text()
+        assert "Stopped." in out_path.read_text()
+
+    def test_forwarding_is_opt_in(self, daemon, tmp_path):
+        os.chdir(tmp_path)
+        result = self._run("--version", KAGGLE_DEPLOY_DAEMON="")
+        assert result.returncode == 0
+        assert "0.1.3" in result.stdout
+        assert "--version" not in daemon.read_text()
+
+    def test_falls_back_without_daemon(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("KAGGLE_DEPLOY_SOCKET", str(tmp_path / "none.sock"))
+        result = self._run("--version")
+        assert result.returncode == 0
+        assert "0.1.3" in result.stdout
+
+
+class TestWatch:
+    class _FakeWatcher:
+        def __init__(self, batches):
+            self.batches = list(batches)
+            self.closed = False
+
+        def changes(self, timeout=None):
+            if self.batches:
+                return self.batches.pop(0)
+            if timeout is None:
+                raise KeyboardInterrupt
+            return set()
+
+        def close(self):
+            self.closed = True
+
+    def test_checks_only_changed_dirs_and_pushes(self, tmp_path, monkeypatch):
+        os.chdir(tmp_path)
+        for name in ("comp-a", "comp-b"):
+            runner.invoke(main, ["init", name, "-u", "me"])
+        (tmp_path / "comp-b" / "kernel-metadata.json").write_text("{}")
+        (tmp_path / "comp-a" / "sub").mkdir()
+
+        # 1回目のバーストはデバウンスで2回に分かれて届く
+        watcher = self._FakeWatcher([{tmp_path / "comp-a" / "sub"}, {tmp_path / "comp-b", tmp_path}])
+        monkeypatch.setattr("kaggle_notebook_deploy.commands.watch.open_watcher", lambda roots: watcher)
+        pushed = []
+        monkeypatch.setattr("kaggle_notebook_deploy.commands.watch._push", lambda ctx, d: pushed.append(d))
+
+        result = runner.invoke(main, ["watch", "--push", str(tmp_path)])
+        assert result.exit_code == 0, result.output
+        assert "Watching 2 kernel directories" in result.output
+        assert f"OK {tmp_path / 'comp-a'}" in result.output
+        assert f"NG {tmp_path / 'comp-b'}" in result.output
+        assert result.output.count("] OK") + result.output.count("] NG") == 2
+        assert pushed == [tmp_path / "comp-a"]
+        assert watcher.closed
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+    def test_inotify_watcher(self, tmp_path):
+        from kaggle_notebook_deploy._watch import InotifyWatcher
+
+        (tmp_path / "a").mkdir()
+        watcher = InotifyWatcher([tmp_path])
+        try:
+            (tmp_path / "a" / "x.ipynb").write_text("{}")
+            assert watcher.changes(2) == {tmp_path / "a"}
+
+            (tmp_path / "a" / ".x.ipynb.swp").write_text("")
+            (tmp_path / "a" / ".ipynb_checkpoints").mkdir()
+            assert watcher.changes(0.1) == set()
+
+            (tmp_path / "b").mkdir()
+            assert watcher.changes(2) == {tmp_path / "b"}
+            (tmp_path / "b" / "kernel-metadata.json").write_text("{}")
+            assert watcher.changes(2) == {tmp_path / "b"}
+        finally:
+            watcher.close()